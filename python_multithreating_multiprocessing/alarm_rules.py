@@ -0,0 +1,285 @@
+import logging
+import operator
+import time
+from collections import namedtuple
+
+from sm_frame import MODULE_COUNT
+
+log = logging.getLogger("rectifier.alarms")
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+def _module_getters(name, attribute):
+    # One getter per module, e.g. temp_0 .. temp_6
+    getters = {}
+    for i in range(MODULE_COUNT):
+        getters[f"{name}_{i}"] = lambda frame, i=i: getattr(frame, attribute)[i]
+    return getters
+
+
+# Field name -> getter on an SMFrame record, values in display units
+FIELDS = {
+    "soc": lambda frame: frame.soc,
+    "soh": lambda frame: frame.soh,
+    "charging_state": lambda frame: frame.charging_state,
+    "contactor_status": lambda frame: frame.contactor_status,
+    "charge_enable_bit": lambda frame: frame.charge_enable_bit,
+    "demand_voltage": lambda frame: frame.demand_voltage,
+    "demand_current": lambda frame: frame.demand_current,
+    "charging_current": lambda frame: frame.charging_current,
+    "charging_voltage": lambda frame: frame.charging_voltage,
+    "BST_reason": lambda frame: frame.BST_reason,
+    "CST_reason": lambda frame: frame.CST_reason,
+    "crc_ok": lambda frame: frame.crc_ok,
+}
+FIELDS.update(_module_getters("temp", "module_temperatures"))  # °C
+FIELDS.update(_module_getters("current", "module_currents"))
+FIELDS.update(_module_getters("voltage", "module_voltages"))
+
+# Rules watched when no configuration is given
+DEFAULT_RULES = [
+    {"name": "crc_error", "field": "crc_ok", "op": "==", "value": False},
+    {"name": "module_over_temperature", "field": "temp_*", "op": ">", "value": 70.0, "clear": 65.0},
+    {"name": "module_over_current", "field": "current_*", "op": ">", "value": 100.0, "n": 3, "m": 5},
+    {"name": "charging_current_jump", "field": "charging_current", "source": "rate", "abs": True, "op": ">", "value": 50.0},
+    {"name": "contactor_change", "field": "contactor_status", "kind": "change"},
+    {"name": "bst_stop", "field": "BST_reason", "op": "!=", "value": 0},
+    {"name": "cst_stop", "field": "CST_reason", "op": "!=", "value": 0},
+]
+
+AlarmEvent = namedtuple("AlarmEvent", "charger rule state value timestamp_ns")
+
+_UNSET = object()  # Never equal to a field value
+
+
+class ThresholdRule:
+    """
+    Latched condition on a field value or its rate of change.
+
+    The rule is raised once when the condition holds in at least n of the
+    last m frames and cleared once when the clear condition (the same
+    operator against the clear level, for hysteresis) holds in fewer than n
+    of them. With a rate source the value is the change per second since
+    the previous frame.
+    """
+
+    __slots__ = ("name", "field", "compare", "value", "clear", "n", "mask", "rate", "absolute", "every_frame")
+
+    def __init__(self, name, field, op, value, clear=None, n=1, m=1, source="value", abs=False):
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {name}: unknown operator {op!r}")
+        if not 1 <= n <= m:
+            raise ValueError(f"Rule {name}: need 1 <= n <= m, got n={n}, m={m}")
+        if source not in ("value", "rate"):
+            raise ValueError(f"Rule {name}: unknown source {source!r}")
+        self.name = name
+        self.field = field
+        self.compare = OPERATORS[op]
+        self.value = value
+        self.clear = value if clear is None else clear
+        self.n = n
+        self.mask = (1 << m) - 1
+        self.rate = source == "rate"
+        self.absolute = abs
+        # A plain threshold cannot change state while its value stays the same
+        self.every_frame = self.rate or m > 1
+
+    def new_state(self):
+        # [active, raise hits, hold hits, previous value, previous timestamp]
+        return [False, 0, 0, None, None]
+
+    def check(self, state, value, timestamp_ns):
+        """
+        Update the rule state with one value.
+
+        :return: ("raised" or "cleared", value) on a state change, else None.
+        """
+        if self.rate:
+            previous, previous_ns = state[3], state[4]
+            state[3], state[4] = value, timestamp_ns
+            if previous is None or timestamp_ns <= previous_ns:
+                return None
+            value = (value - previous) * 1e9 / (timestamp_ns - previous_ns)
+            if self.absolute:
+                value = abs(value)
+        elif self.absolute:
+            value = abs(value)
+
+        if self.mask == 1:
+            # Plain threshold with hysteresis, no history needed
+            if not state[0]:
+                if self.compare(value, self.value):
+                    state[0] = True
+                    return "raised", value
+            elif not self.compare(value, self.clear):
+                state[0] = False
+                return "cleared", value
+            return None
+
+        # Bit 0 is the newest frame, the mask keeps the last m
+        state[1] = (state[1] << 1 | self.compare(value, self.value)) & self.mask
+        state[2] = (state[2] << 1 | self.compare(value, self.clear)) & self.mask
+        if not state[0]:
+            if state[1].bit_count() >= self.n:
+                state[0] = True
+                return "raised", value
+        elif state[2].bit_count() < self.n:
+            state[0] = False
+            return "cleared", value
+        return None
+
+
+class ChangeRule:
+    """Event on every change of a field, e.g. the contactor status."""
+
+    __slots__ = ("name", "field")
+
+    every_frame = False
+
+    def __init__(self, name, field):
+        self.name = name
+        self.field = field
+
+    def new_state(self):
+        return [None]
+
+    def check(self, state, value, timestamp_ns):
+        previous = state[0]
+        state[0] = value
+        if previous is not None and value != previous:
+            return "changed", value
+        return None
+
+
+def compile_rules(config):
+    """
+    Turn rule configuration into rule objects, once.
+
+    A rule is a dict with name, field and either kind "change" or an op and
+    value, plus optional clear (hysteresis level), n and m (n of m frames),
+    source "rate" and abs. A field like "temp_*" expands to one rule per
+    module, named e.g. "module_over_temperature[3]".
+
+    :param config: List of rule dicts.
+    :return: List of ThresholdRule and ChangeRule.
+    """
+    rules = []
+    for entry in config:
+        entry = dict(entry)
+        name = entry.pop("name")
+        field = entry.pop("field")
+        kind = entry.pop("kind", "threshold")
+        if field.endswith("_*"):
+            expanded = [(f"{name}[{i}]", f"{field[:-1]}{i}") for i in range(MODULE_COUNT)]
+        else:
+            expanded = [(name, field)]
+        for rule_name, rule_field in expanded:
+            if rule_field not in FIELDS:
+                raise ValueError(f"Rule {name}: unknown field {rule_field!r}")
+            if kind == "change":
+                rules.append(ChangeRule(rule_name, rule_field))
+            elif kind == "threshold":
+                rules.append(ThresholdRule(rule_name, rule_field, **entry))
+            else:
+                raise ValueError(f"Rule {name}: unknown kind {kind!r}")
+    return rules
+
+
+class AlarmEngine:
+    """
+    Check compiled rules against every decoded frame of many chargers.
+
+    Rules are grouped by field, so every field is read once per frame however
+    many rules use it. When a field has the same value as in the charger's
+    previous frame, only rules that need every frame (rates, n of m) are
+    checked; for steady telemetry most rules are skipped. Frames that failed
+    the CRC check only go to rules on crc_ok, since their other fields
+    cannot be trusted.
+    """
+
+    def __init__(self, rules=None):
+        if rules is None:
+            rules = compile_rules(DEFAULT_RULES)
+        self.rules = rules
+        fields = sorted({rule.field for rule in rules})
+        # (field index, getter, all checks, every-frame checks), check = (state index, rule)
+        self.groups = []
+        for field_index, field in enumerate(fields):
+            checks = [(i, rule) for i, rule in enumerate(rules) if rule.field == field]
+            every_frame = [(i, rule) for i, rule in checks if rule.every_frame]
+            self.groups.append((field_index, FIELDS[field], checks, every_frame))
+        self.crc_groups = [group for group in self.groups if fields[group[0]] == "crc_ok"]
+        self.states = {}  # charger -> (rule states in self.rules order, previous field values)
+
+        # Counters
+        self.frames_checked = 0
+        self.events = 0
+
+    def stats(self):
+        return {
+            "rules": len(self.rules),
+            "chargers": len(self.states),
+            "frames_checked": self.frames_checked,
+            "events": self.events,
+        }
+
+    def _charger_states(self, charger):
+        states = self.states.get(charger)
+        if states is None:
+            rule_states = [rule.new_state() for rule in self.rules]
+            states = self.states[charger] = (rule_states, [_UNSET] * len(self.groups))
+        return states
+
+    def check(self, charger, frame, timestamp_ns=None):
+        """
+        Check one decoded frame.
+
+        :param charger: Charger tag of the frame.
+        :param frame: SMFrame record from decode_sm_frame.
+        :param timestamp_ns: Receive time, defaults to time.monotonic_ns().
+        :return: List of AlarmEvent for rules that were raised, cleared or
+            saw a change; empty for most frames.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self.frames_checked += 1
+        rule_states, previous = self._charger_states(charger)
+
+        events = []
+        for field_index, getter, checks, every_frame in self.groups if frame.crc_ok else self.crc_groups:
+            value = getter(frame)
+            if value == previous[field_index]:
+                checks = every_frame
+            else:
+                previous[field_index] = value
+            for state_index, rule in checks:
+                result = rule.check(rule_states[state_index], value, timestamp_ns)
+                if result is not None:
+                    state, value_seen = result
+                    events.append(AlarmEvent(charger, rule.name, state, value_seen, timestamp_ns))
+                    log.warning("%s %s %s (%s)", charger, rule.name, state, value_seen)
+        self.events += len(events)
+        return events
+
+    def active(self, charger):
+        """
+        Names of the rules currently raised for a charger.
+
+        :return: List of rule names.
+        """
+        states = self.states.get(charger)
+        if states is None:
+            return []
+        return [
+            rule.name
+            for rule, state in zip(self.rules, states[0])
+            if isinstance(rule, ThresholdRule) and state[0]
+        ]
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from data_sources import exit_on_sigterm, parse_endpoint  # parse_endpoint re-exported for callers
+from frame_stream import FrameReassembler
+from sm_frame import decode_sm_frame, frame_crc_ok
+from user_interface_for_Rectifier import record_to_display_data
+
+log = logging.getLogger("rectifier.client")
+
+
+class RectifierProtocol(asyncio.BufferedProtocol):
+    # asyncio receives straight into the reassembler buffer (recv_into style)
+    def __init__(self, charger, on_frame):
+        self.charger = charger
+        self.on_frame = on_frame
+        self.reassembler = FrameReassembler()
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def get_buffer(self, sizehint):
+        return self.reassembler.writable()
+
+    def buffer_updated(self, nbytes):
+        self.reassembler.commit(nbytes)
+        for frame in self.reassembler.frames():
+            self.on_frame(self.charger, frame)
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(exc)
+
+
+class ChargerLink:
+    """Connection state of one charger, kept across reconnects."""
+
+    def __init__(self, charger, host, port):
+        self.charger = charger
+        self.host = host
+        self.port = port
+        self.connected = False
+        self.connects = 0
+        self.failures = 0
+        self.frames = 0
+        self.resyncs = 0
+        self.errors = 0  # Frames on_frame raised for
+
+
+async def poll_charger(link, on_frame, min_backoff=0.5, max_backoff=30.0):
+    """
+    Keep one charger connected, reconnecting with exponential backoff.
+
+    :param link: ChargerLink describing the endpoint.
+    :param on_frame: Called as on_frame(charger, frame) for every valid frame;
+        an exception is logged and counted in link.errors, the connection
+        stays up.
+    :param min_backoff: First retry delay in seconds.
+    :param max_backoff: Upper bound for the retry delay in seconds.
+    """
+    loop = asyncio.get_running_loop()
+    backoff = min_backoff
+
+    def count_frame(charger, frame):
+        link.frames += 1
+        try:
+            on_frame(charger, frame)
+        except Exception as e:
+            # A decode or sink bug, not a connection problem: skip the frame
+            link.errors += 1
+            log.error("Error handling frame from %s: %s", charger, e)
+
+    while True:
+        try:
+            transport, protocol = await loop.create_connection(
+                lambda: RectifierProtocol(link.charger, count_frame),
+                link.host,
+                link.port,
+            )
+        except OSError as e:
+            link.failures += 1
+            log.warning("Failed to connect to %s: %s", link.charger, e)
+        else:
+            link.connected = True
+            link.connects += 1
+            backoff = min_backoff
+            try:
+                await protocol.closed
+            finally:
+                transport.close()
+                link.connected = False
+                link.resyncs += protocol.reassembler.resyncs
+            log.info("Connection to %s closed", link.charger)
+
+        # Jitter keeps many chargers from reconnecting in lockstep
+        await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+        backoff = min(backoff * 2, max_backoff)
+
+
+def queue_frame_sink(queue):
+    """
+    Build an on_frame callback that feeds the display queue.
+
+    :param queue: Queue read by PowerModuleDisplay.
+    :return: Callback decoding a frame and putting its tagged display data.
+    """
+
+    def on_frame(charger, frame):
+        data = record_to_display_data(decode_sm_frame(frame))
+        data["charger"] = charger
+        queue.put(data)
+
+    return on_frame
+
+
+def decoded_frame_sink(queue, store=None, alarms=None, metrics=None):
+    """
+    Build an on_frame callback that also stores and checks every decoded frame.
+
+    :param queue: Queue read by PowerModuleDisplay.
+    :param store: TelemetryStore receiving the decoded records, or None.
+    :param alarms: AlarmEngine checking the decoded records, or None.
+    :param metrics: PipelineMetrics counting and timing every frame, or None.
+    :return: Callback decoding a frame once for the store, alarms and display.
+    """
+    clock = time.monotonic_ns  # Same clock in every process, for frame ages
+
+    def on_frame(charger, frame):
+        try:
+            if metrics is None:
+                record = decode_sm_frame(frame)
+            else:
+                received_ns = clock()
+                crc_ok = frame_crc_ok(frame)
+                crc_ns = clock()
+                record = decode_sm_frame(frame, check_crc=False)
+                record.crc_ok = crc_ok
+            if alarms is not None:
+                alarms.check(charger, record)  # Events are logged by the engine
+            if store is not None and record.crc_ok:
+                store.append(charger, record)
+            data = record_to_display_data(record)
+            data["charger"] = charger
+            if metrics is not None:
+                # Decode time includes the alarm check and store append
+                metrics.record_frame(crc_ns - received_ns, clock() - crc_ns, crc_ok)
+                data["timestamp_ns"] = received_ns
+            queue.put(data)
+        except Exception:
+            if metrics is not None:
+                metrics.count("source_exceptions")
+            raise
+
+    return on_frame
+
+
+async def poll_chargers(links, on_frame, **backoff):
+    """
+    Poll every charger concurrently until cancelled.
+
+    :param links: List of ChargerLink, updated with per-charger counters.
+    :param on_frame: Called as on_frame(charger, frame) for every valid frame.
+    :param backoff: min_backoff/max_backoff passed to poll_charger.
+    """
+    await asyncio.gather(*(poll_charger(link, on_frame, **backoff) for link in links))
+
+
+def start_async_client(
+    queue, endpoints, record_path=None, store_path=None, alarm_rules=None, metrics=None
+):
+    """
+    Process target polling many chargers and feeding one display queue.
+
+    :param queue: Queue read by PowerModuleDisplay.
+    :param endpoints: List of (charger, host, port).
+    :param record_path: Also append every raw frame to this capture file,
+        with the charger's position in endpoints as its source ID.
+    :param store_path: Also append every decoded frame to a telemetry store
+        in this directory.
+    :param alarm_rules: Rule configuration (list of dicts) to check every
+        decoded frame against, logging raised and cleared alarms.
+    :param metrics: PipelineMetrics to count and time frames in; display
+        messages then carry the receive time as timestamp_ns.
+    """
+    links = [ChargerLink(*endpoint) for endpoint in endpoints]
+    on_frame = queue_frame_sink(queue)
+    if metrics is not None:
+        on_frame = decoded_frame_sink(queue, metrics=metrics)
+    if record_path is None and store_path is None and alarm_rules is None:
+        asyncio.run(poll_chargers(links, on_frame))
+        return
+
+    # Process.terminate() sends SIGTERM, exit through the with block to flush
+    exit_on_sigterm(queue)
+    with ExitStack() as stack:
+        store = alarms = None
+        if store_path is not None:
+            from telemetry_store import TelemetryStore
+
+            store = stack.enter_context(TelemetryStore(store_path))
+        if alarm_rules is not None:
+            from alarm_rules import AlarmEngine, compile_rules
+
+            alarms = AlarmEngine(compile_rules(alarm_rules))
+        if store is not None or alarms is not None:
+            on_frame = decoded_frame_sink(queue, store, alarms, metrics)
+
+        if record_path is not None:
+            from frame_capture import FrameRecorder
+
+            recorder = stack.enter_context(FrameRecorder(record_path))
+            source_ids = {link.charger: index for index, link in enumerate(links)}
+            sink = on_frame
+
+            def on_frame(charger, frame):
+                recorder.write(frame, source_ids[charger])
+                sink(charger, frame)
+
+        asyncio.run(poll_chargers(links, on_frame))
+
+
+# Check: poll many simulated chargers at once, exit 1 if a charger was
+# starved, got another charger's frames or on_frame failed
+if __name__ == "__main__":
+    import queue
+
+    from rectifier_simulator import RectifierSimulator, SimulatedCharger
+
+    CHARGERS = 50
+    DURATION = 3.0  # Seconds
+    BASE_RATE = 20  # Frames per second of charger-0, each next one sends one more
+    TOLERANCE = 2  # Frames in flight when polling stops
+
+    async def main():
+        # Distinct rates, so frames tagged with the wrong charger show in the counts
+        chargers = [SimulatedCharger(f"charger-{i}", rate=BASE_RATE + i, seed=i) for i in range(CHARGERS)]
+        simulator = RectifierSimulator(chargers)
+        await simulator.start()
+        display_queue = queue.Queue()
+        links = [ChargerLink(*endpoint) for endpoint in simulator.endpoints()]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(poll_chargers(links, queue_frame_sink(display_queue)), DURATION)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+        sent = {name: charger.frames_sent for name, charger in simulator.chargers.items()}
+        await simulator.stop()
+
+        tagged = dict.fromkeys(sent, 0)
+        while not display_queue.empty():
+            charger = display_queue.get_nowait()["charger"]
+            tagged[charger] = tagged.get(charger, 0) + 1
+
+        failures = []
+        for link in links:
+            if not link.frames:
+                failures.append(f"{link.charger} received no frames")
+            if link.errors:
+                failures.append(f"{link.charger}: on_frame failed for {link.errors} frames")
+            if tagged[link.charger] != link.frames:
+                failures.append(f"{link.charger}: {tagged[link.charger]} messages for {link.frames} frames")
+            if abs(link.frames - sent[link.charger]) > TOLERANCE:
+                failures.append(f"{link.charger}: received {link.frames} of {sent[link.charger]} frames sent")
+        unknown = set(tagged) - set(sent)
+        if unknown:
+            failures.append(f"messages tagged with unknown chargers {sorted(unknown)}")
+
+        total = sum(link.frames for link in links)
+        print(f"{CHARGERS} chargers, {total} frames in {elapsed:.2f} s")
+        print(f"Slowest charger: {min(link.frames for link in links)} frames")
+        for failure in failures:
+            print(f"FAIL {failure}")
+        return not failures
+
+    raise SystemExit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,67 @@
+import argparse
+import logging
+import time
+
+from alarm_rules import DEFAULT_RULES, AlarmEngine, compile_rules
+from sm_frame import decode_sm_frame
+from synthetic_frames import FrameGenerator, drifting_frames
+
+
+def make_rules(levels):
+    """
+    The default rules plus threshold rules at several levels on every module.
+
+    :param levels: Extra thresholds per module field.
+    :return: Rule configuration list.
+    """
+    config = list(DEFAULT_RULES)
+    for level in range(levels):
+        config.append(
+            {"name": f"temp_above_{level}", "field": "temp_*", "op": ">", "value": 40.0 + 5 * level, "clear": 38.0 + 5 * level}
+        )
+        config.append(
+            {"name": f"current_above_{level}", "field": "current_*", "op": ">", "value": 50.0 + 10 * level, "n": 3, "m": 5}
+        )
+        config.append(
+            {"name": f"voltage_swing_{level}", "field": "voltage_*", "source": "rate", "abs": True, "op": ">", "value": 1000.0 * (level + 1)}
+        )
+    return config
+
+
+def run(name, engine, records, chargers, frames, interval_ns):
+    start = time.perf_counter()
+    for i in range(frames):
+        charger = chargers[i % len(chargers)]
+        engine.check(charger, records[i % len(records)], i // len(chargers) * interval_ns)
+    elapsed = time.perf_counter() - start
+    frames_per_s = frames / elapsed
+    print(
+        f"{name:8} {frames_per_s:8.0f} frames/s  {frames_per_s * len(engine.rules) / 1e6:5.2f} M rules/s"
+        f"  {engine.events} events"
+    )
+    return frames_per_s
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alarm rule engine throughput")
+    parser.add_argument("--chargers", type=int, default=50)
+    parser.add_argument("--levels", type=int, default=14, help="threshold levels per module field")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=10.0, help="frames/s sent by each charger")
+    args = parser.parse_args()
+
+    logging.getLogger("rectifier.alarms").setLevel(logging.ERROR)  # Time the rules, not the log
+    rules = compile_rules(make_rules(args.levels))
+    chargers = [f"charger{i}" for i in range(args.chargers)]
+    interval_ns = int(1e9 / args.rate)
+    needed = args.chargers * args.rate
+    print(f"{len(rules)} rules, {args.chargers} chargers at {args.rate:g} Hz = {needed:.0f} frames/s needed")
+
+    workloads = {
+        "steady": drifting_frames(3000, args.rate),
+        "random": FrameGenerator().frames(1000),  # Every value changes every frame
+    }
+    for name, frames in workloads.items():
+        records = [decode_sm_frame(frame) for frame in frames]
+        frames_per_s = run(name, AlarmEngine(rules), records, chargers, args.frames, interval_ns)
+        print(f"{'':8} {needed / frames_per_s:.0%} of one core")
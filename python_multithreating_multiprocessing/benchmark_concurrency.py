@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import multiprocessing.pool
+import os
+import platform
+import statistics
+import sys
+import sysconfig
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from parallel_decode import decode_chunk
+from synthetic_frames import FrameGenerator
+
+# A workload is a list of picklable tasks and a top-level function run on each.
+# make_tasks(payload, items) splits items units of work into tasks of payload
+# units; add an entry to WORKLOADS to benchmark another job.
+Workload = namedtuple("Workload", "make_tasks func unit")
+
+
+# CPU-bound task from multithreading.py and multiprocessing_eg.py
+def calculate_square(n):
+    return n * n
+
+
+def square_range(task):
+    start, end = task
+    total = 0
+    for i in range(start, end):
+        total += calculate_square(i)
+    return total
+
+
+def square_tasks(payload, items):
+    return [(start, min(start + payload, items)) for start in range(0, items, payload)]
+
+
+def decode_task(task):
+    # Messages go back to the caller, so result transfer is part of the cost
+    charger, chunk = task
+    return decode_chunk(charger, chunk)
+
+
+def decode_tasks(payload, items):
+    frames = FrameGenerator(seed=1).frames(min(items, 1000))
+    tasks = []
+    for start in range(0, items, payload):
+        count = min(payload, items - start)
+        chunk = b"".join(frames[(start + i) % len(frames)] for i in range(count))
+        tasks.append((f"charger{len(tasks) % 10}", chunk))
+    return tasks
+
+
+WORKLOADS = {
+    "square": Workload(square_tasks, square_range, "numbers"),
+    "decode": Workload(decode_tasks, decode_task, "frames"),
+}
+
+
+def _run_slice(func, tasks, results):
+    results.put([func(task) for task in tasks])
+
+
+def run_serial(pool, func, tasks, workers, chunksize):
+    return [func(task) for task in tasks]
+
+
+def run_threads(pool, func, tasks, workers, chunksize):
+    return list(pool.map(func, tasks))
+
+
+def run_process(pool, func, tasks, workers, chunksize):
+    # One Process per worker over a contiguous slice, started every run
+    results = multiprocessing.Queue()
+    step = -(-len(tasks) // workers)
+    processes = [
+        multiprocessing.Process(target=_run_slice, args=(func, tasks[i : i + step], results))
+        for i in range(0, len(tasks), step)
+    ]
+    for process in processes:
+        process.start()
+    collected = []
+    for _ in processes:
+        collected.extend(results.get())  # Drain before join() so the pipes never fill up
+    for process in processes:
+        process.join()
+    return collected
+
+
+def run_pool(pool, func, tasks, workers, chunksize):
+    return pool.map(func, tasks, chunksize)
+
+
+def run_executor(pool, func, tasks, workers, chunksize):
+    if chunksize is None:
+        chunksize = max(1, -(-len(tasks) // (workers * 4)))  # Pool.map's automatic choice
+    return list(pool.map(func, tasks, chunksize=chunksize))
+
+
+def run_asyncio(pool, func, tasks, workers, chunksize):
+    async def gather():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(pool, func, task) for task in tasks))
+
+    return asyncio.run(gather())
+
+
+# Execution model name -> (pool factory or None, runner, takes a chunksize).
+# Pools are created once per worker count and reused for every repeat, as a
+# long-running decoder would; "process" pays for starting its processes in
+# every run, like multiprocessing_eg.py.
+MODELS = {
+    "serial": (None, run_serial, False),
+    "threads": (ThreadPoolExecutor, run_threads, False),
+    "process": (None, run_process, False),
+    "pool": (multiprocessing.Pool, run_pool, True),
+    "process_pool_executor": (ProcessPoolExecutor, run_executor, True),
+    "asyncio_threads": (ThreadPoolExecutor, run_asyncio, False),
+    "asyncio_processes": (ProcessPoolExecutor, run_asyncio, False),
+}
+
+
+def interpreter_info():
+    """
+    Interpreter details that decide whether threads can run Python code in parallel.
+
+    :return: Dict ready for JSON; free_threaded is a build without the GIL and
+        gil_enabled whether the GIL is on at run time (PYTHON_GIL=1 turns it on).
+    """
+    free_threaded = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "free_threaded": free_threaded,
+        "gil_enabled": is_gil_enabled() if is_gil_enabled else True,
+        "start_method": multiprocessing.get_start_method(),
+    }
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    index = min(len(sorted_values) - 1, max(0, round(len(sorted_values) * p / 100 + 0.5) - 1))
+    return sorted_values[index]
+
+
+def time_runs(run, pool, func, tasks, workers, chunksize, warmup, repeats):
+    """
+    Wall times of repeated runs after warmup runs.
+
+    :return: Tuple of (sorted list of seconds, results of the last run).
+    """
+    for _ in range(warmup):
+        run(pool, func, tasks, workers, chunksize)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = run(pool, func, tasks, workers, chunksize)
+        times.append(time.perf_counter() - start)
+    return sorted(times), results
+
+
+def sweep(workload_name, models, worker_counts, payloads, chunksizes, items, warmup, repeats):
+    """
+    Run one workload under every model, worker count, payload and chunksize.
+
+    :param workload_name: Key of WORKLOADS.
+    :param models: Keys of MODELS.
+    :param worker_counts: Worker counts to try; serial always runs with one.
+    :param payloads: Units of work per task, e.g. frames per decode chunk.
+    :param chunksizes: Tasks per IPC message for models that take a chunksize;
+        None lets Pool.map pick one.
+    :param items: Units of work per run.
+    :return: List of result dicts ready for JSON.
+    """
+    workload = WORKLOADS[workload_name]
+    results = []
+    for payload in payloads:
+        tasks = workload.make_tasks(payload, items)
+        serial_median = None
+        for model in models:
+            make_pool, run, takes_chunksize = MODELS[model]
+            for workers in (1,) if model == "serial" else worker_counts:
+                pool = make_pool(workers) if make_pool else None
+                try:
+                    for chunksize in chunksizes if takes_chunksize else (None,):
+                        times, output = time_runs(
+                            run, pool, workload.func, tasks, workers, chunksize, warmup, repeats
+                        )
+                        if len(output) != len(tasks):
+                            raise RuntimeError(f"{model} returned {len(output)} of {len(tasks)} results")
+                        median = statistics.median(times)
+                        if model == "serial":
+                            serial_median = median
+                        results.append(
+                            {
+                                "workload": workload_name,
+                                "model": model,
+                                "workers": workers,
+                                "payload": payload,
+                                "tasks": len(tasks),
+                                "chunksize": chunksize,
+                                "repeats": repeats,
+                                "median_s": median,
+                                "min_s": times[0],
+                                "p90_s": percentile(times, 90),
+                                "max_s": times[-1],
+                                "items_per_s": items / median,
+                                "speedup": serial_median / median if serial_median else None,
+                            }
+                        )
+                finally:
+                    if isinstance(pool, multiprocessing.pool.Pool):
+                        pool.terminate()
+                    elif pool is not None:
+                        pool.shutdown()
+    return results
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def _chunksize_list(text):
+    return [None if value == "auto" else int(value) for value in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare serial, thread, process and asyncio execution")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), action="append", help="default: all")
+    parser.add_argument("--model", choices=list(MODELS), action="append", help="default: all")
+    parser.add_argument("--workers", type=_int_list, default=[1, 2, 4], help="comma separated worker counts")
+    parser.add_argument(
+        "--payloads",
+        type=_int_list,
+        help="comma separated units per task (default 1000,25000 numbers or 16,256 frames)",
+    )
+    parser.add_argument(
+        "--chunksizes",
+        type=_chunksize_list,
+        default=[1, 8, None],
+        help="comma separated tasks per IPC message for pool models, auto lets Pool.map choose",
+    )
+    parser.add_argument("--items", type=int, help="units of work per run (default 100000 numbers or 8192 frames)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before measuring")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per configuration")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    defaults = {"square": ([1000, 25000], 100000), "decode": ([16, 256], 8192)}
+    info = interpreter_info()
+    print(
+        f"Python {info['python']} ({info['implementation']}), {info['cpu_count']} cores, "
+        f"free-threaded: {info['free_threaded']}, GIL enabled: {info['gil_enabled']}"
+    )
+
+    results = []
+    for name in args.workload or sorted(WORKLOADS):
+        payloads, items = defaults.get(name, ([1], 1000))
+        payloads = args.payloads or payloads
+        items = args.items or items
+        print(f"\n{name}: {items} {WORKLOADS[name].unit} per run, median of {args.repeats}")
+        for result in sweep(
+            name,
+            args.model or list(MODELS),
+            args.workers,
+            payloads,
+            args.chunksizes,
+            items,
+            args.warmup,
+            args.repeats,
+        ):
+            chunksize = ""
+            if MODELS[result["model"]][2]:
+                chunksize = f"chunksize={result['chunksize'] or 'auto'}"
+            speedup = f"{result['speedup']:.2f}x" if result["speedup"] else ""
+            print(
+                f"{result['model']:22} {result['workers']:2}w  payload {result['payload']:6}  {chunksize:13}"
+                f"  {result['median_s'] * 1000:9.2f} ms  p90 {result['p90_s'] * 1000:9.2f} ms"
+                f"  {result['items_per_s']:11.0f} /s  {speedup}"
+            )
+            results.append(result)
+
+    if args.output:
+        report = dict(info, timestamp=time.strftime("%Y-%m-%dT%H:%M:%S%z"), results=results)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
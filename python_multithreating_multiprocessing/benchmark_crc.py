@@ -0,0 +1,43 @@
+import timeit
+
+from crc16 import calculate_crc_bitwise, crc16_modbus
+
+# Sample frame captured from the rectifier (same as in start_client)
+FRAME = bytes.fromhex(
+    "0101000053756e4d6f6220546563682e2e2e0000000000030000f400f201220f00000000"
+    "000000000000f400f401230f000000000000000000000000000000000000000000000000"
+    "000000000000000000000000000000000000000000000000000000000000000000000000"
+    "000000000000000000000000000000000000000000000000000000001d00015558110000"
+    "f401000000000000e603220f000000000000010000000000000000000000000000000000"
+    "000000000000000000000000000000000000000000000000000000000000000000000000"
+    "000000000000000000000000000000000000000000000000000000000000000000000000"
+    "00009dd2"
+)
+BATCH = 1000  # Frames per vectorized call
+REPEAT = 5
+
+
+def best_of(stmt, number):
+    # Best time per call in seconds
+    return min(timeit.repeat(stmt, number=number, repeat=REPEAT)) / number
+
+
+if __name__ == "__main__":
+    data = FRAME[:254]
+    assert crc16_modbus(data) == calculate_crc_bitwise(data)
+
+    bitwise = best_of(lambda: calculate_crc_bitwise(data), 200)
+    table = best_of(lambda: crc16_modbus(data), 2000)
+
+    print(f"Bit loop:     {bitwise * 1e6:8.2f} us/frame")
+    print(f"Table driven: {table * 1e6:8.2f} us/frame ({bitwise / table:.1f}x faster)")
+
+    try:
+        from bulk_decoder import crc_valid
+    except ImportError:
+        print("NumPy check:  skipped, numpy not installed")
+    else:
+        frames = FRAME * BATCH
+        assert crc_valid(frames).all()
+        bulk = best_of(lambda: crc_valid(frames), 5) / BATCH
+        print(f"NumPy check:  {bulk * 1e6:8.2f} us/frame ({bitwise / bulk:.1f}x faster)")
@@ -0,0 +1,29 @@
+import logging
+import tempfile
+import time
+
+from benchmark_crc import FRAME
+from rectifier_logging import setup_logging, shutdown_logging
+from user_interface_for_Rectifier import unpack_sm_payload
+
+FRAMES = 20000
+
+
+def decode_rate():
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        unpack_sm_payload(FRAME)
+    return FRAMES / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as log_dir:
+        for name, level in (("off (INFO)", logging.INFO), ("on (DEBUG)", logging.DEBUG)):
+            listener = setup_logging(log_dir, level)
+            try:
+                rate = decode_rate()
+            finally:
+                start = time.perf_counter()
+                shutdown_logging(listener)  # Waits for the writer to catch up
+                flush = time.perf_counter() - start
+            print(f"Debug logging {name}: {rate:9.0f} frames/s, writer flush {flush:.2f} s")
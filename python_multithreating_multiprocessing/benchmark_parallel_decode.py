@@ -0,0 +1,45 @@
+import os
+import time
+
+from parallel_decode import decode_chunk, decode_stream
+from synthetic_frames import FrameGenerator
+
+FRAMES = 100000
+CHARGERS = 10
+BATCH_SIZE = 512
+WORKER_COUNTS = (1, 2, 4, 8)
+
+
+def check_order(messages, expected):
+    # Every charger must see its frames in the order they were received
+    seen = {}
+    for data in messages:
+        seen.setdefault(data["charger"], []).append(data["soc"])
+    return seen == expected
+
+
+if __name__ == "__main__":
+    unique = FrameGenerator(seed=1).frames(1000)
+    stream = [(i % CHARGERS, unique[i % len(unique)]) for i in range(FRAMES)]
+    expected = {}
+    for charger, frame in stream:
+        expected.setdefault(charger, []).append(frame[136])  # SOC byte
+
+    print(f"{FRAMES} frames from {CHARGERS} chargers, {os.cpu_count()} cores")
+
+    start = time.perf_counter()
+    inline = []
+    for charger, frame in stream:
+        inline.extend(decode_chunk(charger, frame))
+    baseline = FRAMES / (time.perf_counter() - start)
+    print(f"inline     {baseline:10.0f} frames/s")
+
+    for workers in WORKER_COUNTS:
+        start = time.perf_counter()
+        messages = list(decode_stream(stream, workers=workers, batch_size=BATCH_SIZE))
+        rate = FRAMES / (time.perf_counter() - start)
+        ordered = "in order" if check_order(messages, expected) else "OUT OF ORDER"
+        print(
+            f"{workers} worker{'s' if workers > 1 else ' '}  {rate:10.0f} frames/s"
+            f"  ({rate / baseline:.2f}x, {ordered})"
+        )
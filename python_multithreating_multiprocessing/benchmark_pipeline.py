@@ -0,0 +1,196 @@
+import argparse
+import json
+import pickle
+import platform
+import sys
+import time
+from multiprocessing import Process, Queue
+
+from crc16 import crc16_modbus
+from render_model import RenderModel
+from shm_transport import SharedMemoryRing
+from sm_frame import MODULE_COUNT, decode_sm_frame
+from synthetic_frames import FrameGenerator
+from user_interface_for_Rectifier import record_to_display_data, unpack_sm_payload
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def summarize(name, latencies_ns, elapsed, items):
+    """
+    Throughput and latency percentiles for one stage.
+
+    :param latencies_ns: Per-item latencies in nanoseconds.
+    :param elapsed: Wall time for all items in seconds.
+    :param items: Number of items processed.
+    :return: Dict ready for JSON.
+    """
+    latencies_ns = sorted(latencies_ns)
+    result = {
+        "stage": name,
+        "items": items,
+        "throughput_per_s": items / elapsed if elapsed else None,
+    }
+    for p in PERCENTILES:
+        index = min(len(latencies_ns) - 1, int(len(latencies_ns) * p / 100))
+        result[f"p{p}_us"] = latencies_ns[index] / 1000
+    result["max_us"] = latencies_ns[-1] / 1000
+    return result
+
+
+def measure(name, func, items):
+    # Time every call separately, plus the whole run for throughput
+    latencies = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for item in items:
+        t0 = clock()
+        func(item)
+        latencies.append(clock() - t0)
+    return summarize(name, latencies, time.perf_counter() - start, len(items))
+
+
+def _produce(transport, messages, rate):
+    interval = 1 / rate
+    next_send = time.perf_counter()
+    for data in messages:
+        next_send += interval
+        while time.perf_counter() < next_send:
+            pass
+        data["timestamp_ns"] = time.perf_counter_ns()
+        transport.put(data)
+
+
+def measure_transfer(name, transport, messages, rate):
+    # Cross-process latency from put() in a paced producer to get() here
+    producer = Process(target=_produce, args=(transport, messages, rate))
+    latencies = []
+    start = time.perf_counter()
+    producer.start()
+    for _ in range(len(messages)):
+        data = transport.get()
+        latencies.append(time.perf_counter_ns() - data["timestamp_ns"])
+    elapsed = time.perf_counter() - start
+    producer.join()
+    result = summarize(name, latencies, elapsed, len(messages))
+    result["paced_rate"] = rate  # Throughput is set by the producer here
+    return result
+
+
+def compare(report, baseline, tolerance):
+    """
+    Stages whose throughput fell more than tolerance below the baseline.
+
+    :param report: Result of run().
+    :param baseline: Earlier result of run(), e.g. loaded from JSON.
+    :param tolerance: Allowed slowdown as a fraction, e.g. 0.1 for 10 %.
+    :return: List of (stage, baseline throughput, current throughput).
+    """
+    previous = {r["stage"]: r["throughput_per_s"] for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get(result["stage"])
+        if "paced_rate" in result:
+            continue  # Only latency is meaningful for paced stages
+        if before and result["throughput_per_s"] < before * (1 - tolerance):
+            regressions.append((result["stage"], before, result["throughput_per_s"]))
+    return regressions
+
+
+def run(frame_count, seed, transfer_rate):
+    frames = FrameGenerator(seed).frames(frame_count)
+    batch = b"".join(frames)
+    records = [decode_sm_frame(frame) for frame in frames]
+    messages = [record_to_display_data(record) for record in records]
+    results = []
+
+    # CRC
+    results.append(measure("crc.table", lambda f: crc16_modbus(memoryview(f)[:254]), frames))
+    try:
+        from bulk_decoder import crc_valid
+    except ImportError:
+        pass  # numpy not installed
+    else:
+        # Batch stages only have a whole-batch time, reported as every percentile
+        start = time.perf_counter()
+        crc_valid(batch)
+        elapsed = time.perf_counter() - start
+        results.append(
+            summarize("crc.bulk_numpy", [elapsed * 1e9 / frame_count], elapsed, frame_count)
+        )
+
+    # Decode
+    results.append(measure("decode.record", decode_sm_frame, frames))
+    results.append(
+        measure("decode.display_data", lambda f: record_to_display_data(decode_sm_frame(f)), frames)
+    )
+    results.append(measure("decode.dict", unpack_sm_payload, frames))
+    try:
+        from bulk_decoder import decode_frames
+    except ImportError:
+        pass  # numpy not installed
+    else:
+        start = time.perf_counter()
+        decode_frames(batch)
+        elapsed = time.perf_counter() - start
+        results.append(
+            summarize("decode.bulk_numpy", [elapsed * 1e9 / frame_count], elapsed, frame_count)
+        )
+
+    # Serialization and queue transfer
+    results.append(measure("serialize.pickle", lambda m: pickle.loads(pickle.dumps(m)), messages))
+    transfer = messages[: min(len(messages), transfer_rate * 2)]
+    results.append(measure_transfer("transfer.mp_queue", Queue(), transfer, transfer_rate))
+    ring = SharedMemoryRing()
+    try:
+        results.append(measure_transfer("transfer.shm_ring", ring, transfer, transfer_rate))
+    finally:
+        ring.close()
+
+    # Render model (headless)
+    model = RenderModel(module_count=MODULE_COUNT)
+    results.append(measure("render.model", model.changed_labels, messages))
+
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "frames": frame_count,
+        "seed": seed,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rectifier telemetry pipeline benchmark")
+    parser.add_argument("--frames", type=int, default=20000, help="synthetic frames per stage")
+    parser.add_argument("--seed", type=int, default=0, help="frame generator seed")
+    parser.add_argument(
+        "--transfer-rate", type=int, default=2000, help="messages/s for the transfer stages"
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results to check for regressions against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="allowed throughput drop, 0.1 = 10 %%"
+    )
+    args = parser.parse_args()
+
+    report = run(args.frames, args.seed, args.transfer_rate)
+
+    for result in report["results"]:
+        print(
+            f"{result['stage']:22} {result['throughput_per_s']:12.0f} /s"
+            f"  p50 {result['p50_us']:9.2f} us  p99 {result['p99_us']:9.2f} us"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for stage, before, now in regressions:
+            print(f"REGRESSION {stage}: {before:.0f} /s -> {now:.0f} /s")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NAME = "rectifier_display"
+
+# How each variant is built and started; source runs the scripts unpacked
+VARIANTS = {
+    "source": [sys.executable, os.path.join(HERE, "frontend.py")],
+    "onedir": [os.path.join(HERE, "dist", NAME, NAME)],
+    "onefile": [os.path.join(HERE, "dist", f"{NAME}_onefile")],
+}
+if os.name == "nt":
+    for variant in ("onedir", "onefile"):
+        VARIANTS[variant][0] += ".exe"
+
+
+def build(variant):
+    """
+    Build one packaged variant with PyInstaller from fast_start.py.
+
+    onedir leaves the interpreter and modules unpacked next to the
+    executable; onefile unpacks them to a temporary directory on every
+    start, which is what its extra startup time is spent on.
+
+    :param variant: "onedir" or "onefile".
+    """
+    name = NAME if variant == "onedir" else f"{NAME}_onefile"
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "PyInstaller",
+            f"--{variant}",
+            "--noconfirm",
+            "--name",
+            name,
+            # frontend is run with runpy, so PyInstaller cannot see the import
+            "--hidden-import",
+            "frontend",
+            # Only the bulk decoder uses NumPy and the display never does
+            "--exclude-module",
+            "numpy",
+            "fast_start.py",
+        ],
+        cwd=HERE,
+        check=True,
+    )
+
+
+def drop_caches():
+    # Evict the page cache for a cold start (Linux, as root); False if not allowed
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except (AttributeError, OSError):
+        return False
+
+
+def launch(command, extra_args, timeout):
+    """
+    Start the display with --startup-probe and time it.
+
+    The display prints time.monotonic_ns() when its window is shown and
+    when the first message is on screen, then quits; the monotonic clock
+    is system-wide, so both are measured from just before the launch.
+
+    :param command: Executable and arguments of the variant.
+    :param extra_args: Further frontend arguments, e.g. ["--view", "dashboard"].
+    :param timeout: Seconds before the display is killed.
+    :return: Dict of window_ms, first_frame_ms and exit_ms.
+    """
+    start_ns = time.monotonic_ns()
+    process = subprocess.Popen(
+        command + ["--startup-probe"] + extra_args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        stdout, stderr = process.communicate()
+    exit_ms = (time.monotonic_ns() - start_ns) / 1e6
+
+    marks = {}
+    for line in stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == "startup":
+            marks[f"{parts[1]}_ms"] = (int(parts[2]) - start_ns) / 1e6
+    if "first_frame_ms" not in marks:
+        raise RuntimeError(
+            f"{command[-1]} showed no frame (exit code {process.returncode}):\n{stderr[-2000:]}"
+        )
+    marks["exit_ms"] = exit_ms
+    return marks
+
+
+def measure(variant, runs, extra_args, timeout):
+    """
+    One cold start and runs warm starts of a variant.
+
+    The cold start comes after dropping the page cache where that is
+    allowed, otherwise it is only the first start since the build or boot,
+    marked by cache_dropped False.
+
+    :return: Dict ready for JSON with the cold times and warm p50, min and max.
+    """
+    command = VARIANTS[variant]
+    cache_dropped = drop_caches()
+    cold = launch(command, extra_args, timeout)
+    warm = [launch(command, extra_args, timeout) for _ in range(runs)]
+    result = {"variant": variant, "cache_dropped": cache_dropped, "runs": runs}
+    for key in ("window_ms", "first_frame_ms", "exit_ms"):
+        result[f"cold_{key}"] = cold[key]
+        values = sorted(run[key] for run in warm)
+        result[f"p50_{key}"] = values[len(values) // 2]
+        result[f"min_{key}"] = values[0]
+        result[f"max_{key}"] = values[-1]
+    return result
+
+
+def check_budget(report, budget):
+    """
+    Startup times over their budget.
+
+    :param report: Report with results from measure().
+    :param budget: {variant: {"first_frame_ms": limit, ...}}, keys are
+        result fields, e.g. loaded from startup_budget.json.
+    :return: List of (variant, field, limit, measured).
+    """
+    over = []
+    for result in report["results"]:
+        for key, limit in budget.get(result["variant"], {}).items():
+            if result[key] > limit:
+                over.append((result["variant"], key, limit, result[key]))
+    return over
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time to window and first rendered frame of the display, from source and packaged"
+    )
+    parser.add_argument(
+        "--variant", choices=VARIANTS, action="append", help="default: all that exist"
+    )
+    parser.add_argument("--build", action="store_true", help="build onedir and onefile with PyInstaller first")
+    parser.add_argument("--runs", type=int, default=10, help="warm starts per variant")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a start counts as hung")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument(
+        "--budget",
+        nargs="?",
+        const=os.path.join(HERE, "startup_budget.json"),
+        help="JSON budget to check, exit 1 when over (default file: startup_budget.json)",
+    )
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="after --, passed on to frontend")
+    args = parser.parse_args()
+    extra_args = [a for a in args.args if a != "--"]
+
+    variants = args.variant or list(VARIANTS)
+    if args.build:
+        for variant in variants:
+            if variant != "source":
+                build(variant)
+    missing = [v for v in variants if not os.path.exists(VARIANTS[v][0])]
+    if args.variant and missing:
+        parser.error(f"not built: {', '.join(missing)}, run with --build")
+    variants = [v for v in variants if v not in missing]
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "frontend_args": extra_args,
+        "results": [measure(variant, args.runs, extra_args, args.timeout) for variant in variants],
+    }
+
+    for result in report["results"]:
+        print(
+            f"{result['variant']:8} cold{'' if result['cache_dropped'] else '*'}"
+            f" window {result['cold_window_ms']:7.1f} ms  first frame {result['cold_first_frame_ms']:7.1f} ms"
+            f" | warm p50 window {result['p50_window_ms']:7.1f} ms"
+            f"  first frame {result['p50_first_frame_ms']:7.1f} ms"
+            f" ({result['min_first_frame_ms']:.1f}-{result['max_first_frame_ms']:.1f})"
+        )
+    if any(not result["cache_dropped"] for result in report["results"]):
+        print("* page cache not dropped (needs root on Linux): first start only")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.budget:
+        with open(args.budget) as f:
+            over = check_budget(report, json.load(f))
+        for variant, key, limit, measured in over:
+            print(f"OVER BUDGET {variant} {key}: {measured:.1f} ms > {limit:.1f} ms")
+        sys.exit(1 if over else 0)
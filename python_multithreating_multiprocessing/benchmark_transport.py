@@ -0,0 +1,68 @@
+import statistics
+import time
+from multiprocessing import Process, Queue
+
+from shm_transport import SharedMemoryRing
+
+MESSAGES = 20000
+CAPACITY = 1024  # Ring slots
+PACED_RATE = 2000  # Messages per second for the latency run
+
+
+def producer(transport, count, cpu_queue, rate=None):
+    start_cpu = time.process_time()
+    data = {
+        "soc": 55,
+        "soh": 98,
+        "temp": [24.4, 24.4, 0.0, 0.0, 0.0, 0.0, 0.0],
+        "current": [49.8, 50.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        "voltage": [387.4, 387.5, 0.0, 0.0, 0.0, 0.0, 0.0],
+        "charger": "charger-1",
+    }
+    interval = 0 if rate is None else 1 / rate
+    next_send = time.perf_counter()
+    for _ in range(count):
+        if interval:
+            next_send += interval
+            while time.perf_counter() < next_send:
+                pass
+        data["timestamp_ns"] = time.perf_counter_ns()
+        transport.put(data)
+    cpu_queue.put(time.process_time() - start_cpu)
+
+
+def run(name, transport, rate=None):
+    cpu_queue = Queue()
+    process = Process(target=producer, args=(transport, MESSAGES, cpu_queue, rate))
+    latencies = []
+
+    start = time.perf_counter()
+    start_cpu = time.process_time()
+    process.start()
+    for _ in range(MESSAGES):
+        data = transport.get()
+        latencies.append(time.perf_counter_ns() - data["timestamp_ns"])
+    consumer_cpu = time.process_time() - start_cpu
+    elapsed = time.perf_counter() - start
+    producer_cpu = cpu_queue.get()
+    process.join()
+
+    latencies.sort()
+    print(f"{name} ({'flat out' if rate is None else f'{rate} msg/s'}):")
+    print(f"  throughput    {MESSAGES / elapsed:10.0f} msg/s")
+    print(f"  latency p50   {statistics.median(latencies) / 1000:10.1f} us")
+    print(f"  latency p99   {latencies[int(len(latencies) * 0.99)] / 1000:10.1f} us")
+    if rate is None:  # Paced producer busy-waits, its CPU time means nothing
+        print(f"  producer CPU  {producer_cpu / MESSAGES * 1e6:10.2f} us/msg")
+    print(f"  consumer CPU  {consumer_cpu / MESSAGES * 1e6:10.2f} us/msg")
+
+
+if __name__ == "__main__":
+    for rate in (None, PACED_RATE):
+        run("multiprocessing.Queue", Queue(), rate)
+
+        ring = SharedMemoryRing(CAPACITY)
+        try:
+            run("SharedMemoryRing", ring, rate)
+        finally:
+            ring.close()
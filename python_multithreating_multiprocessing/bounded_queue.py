@@ -0,0 +1,323 @@
+import os
+import queue as queue_module
+import threading
+import time
+from multiprocessing import Pipe, Queue, RawArray
+
+# What put() does when the queue is full:
+# block: wait for the consumer (backpressure on the producer)
+# drop_oldest: remove the oldest message to make room (needs a queue the producer may read)
+# drop_newest: discard the message being put
+# latest_per_charger: hold back the newest message per charger and send it when
+#   there is room, discarding older ones of the same charger; a producer thread
+#   retries every FLUSH_INTERVAL, so the last messages arrive after the producer
+#   goes quiet
+POLICIES = ("block", "drop_oldest", "drop_newest", "latest_per_charger")
+FLUSH_INTERVAL = 0.05  # Seconds
+
+# Shared counters; each has one writer, the consumer only writes _RECEIVED.
+# _ARMED is the wakeup handshake: the consumer sets it before it goes idle,
+# the producer clears it and writes one byte to the wakeup pipe.
+_PUT, _SENT, _DROPPED, _EVICTED, _PEAK, _BLOCKED_NS, _RECEIVED, _ARMED = range(8)
+
+
+class BoundedQueue:
+    """
+    Queue wrapper with a size limit and a policy for when it is full.
+
+    Implements the queue interface used by the producers and the display
+    (put, get, get_nowait, empty, qsize), so it can be passed wherever the
+    unbounded multiprocessing.Queue was. The wrapped queue does the
+    transport: a multiprocessing.Queue(maxsize) by default, or a
+    SharedMemoryRing, which is bounded by its capacity. Counters live in
+    shared memory so both processes see them; there must be one producer
+    process and one consumer process.
+
+    Memory while the consumer stalls is bounded by maxsize messages, plus
+    one held-back message per charger with latest_per_charger.
+
+    With wakeup=True the consumer can sleep on a pipe instead of polling:
+    after arm(), the next message sent writes one byte to the pipe whose
+    file descriptor wakeup_fileno() returns (see FrameScheduler). Messages
+    sent while the consumer is busy cost no write.
+    """
+
+    def __init__(self, maxsize=1024, policy="block", queue=None, metrics=None, wakeup=False):
+        """
+        :param maxsize: Messages the queue holds; ignored when queue is given.
+        :param policy: One of POLICIES.
+        :param queue: Bounded queue to wrap, None creates a multiprocessing.Queue(maxsize).
+        :param metrics: PipelineMetrics counting dropped messages as "queue_drops", or None.
+        :param wakeup: Create the wakeup pipe (POSIX only, ignored elsewhere).
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.queue = Queue(maxsize) if queue is None else queue
+        self.maxsize = getattr(queue, "capacity", maxsize)
+        self.policy = policy
+        self.metrics = metrics
+        self.counters = RawArray("q", 8)
+        self.pending = {}  # latest_per_charger: charger -> message not sent yet (producer only)
+        self.pending_lock = None  # Created with the flush thread, in the producer
+        self.wake_reader = self.wake_writer = None
+        if wakeup and os.name == "posix":
+            self.wake_reader, self.wake_writer = Pipe(duplex=False)
+            os.set_blocking(self.wake_reader.fileno(), False)
+            os.set_blocking(self.wake_writer.fileno(), False)
+
+    def stats(self):
+        counters = self.counters
+        return {
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "put": counters[_PUT],
+            "sent": counters[_SENT],
+            "dropped": counters[_DROPPED],
+            "received": counters[_RECEIVED],
+            "depth": self.qsize(),
+            "peak_depth": counters[_PEAK],
+            "blocked_s": counters[_BLOCKED_NS] / 1e9,
+        }
+
+    # Producer side
+
+    def put(self, data, block=True, timeout=None):
+        """
+        Send one message according to the policy.
+
+        :param block: Only used by the block policy, the others never wait.
+        :param timeout: Maximum wait in seconds for the block policy; raises
+            queue.Full when it runs out.
+        """
+        self.counters[_PUT] += 1
+        policy = self.policy
+        if policy == "latest_per_charger":
+            if self.pending_lock is None:
+                self._start_flusher()
+            with self.pending_lock:
+                charger = data.get("charger")
+                if self.pending.pop(charger, None) is not None:
+                    self._drop()
+                self.pending[charger] = data
+                self.flush()
+            return
+        try:
+            self.queue.put(data, False)
+        except queue_module.Full:
+            if policy == "block":
+                started_ns = time.monotonic_ns()
+                try:
+                    self.queue.put(data, block, timeout)
+                finally:
+                    self.counters[_BLOCKED_NS] += time.monotonic_ns() - started_ns
+            elif policy == "drop_newest":
+                self._drop()
+                return
+            else:
+                self._put_evicting(data)
+        self._sent()
+
+    def flush(self):
+        """
+        Send held-back messages, oldest first, while there is room.
+
+        :return: Number of messages still held back.
+        """
+        pending = self.pending
+        while pending:
+            charger = next(iter(pending))
+            try:
+                self.queue.put(pending[charger], False)
+            except queue_module.Full:
+                break
+            del pending[charger]
+            self._sent()
+        return len(pending)
+
+    def dropped(self):
+        # Messages dropped so far by either policy, e.g. to resend state after a loss
+        return self.counters[_DROPPED]
+
+    def _start_flusher(self):
+        # Send held-back messages when no put() comes to do it
+        self.pending_lock = threading.Lock()
+
+        def run():
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                if self.pending:
+                    with self.pending_lock:
+                        self.flush()
+
+        threading.Thread(target=run, name="queue-flush", daemon=True).start()
+
+    def _put_evicting(self, data):
+        # drop_oldest: take messages off the front until this one fits
+        while True:
+            try:
+                self.queue.get_nowait()
+                self.counters[_EVICTED] += 1
+                self._drop()
+            except queue_module.Empty:
+                time.sleep(0.0005)  # Full but not readable yet: still in the feeder thread
+            try:
+                self.queue.put(data, False)
+                return
+            except queue_module.Full:
+                pass
+
+    def _sent(self):
+        counters = self.counters
+        counters[_SENT] += 1
+        depth = counters[_SENT] - counters[_RECEIVED] - counters[_EVICTED]
+        if depth > counters[_PEAK]:
+            counters[_PEAK] = depth
+        if counters[_ARMED] and self.wake_writer is not None:
+            counters[_ARMED] = 0
+            try:
+                os.write(self.wake_writer.fileno(), b"\0")
+            except BlockingIOError:
+                pass  # Pipe full, the consumer has plenty of wakeups pending
+
+    def _drop(self):
+        self.counters[_DROPPED] += 1
+        if self.metrics is not None:
+            self.metrics.count("queue_drops")
+
+    # Consumer side
+
+    def get_nowait(self):
+        data = self.queue.get_nowait()
+        self.counters[_RECEIVED] += 1
+        return data
+
+    def get(self, block=True, timeout=None):
+        data = self.queue.get(block, timeout)
+        self.counters[_RECEIVED] += 1
+        return data
+
+    def qsize(self):
+        # From the counters: multiprocessing.Queue.qsize() is missing on macOS
+        counters = self.counters
+        return max(0, counters[_SENT] - counters[_RECEIVED] - counters[_EVICTED])
+
+    def empty(self):
+        return self.queue.empty()
+
+    def wakeup_fileno(self):
+        # Readable when a message arrived after arm(), None without a wakeup pipe
+        return None if self.wake_reader is None else self.wake_reader.fileno()
+
+    def arm(self):
+        # Ask for a wakeup byte with the next message; check qsize() afterwards
+        # for messages sent just before
+        self.counters[_ARMED] = 1
+
+    def clear_wakeup(self):
+        # Read all pending wakeup bytes
+        try:
+            while os.read(self.wake_reader.fileno(), 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        close = getattr(self.queue, "close", None)
+        if close is not None:
+            close()
+        if self.wake_reader is not None:
+            self.wake_reader.close()
+            self.wake_writer.close()
+
+
+def _rss_kib(pid="self"):
+    # Resident set size from /proc (Linux), None elsewhere
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def _soak_producer(transport, messages, chargers, rate, seconds):
+    # Put tagged messages at a fixed rate, catching up after a blocked put
+    next_put = time.monotonic()
+    end = next_put + seconds
+    sent = 0
+    while time.monotonic() < end:
+        data = dict(messages[(sent // chargers) % len(messages)])
+        data["charger"] = f"charger{sent % chargers:03d}"
+        transport.put(data)
+        sent += 1
+        next_put += 1 / rate
+        delay = next_put - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Soak test: a producer at a fixed rate while the consumer stalls, per policy;
+# exits 1 when a bounded policy's producer grows by more than --max-growth
+if __name__ == "__main__":
+    import argparse
+    from multiprocessing import Process
+
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import drifting_frames
+    from user_interface_for_Rectifier import record_to_display_data
+
+    parser = argparse.ArgumentParser(description="Memory and queue depth while the consumer stalls")
+    parser.add_argument("--policy", choices=("unbounded",) + POLICIES, action="append", help="default: all")
+    parser.add_argument("--maxsize", type=int, default=1024)
+    parser.add_argument("--chargers", type=int, default=40)
+    parser.add_argument("--rate", type=float, default=2000.0, help="messages/s from the producer")
+    parser.add_argument("--stall", type=float, default=6.0, help="seconds the consumer reads nothing")
+    parser.add_argument("--seconds", type=float, default=9.0, help="producer run time")
+    parser.add_argument(
+        "--max-growth",
+        type=int,
+        default=1024,
+        help="KiB the producer RSS may grow during the stall with a bounded policy "
+        "(unbounded grows about 3 MB at the defaults)",
+    )
+    args = parser.parse_args()
+    failed = []
+
+    messages = [record_to_display_data(decode_sm_frame(f)) for f in drifting_frames(100)]
+    for policy in args.policy or ("unbounded",) + POLICIES:
+        transport = Queue() if policy == "unbounded" else BoundedQueue(args.maxsize, policy)
+        producer = Process(
+            target=_soak_producer, args=(transport, messages, args.chargers, args.rate, args.seconds)
+        )
+        producer.start()
+        start = time.monotonic()
+        samples = []  # (seconds, producer RSS KiB, depth)
+        received = 0
+        while producer.is_alive() or not transport.empty():
+            now = time.monotonic() - start
+            if now >= args.stall:
+                while True:  # Catch up, like the display after a window drag
+                    try:
+                        transport.get_nowait()
+                        received += 1
+                    except queue_module.Empty:
+                        break
+            depth = transport.qsize() if policy != "unbounded" else None
+            samples.append((now, _rss_kib(producer.pid), depth))
+            time.sleep(0.25)
+            if now > args.seconds + 5:
+                break
+        producer.join()
+
+        stalled = [rss for t, rss, _ in samples if rss is not None and 1.0 <= t < args.stall]
+        growth = stalled[-1] - stalled[0] if len(stalled) > 1 else None
+        verdict = ""
+        if policy != "unbounded" and growth is not None and growth > args.max_growth:
+            failed.append(policy)
+            verdict = f"  FAIL, over {args.max_growth} KiB"
+        shown = f"{growth:+7d} KiB" if growth is not None else "n/a"
+        print(f"{policy:19} producer RSS during the stall {shown}  received {received}{verdict}")
+        if policy != "unbounded":
+            print(f"{'':19} {transport.stats()}")
+    raise SystemExit(1 if failed else 0)
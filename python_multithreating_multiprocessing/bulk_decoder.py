@@ -0,0 +1,75 @@
+import numpy as np
+
+from crc16 import CRC16_INIT, CRC16_WORD_TABLE
+from frame_schema import FRAME_SIZE, LAYOUT
+
+# Raw and decoded frame layouts, compiled from frame_schema
+RAW_FRAME_DTYPE = LAYOUT.raw_dtype()
+DECODED_DTYPE = LAYOUT.decoded_dtype()
+
+_WORD_TABLE = np.array(CRC16_WORD_TABLE, dtype=np.uint16)
+CRC_CHUNK_FRAMES = 4096  # Frames checked together by crc_valid
+
+
+def frames_view(buffer):
+    """
+    View a buffer of back-to-back frames as a raw structured array.
+
+    :param buffer: Bytes-like object whose length is a multiple of 256.
+    :return: Array of RAW_FRAME_DTYPE sharing memory with buffer.
+    """
+    if len(memoryview(buffer).cast("B")) % FRAME_SIZE:
+        raise ValueError(f"Buffer length is not a multiple of {FRAME_SIZE}")
+    return np.frombuffer(buffer, dtype=RAW_FRAME_DTYPE)
+
+
+def crc_valid(buffer, chunk_frames=CRC_CHUNK_FRAMES):
+    """
+    Vectorized CRC-16/MODBUS check of every frame in buffer.
+
+    Loops over the 127 data words of a frame, each step processing the
+    same word of a whole chunk of frames at once.
+
+    :param buffer: Bytes-like object whose length is a multiple of 256.
+    :param chunk_frames: Frames per chunk, sized to keep a chunk in cache.
+    :return: Boolean array, True where the frame CRC matches.
+    """
+    raw = frames_view(buffer)
+    words = np.frombuffer(buffer, dtype="<u2").reshape(len(raw), FRAME_SIZE // 2)
+    valid = np.empty(len(raw), dtype=bool)
+
+    for start in range(0, len(raw), chunk_frames):
+        chunk = words[start : start + chunk_frames]
+        crc = np.full(len(chunk), CRC16_INIT, dtype=np.uint16)
+        for index in range(FRAME_SIZE // 2 - 1):
+            crc = _WORD_TABLE[crc ^ chunk[:, index]]
+        valid[start : start + chunk_frames] = crc == raw["crc"][start : start + chunk_frames]
+    return valid
+
+
+def decode_frames(buffer):
+    """
+    Decode N frames at once into a NumPy structured array.
+
+    Every field of frame_schema is converted column by column: scaled
+    fields are divided into floats, bit fields are shifted and masked.
+
+    :param buffer: Bytes-like object holding N back-to-back 256 byte frames.
+    :return: Array of DECODED_DTYPE with one row per frame.
+    """
+    raw = frames_view(buffer)
+    modules = raw["modules"]
+    out = np.empty(len(raw), dtype=DECODED_DTYPE)
+
+    for field in LAYOUT.fields:
+        column = raw[field["name"]]
+        out[field["name"]] = column / field["divisor"] if "divisor" in field else column
+        for name, (shift, width) in field.get("bits", {}).items():
+            out[name] = (column >> shift) & ((1 << width) - 1)
+
+    for field in LAYOUT.module_fields:
+        column = modules[field["name"]]
+        out[field["property"]] = column / field["divisor"] if "divisor" in field else column
+
+    out["crc_valid"] = crc_valid(buffer)
+    return out
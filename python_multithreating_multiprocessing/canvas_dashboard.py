@@ -0,0 +1,317 @@
+import time
+import tkinter as tk
+
+from delta_protocol import DeltaReceiver
+from frame_scheduler import FrameScheduler
+from frame_schema import LAYOUT, MODULE_COUNT
+from render_model import drain_latest
+
+ROW_HEIGHT = 20  # Pixels per charger row
+NAME_WIDTH = 110  # Charger name column
+VALUE_WIDTH = 56  # Every value column
+FONT = ("Arial", 9)
+HEADER_FONT = ("Arial", 9, "bold")
+
+
+def format_value(value):
+    return "NA" if value is None else f"{value:.1f}"
+
+
+def format_text(value):
+    return "NA" if value is None else str(value)
+
+
+def dashboard_columns(module_count=MODULE_COUNT):
+    """
+    Value columns of the dashboard grid, after the charger name.
+
+    :return: List of (header text, display message key, module number or None, formatter).
+    """
+    columns = [("SOC %", "soc", None, format_value), ("SOH", "soh", None, format_text)]
+    for module in range(module_count):
+        for key, _, label, unit in LAYOUT.display_fields():
+            columns.append((f"M{module + 1} {unit}", key, module, format_value))
+    return columns
+
+
+class DashboardGrid:
+    """
+    Charger x module grid drawn with text items on one Canvas.
+
+    Only the rows that fit on the canvas have items: one text item per cell,
+    created once and reused. Scrolling rebinds the row slots to other
+    chargers instead of creating items, so the item count, and the cost of
+    a redraw, depends on the window size and not on how many chargers
+    there are. Messages only mark their charger dirty; render() then
+    updates the visible dirty rows in one batch per frame tick, and only
+    items whose text changed.
+    """
+
+    def __init__(self, canvas, module_count=MODULE_COUNT):
+        self.canvas = canvas
+        self.columns = dashboard_columns(module_count)
+        self.chargers = []  # Row order: order of first message
+        self.latest = {}  # charger -> newest display message
+        self.dirty = set()  # Chargers with messages not rendered yet
+        self.first_row = 0  # Scroll position
+        self.slots = []  # Per visible row: [charger shown or None, item ids, texts shown]
+
+        # Counters
+        self.messages = 0
+        self.renders = 0
+        self.item_updates = 0
+        self.item_updates_skipped = 0
+
+        for column, (header, _, _, _) in enumerate(self.columns):
+            canvas.create_text(
+                NAME_WIDTH + column * VALUE_WIDTH + VALUE_WIDTH - 4, ROW_HEIGHT // 2,
+                text=header, anchor="e", font=HEADER_FONT,
+            )
+        canvas.create_text(4, ROW_HEIGHT // 2, text="Charger", anchor="w", font=HEADER_FONT)
+        canvas.create_line(0, ROW_HEIGHT, self.width, ROW_HEIGHT)
+
+    @property
+    def width(self):
+        return NAME_WIDTH + len(self.columns) * VALUE_WIDTH
+
+    def stats(self):
+        return {
+            "chargers": len(self.chargers),
+            "visible_rows": len(self.slots),
+            "items": len(self.slots) * (len(self.columns) + 1),
+            "messages": self.messages,
+            "renders": self.renders,
+            "item_updates": self.item_updates,
+            "item_updates_skipped": self.item_updates_skipped,
+        }
+
+    def update(self, data):
+        # Remember the newest message; drawing waits for render()
+        charger = data.get("charger")
+        if charger not in self.latest:
+            self.chargers.append(charger)
+        self.latest[charger] = data
+        self.dirty.add(charger)
+        self.messages += 1
+
+    def resize(self, height):
+        """
+        Create or delete row slots so that the rows fit in height pixels.
+
+        :param height: Canvas height in pixels.
+        """
+        rows = max(0, height // ROW_HEIGHT - 1)  # Minus the header row
+        canvas = self.canvas
+        while len(self.slots) < rows:
+            y = (len(self.slots) + 1) * ROW_HEIGHT + ROW_HEIGHT // 2
+            items = [canvas.create_text(4, y, text="", anchor="w", font=FONT)]
+            for column in range(len(self.columns)):
+                x = NAME_WIDTH + column * VALUE_WIDTH + VALUE_WIDTH - 4
+                items.append(canvas.create_text(x, y, text="", anchor="e", font=FONT))
+            self.slots.append([None, items, [""] * len(items)])
+        for slot in self.slots[rows:]:
+            for item in slot[1]:
+                canvas.delete(item)
+        del self.slots[rows:]
+        self.scroll(0)
+
+    def scroll(self, rows):
+        # Move the view by rows, clamped so the last row stays at the bottom
+        last = max(0, len(self.chargers) - len(self.slots))
+        self.first_row = min(max(self.first_row + rows, 0), last)
+
+    def render(self):
+        """
+        Bring the visible rows up to date in one batch.
+
+        :return: Number of canvas items changed.
+        """
+        canvas = self.canvas
+        dirty = self.dirty
+        changed = 0
+        for i, slot in enumerate(self.slots):
+            row = self.first_row + i
+            charger = self.chargers[row] if row < len(self.chargers) else None
+            if charger == slot[0] and charger not in dirty:
+                continue
+            slot[0] = charger
+            data = self.latest.get(charger) if charger is not None else None
+            texts = self.row_texts(charger, data)
+            shown = slot[2]
+            for index, text in enumerate(texts):
+                if text == shown[index]:
+                    continue
+                shown[index] = text
+                canvas.itemconfigure(slot[1][index], text=text)
+                changed += 1
+        # Rows out of view are redrawn from latest when they scroll in
+        dirty.clear()
+        self.renders += 1
+        self.item_updates += changed
+        self.item_updates_skipped += len(self.slots) * (len(self.columns) + 1) - changed
+        return changed
+
+    def row_texts(self, charger, data):
+        if data is None:
+            return [""] * (len(self.columns) + 1)
+        texts = [str(charger)]
+        for _, key, module, formatter in self.columns:
+            value = data.get(key)
+            if module is not None:
+                value = value[module] if value is not None and module < len(value) else None
+            texts.append(formatter(value))
+        return texts
+
+
+class CanvasDashboard:
+    """
+    Wall-screen view of every charger: a DashboardGrid in its own window.
+
+    Every frame tick drains the queue, keeps the newest message per charger
+    and renders the grid once, so the redraw rate is capped at max_fps
+    however fast messages arrive. Ticks run when data arrives, see
+    FrameScheduler. With metrics, the GUI stages are recorded like in
+    PowerModuleDisplay: queue age of every message, render time and frame
+    age of the newest one drawn per charger, and messages drained but
+    never drawn as conflated.
+    """
+
+    def __init__(self, queue, module_count=MODULE_COUNT, max_fps=20, metrics=None):
+        self.queue = DeltaReceiver(queue)  # Live data, full snapshots or keyframes and deltas
+        self.metrics = metrics  # PipelineMetrics shared with the data process, None disables them
+        self.interval_ms = max(1, int(1000 / max_fps))
+        self.on_first_frame = None  # Called once, after the first message is on screen
+
+        self.root = tk.Tk()
+        self.root.title("Charger Dashboard")
+        self.canvas = tk.Canvas(self.root, background="white", highlightthickness=0)
+        self.grid = DashboardGrid(self.canvas, module_count)
+        self.canvas.configure(width=self.grid.width, height=ROW_HEIGHT * 41)
+        self.canvas.pack(fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", lambda event: self.grid.resize(event.height))
+        self.root.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.root.bind("<Button-4>", lambda event: self.scroll(-1))  # X11 wheel
+        self.root.bind("<Button-5>", lambda event: self.scroll(1))
+        self.root.bind("<Up>", lambda event: self.scroll(-1))
+        self.root.bind("<Down>", lambda event: self.scroll(1))
+        self.root.bind("<Prior>", lambda event: self.scroll(-len(self.grid.slots)))
+        self.root.bind("<Next>", lambda event: self.scroll(len(self.grid.slots)))
+
+        self.scheduler = FrameScheduler(self.root, queue, self.tick, max_fps, poll_ms=self.interval_ms)
+
+    def scroll(self, rows):
+        self.grid.scroll(rows)
+        self.grid.render()
+
+    def tick(self):
+        metrics = self.metrics
+        try:
+            started_ns = time.monotonic_ns()
+            latest, drained = drain_latest(self.queue, None if metrics is None else self.note_queue_age)
+            for data in latest.values():
+                self.grid.update(data)
+            self.grid.render()
+            if metrics is not None and latest:
+                now_ns = time.monotonic_ns()
+                metrics.count("renders")
+                metrics.count("conflated", drained - len(latest))
+                metrics.record("render", now_ns - started_ns)
+                for data in latest.values():
+                    if "timestamp_ns" in data:
+                        metrics.record("frame_age", now_ns - data["timestamp_ns"])
+            if latest and self.on_first_frame is not None:
+                callback, self.on_first_frame = self.on_first_frame, None
+                callback()
+        except Exception as e:
+            print(f"Error updating data: {e}")
+            if metrics is not None:
+                metrics.count("gui_exceptions")
+
+    def note_queue_age(self, data):
+        if "timestamp_ns" in data:
+            self.metrics.record("queue_age", time.monotonic_ns() - data["timestamp_ns"])
+
+    def run(self):
+        self.root.mainloop()
+
+
+class NullCanvas:
+    """
+    Stand-in for tk.Canvas without a display: counts item calls, draws nothing.
+
+    Used by the headless benchmark to time everything up to the Tk call.
+    """
+
+    def __init__(self):
+        self.next_item = 1
+        self.calls = 0
+
+    def create_text(self, *args, **options):
+        self.next_item += 1
+        return self.next_item - 1
+
+    create_line = create_text
+
+    def itemconfigure(self, item, **options):
+        self.calls += 1
+
+    def delete(self, item):
+        pass
+
+
+# Headless render benchmark: many chargers at 10 Hz rendered at a fixed tick rate
+if __name__ == "__main__":
+    import argparse
+
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import drifting_frames
+    from user_interface_for_Rectifier import record_to_display_data
+
+    parser = argparse.ArgumentParser(description="Canvas dashboard render benchmark")
+    parser.add_argument("--chargers", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=40, help="visible rows")
+    parser.add_argument("--rate", type=float, default=10.0, help="messages/s per charger")
+    parser.add_argument("--fps", type=float, default=20.0, help="render ticks per second")
+    parser.add_argument("--seconds", type=float, default=30.0, help="simulated time")
+    parser.add_argument("--tk", action="store_true", help="render on a real Canvas (needs a display)")
+    args = parser.parse_args()
+
+    messages = [record_to_display_data(decode_sm_frame(f)) for f in drifting_frames(int(args.seconds * args.rate))]
+    root = None
+    if args.tk:
+        root = tk.Tk()
+        canvas = tk.Canvas(root)
+    else:
+        canvas = NullCanvas()
+    grid = DashboardGrid(canvas)
+    grid.resize((args.rows + 1) * ROW_HEIGHT)
+
+    ticks = int(args.seconds * args.fps)
+    per_tick = args.chargers * args.rate / args.fps
+    pending = 0.0
+    sent = 0
+    times = []
+    for tick in range(ticks):
+        pending += per_tick
+        start = time.perf_counter()
+        while pending >= 1:
+            data = dict(messages[(sent // args.chargers) % len(messages)])
+            data["charger"] = f"charger{sent % args.chargers:03d}"
+            grid.update(data)
+            sent += 1
+            pending -= 1
+        grid.render()
+        if root is not None:
+            root.update_idletasks()  # Let Tk draw the batch
+        times.append(time.perf_counter() - start)
+
+    times.sort()
+    values = args.chargers * len(grid.columns)
+    print(f"{args.chargers} chargers x {MODULE_COUNT} modules = {values} live values, {len(grid.slots)} rows visible")
+    print(f"{sent} messages over {ticks} ticks at {args.fps:g} fps")
+    print(
+        f"tick p50 {times[len(times) // 2] * 1000:.2f} ms  p99 {times[int(len(times) * 0.99)] * 1000:.2f} ms"
+        f"  max {times[-1] * 1000:.2f} ms  -> {1 / times[int(len(times) * 0.99)]:.0f} fps sustainable"
+    )
+    print(f"Grid: {grid.stats()}")
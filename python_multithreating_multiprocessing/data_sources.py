@@ -0,0 +1,94 @@
+import importlib
+import signal
+import sys
+import time
+
+
+def parse_endpoint(text, default_port=3333):
+    """
+    Parse "host:port" or "name=host:port" into (charger, host, port).
+
+    :param text: Endpoint string, the charger name defaults to "host:port".
+    :param default_port: Port used when text has none.
+    :return: Tuple of (charger, host, port).
+    """
+    name, _, address = text.rpartition("=")
+    host, _, port = address.partition(":")
+    port = int(port) if port else default_port
+    return name or f"{host}:{port}", host, port
+
+
+def exit_on_sigterm(*queues):
+    """
+    Make Process.terminate() unwind the data process through its finally blocks.
+
+    SIGTERM raises SystemExit, so logs, captures and stores are flushed. At
+    exit a multiprocessing.Queue joins its feeder thread, which never ends
+    while the pipe is full and the display no longer reads it, so the
+    feeder joins of queues and the queues they wrap are cancelled first.
+
+    :param queues: Producer queues, wrappers (BoundedQueue, DeltaSender,
+        TelemetryHub) are followed through their queue attribute; other
+        objects are ignored.
+    """
+
+    def on_sigterm(signum, frame):
+        for queue in queues:
+            while queue is not None:
+                cancel_join_thread = getattr(queue, "cancel_join_thread", None)
+                if cancel_join_thread is not None:
+                    cancel_join_thread()  # Messages still in the pipe are lost
+                queue = getattr(queue, "queue", None)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def run_data_source(queue, source, *args):
+    """
+    Process target that imports its data source inside the data process.
+
+    The display process then never imports the client, asyncio or the
+    decoder tables, and a spawned data process imports only this module
+    and the source's before it starts producing.
+
+    :param queue: Queue the source puts display messages on.
+    :param source: "module:function", e.g. "async_client:start_async_client".
+    :param args: Further arguments for the source.
+    """
+    exit_on_sigterm(queue)
+    module_name, _, function_name = source.partition(":")
+    target = getattr(importlib.import_module(module_name), function_name)
+    target(queue, *args)
+
+
+# Simulate live data updates from another process
+def data_provider(queue, metrics=None):
+    temp_values = [30, 32, None, 28, 31, 29, 30]
+    current_values = [5.1, 4.8, None, 5.5, 4.9, 5.0, 5.2]
+    voltage_values = [3.7, 3.8, None, 3.9, 3.6, 3.7, 3.8]
+    soc = 99
+
+    while True:
+        # Simulate new data being sent to the queue
+        new_data = {
+            "soc": soc,
+            "soh": "Good",
+            "temp": temp_values,
+            "current": current_values,
+            "voltage": voltage_values
+        }
+        if metrics is not None:
+            metrics.count("frames")
+            new_data["timestamp_ns"] = time.monotonic_ns()
+        queue.put(new_data)
+
+        # Update data randomly for simulation
+        time.sleep(0.5)
+        temp_values = [t + 0.1 if t else None for t in temp_values]
+        current_values = [c + 0.1 if c else None for c in current_values]
+        voltage_values = [v + 0.1 if v else None for v in voltage_values]
+        if soc < 100:
+            soc += 0.1
+        else:
+            soc = 0
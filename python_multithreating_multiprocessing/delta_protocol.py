@@ -0,0 +1,294 @@
+import queue as queue_module
+
+# Message kinds; messages are tuples, which pickle much smaller than dicts
+KEYFRAME = "k"  # (KEYFRAME, charger, seq, module_count, values)
+DELTA = "d"  # (DELTA, charger, seq, (index, value, index, value, ...))
+
+
+def flatten(data):
+    """
+    Display message as one flat list: soc, soh, temps, currents, voltages.
+
+    :return: Tuple of (module count, list of values).
+    """
+    count = len(data["temp"])
+    return count, [data["soc"], data["soh"], *data["temp"], *data["current"], *data["voltage"]]
+
+
+def unflatten(count, values, charger):
+    """
+    Inverse of flatten(), plus where each flat index lives in the message.
+
+    :return: Tuple of (display message, list of (container, key) per index).
+    """
+    data = {
+        "soc": values[0],
+        "soh": values[1],
+        "temp": list(values[2 : 2 + count]),
+        "current": list(values[2 + count : 2 + 2 * count]),
+        "voltage": list(values[2 + 2 * count : 2 + 3 * count]),
+        "charger": charger,
+    }
+    slots = [(data, "soc"), (data, "soh")]
+    for key in ("temp", "current", "voltage"):
+        slots += ((data[key], i) for i in range(count))
+    return data, slots
+
+
+class DeltaEncoder:
+    """
+    Producer side: turn display messages into keyframes and deltas.
+
+    The last state sent is kept per charger and only fields that differ
+    from it are sent. Every keyframe_interval messages (and whenever the
+    module count changes) a full keyframe is sent instead, so a receiver
+    that missed messages recovers; force_keyframe() makes the next message
+    a keyframe when a loss is known.
+    """
+
+    def __init__(self, keyframe_interval=100):
+        self.keyframe_interval = keyframe_interval
+        self.chargers = {}  # charger -> [seq, module count, values, messages since keyframe]
+
+        # Counters
+        self.keyframes = 0
+        self.forced_keyframes = 0  # Requested by force_keyframe()
+        self.deltas = 0
+        self.fields_sent = 0
+        self.fields_skipped = 0
+
+    def stats(self):
+        return {
+            "keyframes": self.keyframes,
+            "forced_keyframes": self.forced_keyframes,
+            "deltas": self.deltas,
+            "fields_sent": self.fields_sent,
+            "fields_skipped": self.fields_skipped,
+        }
+
+    def force_keyframe(self, charger=None):
+        """
+        Send the next message of a charger as a keyframe.
+
+        :param charger: Charger whose message was lost, None for every charger.
+        """
+        states = self.chargers.values() if charger is None else [self.chargers.get(charger)]
+        for state in states:
+            if state is not None and state[3] < self.keyframe_interval:
+                state[3] = self.keyframe_interval
+                self.forced_keyframes += 1
+
+    def encode(self, data):
+        """
+        Encode one display message.
+
+        :param data: Display message, optionally tagged with "charger".
+        :return: Keyframe or delta tuple.
+        """
+        charger = data.get("charger")
+        count, values = flatten(data)
+        state = self.chargers.get(charger)
+        if state is None:
+            state = self.chargers[charger] = [0, None, None, 0]
+        state[0] += 1
+        seq = state[0]
+
+        if count != state[1] or state[3] >= self.keyframe_interval:
+            state[1], state[2], state[3] = count, values, 1
+            self.keyframes += 1
+            self.fields_sent += len(values)
+            return KEYFRAME, charger, seq, count, tuple(values)
+
+        previous = state[2]
+        changes = []
+        if values != previous:  # One C-level compare for the common unchanged case
+            for index, value in enumerate(values):
+                if value != previous[index]:
+                    changes += (index, value)
+        state[2] = values
+        state[3] += 1
+        self.deltas += 1
+        self.fields_sent += len(changes) // 2
+        self.fields_skipped += len(values) - len(changes) // 2
+        return DELTA, charger, seq, tuple(changes)
+
+
+class DeltaDecoder:
+    """
+    Receiver side: apply keyframes and deltas to per-charger state.
+
+    Each charger's state is kept as a display message that deltas update in
+    place, so applying a delta costs one store per changed field. A delta is
+    only applied on top of the message right before it; after a gap in a
+    charger's sequence numbers its deltas are dropped until the next
+    keyframe. Plain display dicts pass through unchanged, so producers with
+    and without delta encoding can share a queue.
+    """
+
+    def __init__(self):
+        self.chargers = {}  # charger -> [seq, display message, (container, key) per index]
+
+        # Counters
+        self.keyframes = 0
+        self.deltas = 0
+        self.gaps = 0
+        self.dropped = 0
+
+    def stats(self):
+        return {
+            "keyframes": self.keyframes,
+            "deltas": self.deltas,
+            "gaps": self.gaps,
+            "dropped": self.dropped,
+        }
+
+    def apply(self, message):
+        """
+        Apply one message.
+
+        :param message: Keyframe, delta or plain display dict.
+        :return: Display message for the charger, or None while waiting for a
+            keyframe. It is the decoder's state and later messages for the
+            charger update it in place; copy it to keep it.
+        """
+        if type(message) is not tuple:
+            return message
+
+        kind, charger, seq = message[0], message[1], message[2]
+        if kind == KEYFRAME:
+            data, slots = unflatten(message[3], message[4], charger)
+            self.chargers[charger] = [seq, data, slots]
+            self.keyframes += 1
+            return data
+
+        state = self.chargers.get(charger)
+        if state is None or state[1] is None or seq != state[0] + 1:
+            if state is not None and state[1] is not None:
+                self.gaps += 1
+                state[1] = None  # Stale until the next keyframe
+            self.dropped += 1
+            return None
+
+        slots = state[2]
+        changes = message[3]
+        for i in range(0, len(changes), 2):
+            container, key = slots[changes[i]]
+            container[key] = changes[i + 1]
+        state[0] = seq
+        self.deltas += 1
+        return state[1]
+
+
+class DeltaSender:
+    """
+    Queue wrapper for producers: put() sends keyframes and deltas.
+
+    Pass DeltaSender(queue) to start_client, data_provider or any other
+    producer instead of the queue itself. The encoder state lives in the
+    producer process. When a BoundedQueue drops a message, the next message
+    of the charger it belonged to is sent as a keyframe, so the receiver
+    does not show stale values until the periodic one.
+    """
+
+    def __init__(self, queue, keyframe_interval=100):
+        self.queue = queue
+        self.encoder = DeltaEncoder(keyframe_interval)
+        self.dropped = getattr(queue, "dropped", None)  # Plain queues never drop
+
+    def put(self, data, block=True, timeout=None):
+        message = self.encoder.encode(data)
+        if self.dropped is None:
+            self.queue.put(message, block, timeout)
+            return
+        dropped = self.dropped()
+        self.queue.put(message, block, timeout)
+        if self.dropped() != dropped:
+            # drop_newest lost this message, drop_oldest older ones of any charger
+            self.encoder.force_keyframe(message[1] if self.queue.policy == "drop_newest" else None)
+
+
+class DeltaReceiver:
+    """
+    Queue wrapper for the display: get_nowait() returns full display messages.
+
+    Every message read from the queue is applied to the decoder state;
+    deltas that cannot be applied yet are skipped. empty() decodes ahead
+    and keeps the message it finds for the next get, so it only returns
+    False when get_nowait() has a message to return.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.decoder = DeltaDecoder()
+        self.ready = None  # Decoded by empty(), not returned yet
+
+    def empty(self):
+        while self.ready is None:
+            try:
+                self.ready = self.decoder.apply(self.queue.get_nowait())
+            except queue_module.Empty:
+                return True
+        return False
+
+    def qsize(self):
+        return self.queue.qsize() + (self.ready is not None)
+
+    def get_nowait(self):
+        data = self.ready
+        self.ready = None
+        while data is None:
+            data = self.decoder.apply(self.queue.get_nowait())
+        return data
+
+    def get(self, block=True, timeout=None):
+        data = self.ready
+        self.ready = None
+        while data is None:
+            data = self.decoder.apply(self.queue.get(block, timeout))
+        return data
+
+
+# Compare pickled size and pickling time of snapshots and deltas
+if __name__ == "__main__":
+    import pickle
+    import time
+
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import drifting_frames
+    from user_interface_for_Rectifier import record_to_display_data
+
+    CHARGERS = 50
+    FRAMES = 20000
+
+    frames = drifting_frames(FRAMES // CHARGERS)
+    messages = []
+    for i in range(FRAMES):
+        data = record_to_display_data(decode_sm_frame(frames[i // CHARGERS]))
+        data["charger"] = f"charger{i % CHARGERS}"
+        messages.append(data)
+
+    encoder = DeltaEncoder()
+    start = time.perf_counter()
+    encoded = [encoder.encode(data) for data in messages]
+    encode_time = time.perf_counter() - start
+
+    for name, payloads, extra in (("snapshot", messages, 0.0), ("delta", encoded, encode_time)):
+        start = time.perf_counter()
+        pickled = [pickle.dumps(payload) for payload in payloads]
+        elapsed = time.perf_counter() - start + extra
+        size = sum(len(p) for p in pickled)
+        print(
+            f"{name:9} {size / FRAMES:6.1f} bytes/message  "
+            f"{elapsed / FRAMES * 1e6:5.2f} us/message to encode and pickle"
+        )
+
+    for name, payloads in (("snapshot", messages), ("delta", encoded)):
+        pickled = [pickle.dumps(payload) for payload in payloads]
+        decoder = DeltaDecoder()
+        start = time.perf_counter()
+        for payload, expected in zip(pickled, messages):
+            data = decoder.apply(pickle.loads(payload))
+        elapsed = time.perf_counter() - start
+        print(f"{name:9} {elapsed / FRAMES * 1e6:5.2f} us/message to unpickle and apply")
+    assert data["temp"] == expected["temp"] and data["voltage"] == expected["voltage"]
+    print(f"Encoder: {encoder.stats()}")
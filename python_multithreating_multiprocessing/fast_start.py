@@ -0,0 +1,13 @@
+# Entry point for packaged builds (see benchmark_startup.py):
+#     pyinstaller --onedir --name rectifier_display --hidden-import frontend fast_start.py
+#
+# A spawned data process (Windows, macOS, frozen builds) re-runs the entry
+# script before it runs its target. Here that costs two imports instead of
+# frontend's tkinter and GUI modules; the target, data_sources.run_data_source,
+# then imports only its data source.
+import runpy
+from multiprocessing import freeze_support
+
+if __name__ == "__main__":
+    freeze_support()  # In a spawned data process this runs the target and exits
+    runpy.run_module("frontend", run_name="__main__", alter_sys=True)
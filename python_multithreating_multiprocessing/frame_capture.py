@@ -0,0 +1,196 @@
+import mmap
+import os
+import struct
+import time
+
+from sm_frame import FRAME_SIZE, decode_sm_frame
+from user_interface_for_Rectifier import record_to_display_data
+
+# File layout: one header, then fixed-size records appended back to back
+CAPTURE_MAGIC = b"RFCAP\x00"
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = struct.Struct("<6sHH6x")  # magic, version, frame size
+RECORD_HEADER = struct.Struct("<qH2x")  # timestamp_ns, source_id
+RECORD_SIZE = RECORD_HEADER.size + FRAME_SIZE
+
+
+class FrameRecorder:
+    """
+    Append raw frames with nanosecond timestamps and source IDs to a capture file.
+
+    Records are fixed size (12 byte header + 256 byte frame), so a capture
+    cut short by a crash loses at most the last, partial record: appending
+    to an existing capture checks its header and cuts such a record off
+    first, so the new records stay aligned.
+    """
+
+    def __init__(self, path, buffer_size=1024 * 1024):
+        self.path = path
+        self.file = open(path, "a+b", buffering=buffer_size)
+        header = CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, FRAME_SIZE)
+        size = self.file.seek(0, os.SEEK_END)
+        if size < CAPTURE_HEADER.size:
+            self.file.seek(0)
+            if not header.startswith(self.file.read()):
+                self.file.close()
+                raise ValueError(f"{path} is not a frame capture")
+            self.file.truncate(0)  # Empty, or a crash while writing the header
+            self.file.write(header)
+        else:
+            self.file.seek(0)
+            magic, version, frame_size = CAPTURE_HEADER.unpack(self.file.read(CAPTURE_HEADER.size))
+            if magic != CAPTURE_MAGIC or frame_size != FRAME_SIZE or version != CAPTURE_VERSION:
+                self.file.close()
+                raise ValueError(f"{path} is not a version {CAPTURE_VERSION} frame capture")
+            # Drop a trailing partial record left by a crash
+            self.file.truncate(size - (size - CAPTURE_HEADER.size) % RECORD_SIZE)
+        self.file.seek(0, os.SEEK_END)
+        self.record = bytearray(RECORD_SIZE)
+        self.frames_written = 0
+
+    def write(self, frame, source_id=0, timestamp_ns=None):
+        """
+        Append one frame.
+
+        :param frame: Bytes-like 256 byte frame, e.g. a memoryview from FrameReassembler.
+        :param source_id: Charger number, 0-65535.
+        :param timestamp_ns: Receive time, defaults to time.time_ns().
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        RECORD_HEADER.pack_into(self.record, 0, timestamp_ns, source_id)
+        self.record[RECORD_HEADER.size :] = frame
+        self.file.write(self.record)
+        self.frames_written += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FrameReplayer:
+    """
+    Memory-mapped reader for capture files written by FrameRecorder.
+
+    Frames are handed out as memoryviews into the mapping, no copies are made;
+    release them (or drop every reference) before calling close().
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < CAPTURE_HEADER.size:
+            raise ValueError(f"{path} is not a frame capture")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        magic, version, frame_size = CAPTURE_HEADER.unpack_from(self.view)
+        if magic != CAPTURE_MAGIC or frame_size != FRAME_SIZE:
+            raise ValueError(f"{path} is not a frame capture")
+        if version != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version {version}")
+        # A trailing partial record (interrupted write) is ignored
+        self.count = (size - CAPTURE_HEADER.size) // RECORD_SIZE
+
+    def __len__(self):
+        return self.count
+
+    def records(self):
+        """
+        Iterate over every record in file order.
+
+        :return: Generator of (timestamp_ns, source_id, frame memoryview).
+        """
+        view = self.view
+        offset = CAPTURE_HEADER.size
+        for _ in range(self.count):
+            timestamp_ns, source_id = RECORD_HEADER.unpack_from(view, offset)
+            frame_start = offset + RECORD_HEADER.size
+            yield timestamp_ns, source_id, view[frame_start : frame_start + FRAME_SIZE]
+            offset += RECORD_SIZE
+
+    def replay(self, speed=1.0):
+        """
+        Iterate over the records paced by their capture timestamps.
+
+        :param speed: 1.0 for real time, N for N times faster, None or 0 for
+            as fast as possible.
+        :return: Generator of (timestamp_ns, source_id, frame memoryview).
+        """
+        if not speed:
+            yield from self.records()
+            return
+
+        first_ns = None
+        start_ns = time.perf_counter_ns()
+        for record in self.records():
+            if first_ns is None:
+                first_ns = record[0]
+            due_ns = start_ns + (record[0] - first_ns) / speed
+            delay = (due_ns - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+            yield record
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def start_replay(queue, path, speed=1.0, loop=False):
+    """
+    Process target feeding a capture through the decoder into the display queue.
+
+    :param queue: Queue read by PowerModuleDisplay.
+    :param path: Capture file written by FrameRecorder.
+    :param speed: 1.0 for real time, N for N times faster, None or 0 for max speed.
+    :param loop: Start over at the end of the capture.
+    """
+    with FrameReplayer(path) as replayer:
+        while True:
+            for _, source_id, frame in replayer.replay(speed):
+                data = record_to_display_data(decode_sm_frame(frame))
+                data["charger"] = source_id
+                queue.put(data)
+                frame.release()  # The mapping can only close without live views
+            if not loop:
+                break
+
+
+# Record the sample frame, then replay it as fast as possible
+if __name__ == "__main__":
+    import queue
+    import tempfile
+
+    from benchmark_crc import FRAME
+
+    FRAMES = 100000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "capture.rfcap")
+        start = time.perf_counter()
+        with FrameRecorder(path) as recorder:
+            for i in range(FRAMES):
+                recorder.write(FRAME, source_id=i % 40)
+        print(f"Recorded {FRAMES} frames in {time.perf_counter() - start:.2f} s")
+
+        display_queue = queue.SimpleQueue()
+        start = time.perf_counter()
+        start_replay(display_queue, path, speed=None)
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {display_queue.qsize()} frames at {FRAMES / elapsed:.0f} frames/s")
@@ -0,0 +1,225 @@
+import time
+import tkinter as tk
+
+
+class FrameScheduler:
+    """
+    Calls render when messages arrive, at most max_fps times a second.
+
+    With a queue that has a wakeup pipe (BoundedQueue(wakeup=True)) and a
+    Tk with file handlers (not on Windows), the event loop sleeps until the
+    producer writes to the pipe: no timer fires while no data arrives,
+    apart from a slow safety poll, and a message is rendered as soon as the
+    frame interval allows instead of up to poll_ms later. Messages that
+    arrive during a frame interval are rendered together in the next frame.
+    A render that leaves the queue as it was is retried once after 1 ms;
+    if that makes no progress either, the next render waits for the next
+    wakeup or the safety poll.
+    Without a wakeup pipe render is called every poll_ms, like a plain
+    root.after loop.
+    """
+
+    def __init__(self, root, queue, render, max_fps=30, poll_ms=100, idle_poll_ms=1000):
+        """
+        :param root: Tk (or Tcl) instance whose event loop runs render.
+        :param queue: Queue render reads from.
+        :param render: Called without arguments; drains the queue and draws.
+        :param max_fps: Most render calls per second when data keeps arriving.
+        :param poll_ms: Render interval without a wakeup pipe.
+        :param idle_poll_ms: Safety poll for a missed wakeup.
+        """
+        self.root = root
+        self.queue = queue
+        self.render = render
+        self.interval_ns = int(1e9 / max_fps)
+        self.poll_ms = poll_ms
+        self.idle_poll_ms = idle_poll_ms
+        self.pending = None  # after id of the scheduled render
+        self.timer = None  # after id of the next poll or idle poll
+        self.last_render_ns = 0
+        self.retried = False  # The pending render is a 1 ms retry after no progress
+        wakeup_fileno = getattr(queue, "wakeup_fileno", None)
+        self.fileno = wakeup_fileno() if wakeup_fileno else None
+        self.event_driven = self.fileno is not None and hasattr(root.tk, "createfilehandler")
+
+        # Counters
+        self.wakeups = 0
+        self.renders = 0
+        self.idle_polls = 0  # Safety polls that found data
+        self.stalls = 0  # Retries that left the queue as it was
+
+        if self.event_driven:
+            root.tk.createfilehandler(self.fileno, tk.READABLE, self.on_wakeup)
+            self.timer = root.after(idle_poll_ms, self.idle_poll)
+            self.request()  # Messages sent before the display started
+        else:
+            self.timer = root.after(poll_ms, self.poll)
+
+    def stats(self):
+        return {
+            "mode": "event" if self.event_driven else "poll",
+            "wakeups": self.wakeups,
+            "renders": self.renders,
+            "idle_polls": self.idle_polls,
+            "stalls": self.stalls,
+        }
+
+    def on_wakeup(self, fileno, mask):
+        self.queue.clear_wakeup()
+        self.wakeups += 1
+        self.request()
+
+    def request(self):
+        # Render once the frame interval since the last render has passed
+        if self.pending is not None:
+            return
+        wait_ns = self.last_render_ns + self.interval_ns - time.monotonic_ns()
+        self.pending = self.root.after(max(0, -(-wait_ns // 1_000_000)), self.run)
+
+    def run(self):
+        self.pending = None
+        queue = self.queue
+        queued = queue.qsize()
+        previous_ns = self.last_render_ns
+        self.last_render_ns = time.monotonic_ns()
+        self.renders += 1
+        self.render()
+        left = queue.qsize()
+        if left and left >= queued:
+            self.last_render_ns = previous_ns
+            if not self.retried:
+                # Nothing readable yet, the message is still in the producer's
+                # feeder thread: look again shortly, this was not a frame
+                self.retried = True
+                self.pending = self.root.after(1, self.run)
+                return
+            # Still nothing: wait for the next wakeup byte or the idle poll
+            # instead of spinning at 1 kHz on a message render cannot consume
+            self.retried = False
+            self.stalls += 1
+            queue.arm()
+            return
+        self.retried = False
+        if left:
+            self.request()  # More arrived while rendering
+            return
+        queue.arm()
+        if queue.qsize():
+            self.request()  # Sent between the check and arm(), no byte coming for it
+
+    def idle_poll(self):
+        if self.pending is None and self.queue.qsize():
+            self.idle_polls += 1
+            self.request()
+        self.timer = self.root.after(self.idle_poll_ms, self.idle_poll)
+
+    def poll(self):
+        self.renders += 1
+        self.render()
+        self.timer = self.root.after(self.poll_ms, self.poll)
+
+    def close(self):
+        # Stop rendering; the Tk instance stays usable
+        for after_id in (self.pending, self.timer):
+            if after_id is not None:
+                self.root.after_cancel(after_id)
+        self.pending = self.timer = None
+        if self.event_driven:
+            self.root.tk.deletefilehandler(self.fileno)
+
+
+def _benchmark_producer(transport, messages, chargers, rate, seconds):
+    # Timestamped messages at a fixed rate; rate 0 sends nothing
+    end = time.monotonic() + seconds
+    if not rate:
+        time.sleep(seconds)
+        return
+    next_put = time.monotonic()
+    sent = 0
+    while time.monotonic() < end:
+        data = dict(messages[(sent // chargers) % len(messages)])
+        data["charger"] = f"charger{sent % chargers:03d}"
+        data["timestamp_ns"] = time.monotonic_ns()
+        transport.put(data)
+        sent += 1
+        next_put += 1 / rate
+        delay = next_put - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Frame-to-render latency and idle CPU of 100 ms polling and pipe wakeups,
+# without a display: Tcl's event loop and the RenderModel, no widgets
+if __name__ == "__main__":
+    import argparse
+    from multiprocessing import Process, set_start_method
+
+    from bounded_queue import BoundedQueue
+    from frame_schema import MODULE_COUNT
+    from render_model import RenderModel, drain_latest
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import drifting_frames
+    from user_interface_for_Rectifier import record_to_display_data
+
+    parser = argparse.ArgumentParser(description="GUI wakeup: 100 ms polling vs event-driven")
+    parser.add_argument("--seconds", type=float, default=5.0, help="per run")
+    parser.add_argument("--max-fps", type=float, default=30.0)
+    parser.add_argument(
+        "--rates", default="0,10,2000", help="comma separated messages/s to send, 0 measures idle CPU"
+    )
+    parser.add_argument("--chargers", type=int, default=40, help="chargers the messages rotate over")
+    args = parser.parse_args()
+    set_start_method("spawn")  # Copy-on-write faults after a fork would count as display CPU
+
+    messages = [record_to_display_data(decode_sm_frame(f)) for f in drifting_frames(100)]
+    print(f"{'mode':6} {'msg/s':>6} {'CPU %':>6} {'renders/s':>9} {'age p50':>9} {'age p99':>9}  counters")
+    for rate in [float(r) for r in args.rates.split(",")]:
+        for mode in ("poll", "event"):
+            # Poll: what the display did before, root.after(100) and drain
+            transport = BoundedQueue(4096, "block", wakeup=mode == "event")
+            root = tk.Tcl()
+            model = RenderModel(module_count=MODULE_COUNT)
+            ages = []
+
+            def render():
+                # The display's conflate path: newest snapshot, changed label texts
+                data = model.drain(transport)
+                if data is not None:
+                    model.changed_labels(data)
+                    ages.append(time.monotonic_ns() - data["timestamp_ns"])
+
+            scheduler = FrameScheduler(root, transport, render, args.max_fps)
+            producer = Process(
+                target=_benchmark_producer,
+                args=(transport, messages, 1 if rate <= 10 else args.chargers, rate, args.seconds),
+            )
+            producer.start()
+
+            def run_loop(milliseconds):
+                done = []
+                root.after(milliseconds, done.append, True)
+                while not done:
+                    root.tk.dooneevent(0)  # mainloop() needs a Tk window, Tcl alone returns at once
+
+            run_loop(500)  # Warm up, then measure from a running pipeline
+            ages.clear()
+            scheduler.renders = scheduler.wakeups = scheduler.idle_polls = scheduler.stalls = 0
+            cpu_start = time.process_time()
+            wall_start = time.monotonic()
+            run_loop(int(args.seconds * 1000) - 1000)
+            wall = time.monotonic() - wall_start
+            cpu = (time.process_time() - cpu_start) / wall
+            scheduler.close()
+            while producer.is_alive():
+                drain_latest(transport)  # The producer's feeder thread must flush before it can exit
+                time.sleep(0.01)
+            producer.join()
+            transport.close()
+
+            ages.sort()
+            p50 = f"{ages[len(ages) // 2] / 1e6:7.2f}ms" if ages else f"{'-':>9}"
+            p99 = f"{ages[int(len(ages) * 0.99)] / 1e6:7.2f}ms" if ages else f"{'-':>9}"
+            print(
+                f"{mode:6} {rate:6.0f} {cpu * 100:6.2f} {scheduler.renders / wall:9.1f} {p50} {p99}"
+                f"  {scheduler.stats()}"
+            )
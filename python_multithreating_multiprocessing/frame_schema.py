@@ -0,0 +1,340 @@
+import struct
+
+# Frame layout as data. A firmware change to the frame should only mean
+# editing these tables; the struct decoder, record properties, NumPy dtypes
+# and GUI fields are all compiled from them by FrameLayout.
+#
+# type: NumPy-style code, "u1", "<u2", "<u4", ">u2" ... (byte order + size)
+# divisor: value = raw / divisor, e.g. 10 for 0.1 resolution
+# bits: sub-fields packed into the value, name -> (shift, width)
+# property: name of the SMFrame property, when it differs from name
+
+FRAME_SIZE = 256  # Total expected size
+
+FRAME_FIELDS = [
+    {"name": "pm_active_bit", "offset": 23, "type": "u1"},
+    {"name": "soc", "offset": 136, "type": "u1", "unit": "%"},
+    {"name": "soh", "offset": 137, "type": "u1"},
+    {
+        "name": "reserved_1",
+        "offset": 138,
+        "type": "u1",
+        "bits": {"charge_enable_bit": (0, 1), "reserved_low_bits": (1, 3), "reserved_high_nibble": (4, 4)},
+    },
+    {
+        "name": "charging_state_count",
+        "offset": 139,
+        "type": "u1",
+        "bits": {"charging_state": (0, 4), "contactor_status": (4, 4)},
+    },
+    {"name": "demand_voltage", "offset": 140, "type": "<u4", "divisor": 10, "unit": "V"},
+    {"name": "demand_current", "offset": 144, "type": "<u4", "divisor": 10, "unit": "A"},
+    {"name": "positive_gun_temperature", "offset": 148, "type": "u1"},
+    {"name": "negative_gun_temperature", "offset": 149, "type": "u1"},
+    {"name": "charging_current", "offset": 152, "type": "<u2", "divisor": 10, "unit": "A"},
+    {"name": "charging_voltage", "offset": 154, "type": "<u2", "divisor": 10, "unit": "V"},
+    {"name": "charging_time_minute", "offset": 156, "type": "u1"},
+    {"name": "charging_time_hour", "offset": 157, "type": "u1"},
+    {"name": "BST_reason", "offset": 160, "type": "<u2"},
+    {"name": "CST_reason", "offset": 162, "type": "<u2"},
+    {"name": "energy_data", "offset": 164, "type": "<u4"},
+]
+
+# Power module blocks, MODULE_COUNT blocks of MODULE_SIZE bytes from MODULE_START.
+# display: (display message key, label, unit) for the GUI
+MODULE_COUNT = 7  # Power modules carried in every frame
+MODULE_START = 24  # Offset of the first power module block
+MODULE_SIZE = 16  # Bytes per power module block
+MODULE_FIELDS = [
+    {"name": "status_flag_1", "offset": 0, "type": "u1", "property": "module_status_flags_1"},
+    {"name": "status_flag_2", "offset": 1, "type": "u1", "property": "module_status_flags_2"},
+    {
+        "name": "temperature",
+        "offset": 2,
+        "type": "<u2",
+        "divisor": 10,
+        "property": "module_temperatures",
+        "display": ("temp", "Temp", "°C"),
+    },
+    {
+        "name": "current",
+        "offset": 4,
+        "type": "<u2",
+        "divisor": 10,
+        "property": "module_currents",
+        "display": ("current", "Current", "A"),
+    },
+    {
+        "name": "voltage",
+        "offset": 6,
+        "type": "<u2",
+        "divisor": 10,
+        "property": "module_voltages",
+        "display": ("voltage", "Voltage", "V"),
+    },
+]
+
+# Byte ranges kept as raw bytes: name -> (offset, size); module ranges are per block
+RAW_FIELDS = {
+    "header": (0, 20),
+    "reserved_pm_active_bit": (20, 3),
+    "reserved_2": (150, 2),
+    "reserved_3": (158, 2),
+    "padding": (168, 86),
+}
+MODULE_RAW_FIELDS = {"reserved": (8, 8)}
+
+# CRC-16/MODBUS over every byte before it, stored high byte first
+CRC_OFFSET = 254
+CRC_TYPE = ">u2"
+
+_STRUCT_CODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+
+def _parse_type(code):
+    # "<u2" -> ("<", 2); single bytes have no byte order
+    order = code[0] if code[0] in "<>" else "|"
+    size = int(code.lstrip("<>|")[1:])
+    if code.lstrip("<>|")[0] != "u" or size not in _STRUCT_CODES:
+        raise ValueError(f"Unsupported field type {code!r}")
+    return order, size
+
+
+class FrameLayout:
+    """
+    Compiled form of the layout tables.
+
+    All numeric fields, module fields included, are read by one precompiled
+    struct in offset order; gaps become pad bytes. Fields that are not
+    little-endian are read as raw bytes and converted in their accessor.
+    The layout knows, for every field, its index into the unpacked tuple,
+    and builds the SMFrame properties, NumPy dtypes and GUI field list from
+    that.
+    """
+
+    def __init__(
+        self,
+        fields=FRAME_FIELDS,
+        module_fields=MODULE_FIELDS,
+        module_count=MODULE_COUNT,
+        module_start=MODULE_START,
+        module_size=MODULE_SIZE,
+        raw_fields=RAW_FIELDS,
+        module_raw_fields=MODULE_RAW_FIELDS,
+        frame_size=FRAME_SIZE,
+        crc_offset=CRC_OFFSET,
+    ):
+        self.fields = fields
+        self.module_fields = module_fields
+        self.module_count = module_count
+        self.module_start = module_start
+        self.module_size = module_size
+        self.raw_fields = raw_fields
+        self.module_raw_fields = module_raw_fields
+        self.frame_size = frame_size
+        self.crc_offset = crc_offset
+
+        # (offset, field, module number or None) for every numeric value
+        slots = [(field["offset"], field, None) for field in fields]
+        for module in range(module_count):
+            base = module_start + module * module_size
+            slots += [(base + field["offset"], field, module) for field in module_fields]
+        slots.sort(key=lambda slot: slot[0])
+
+        fmt = "<"
+        position = 0
+        self.slots = []  # (field, module) in tuple order
+        self.index = {}  # field name -> tuple index
+        self.module_index = {field["name"]: [] for field in module_fields}
+        for offset, field, module in slots:
+            order, size = _parse_type(field["type"])
+            if offset < position:
+                raise ValueError(f"Field {field['name']} overlaps the field before it")
+            if offset + size > crc_offset:
+                raise ValueError(f"Field {field['name']} runs into the CRC")
+            if offset > position:
+                fmt += f"{offset - position}x"
+            fmt += f"{size}s" if order == ">" else _STRUCT_CODES[size]
+            if module is None:
+                self.index[field["name"]] = len(self.slots)
+            else:
+                self.module_index[field["name"]].append(len(self.slots))
+            self.slots.append((field, module))
+            position = offset + size
+        self.struct = struct.Struct(fmt)
+        self._spans = {}  # (name, module) -> slice, filled by span()
+
+    def field(self, name):
+        # Frame field, or module field, by name
+        for field in self.fields + self.module_fields:
+            if field["name"] == name:
+                return field
+        raise KeyError(name)
+
+    def span(self, name, module=None):
+        """
+        Slice of a field or raw byte range in the frame.
+
+        :param name: Field or raw field name.
+        :param module: Module number for module fields.
+        :return: slice object for indexing the raw frame.
+        """
+        span = self._spans.get((name, module))
+        if span is None:
+            span = self._spans[name, module] = self._find_span(name, module)
+        return span
+
+    def _find_span(self, name, module):
+        if module is None:
+            if name in self.raw_fields:
+                offset, size = self.raw_fields[name]
+            else:
+                field = self.field(name)
+                offset, size = field["offset"], _parse_type(field["type"])[1]
+        else:
+            if name in self.module_raw_fields:
+                offset, size = self.module_raw_fields[name]
+            else:
+                field = self.field(name)
+                offset, size = field["offset"], _parse_type(field["type"])[1]
+            offset += self.module_start + module * self.module_size
+        return slice(offset, offset + size)
+
+    def module_slice(self, name):
+        # Tuple indexes of one module field as a slice (modules are evenly spaced)
+        indexes = self.module_index[name]
+        step = indexes[1] - indexes[0] if len(indexes) > 1 else 1
+        return slice(indexes[0], indexes[-1] + 1, step)
+
+    def properties(self):
+        """
+        Property objects for a record class with a .values tuple and .raw view.
+
+        :return: Dict of property name -> property.
+        """
+        props = {}
+        for field in self.fields:
+            i = self.index[field["name"]]
+            props[field.get("property", field["name"])] = property(_scalar_getter(field, i))
+            for name, (shift, width) in field.get("bits", {}).items():
+                props[name] = property(_bits_getter(i, shift, (1 << width) - 1))
+
+        for field in self.module_fields:
+            props[field["property"]] = property(_module_getter(field, self.module_slice(field["name"])))
+
+        for name, (offset, size) in self.raw_fields.items():
+            props.setdefault(name, property(_raw_getter(offset, offset + size)))
+        return props
+
+    def pack(self, values, modules=()):
+        """
+        Build frame bytes from field values in display units; the CRC is left zero.
+
+        :param values: Dict of field or bit field name -> value; missing ones are 0.
+        :param modules: Sequence of dicts of module field name -> value, one per module.
+        :return: bytearray of frame_size bytes.
+        """
+        packed = []
+        for field, module in self.slots:
+            if module is None:
+                source = values
+            else:
+                source = modules[module] if module < len(modules) else {}
+            if "bits" in field:
+                value = source.get(field["name"], 0)
+                for name, (shift, width) in field["bits"].items():
+                    value |= (source.get(name, 0) & ((1 << width) - 1)) << shift
+            else:
+                value = round(source.get(field["name"], 0) * field.get("divisor", 1))
+            order, size = _parse_type(field["type"])
+            packed.append(value.to_bytes(size, "big") if order == ">" else value)
+        frame = bytearray(self.frame_size)
+        self.struct.pack_into(frame, 0, *packed)
+        return frame
+
+    def display_fields(self):
+        """
+        Per-module fields shown by the GUI.
+
+        :return: List of (display message key, module field property, label, unit).
+        """
+        fields = []
+        for field in self.module_fields:
+            if "display" in field:
+                key, label, unit = field["display"]
+                fields.append((key, field["property"], label, unit))
+        return fields
+
+    def raw_dtype(self):
+        """
+        NumPy dtype viewing one raw frame, numeric fields at their offsets.
+
+        :return: numpy.dtype with itemsize frame_size; modules are a subarray.
+        """
+        import numpy as np  # Only the bulk decoder needs NumPy
+
+        module_dtype = np.dtype(
+            {
+                "names": [field["name"] for field in self.module_fields],
+                "formats": [field["type"] for field in self.module_fields],
+                "offsets": [field["offset"] for field in self.module_fields],
+                "itemsize": self.module_size,
+            }
+        )
+        names = [field["name"] for field in self.fields] + ["modules", "crc"]
+        formats = [field["type"] for field in self.fields]
+        formats += [(module_dtype, (self.module_count,)), CRC_TYPE]
+        offsets = [field["offset"] for field in self.fields] + [self.module_start, self.crc_offset]
+        return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": self.frame_size})
+
+    def decoded_dtype(self):
+        """
+        NumPy dtype of decoded frames: scaled values as float, bit fields split out.
+
+        :return: numpy.dtype with one column per field plus crc_valid.
+        """
+        import numpy as np
+
+        columns = []
+        for field in self.fields:
+            columns.append((field["name"], _decoded_format(field)))
+            columns += [(name, "u1") for name in field.get("bits", {})]
+        for field in self.module_fields:
+            columns.append((field["property"], _decoded_format(field), (self.module_count,)))
+        columns.append(("crc_valid", "?"))
+        return np.dtype(columns)
+
+
+def _decoded_format(field):
+    return "f8" if "divisor" in field else "u" + str(_parse_type(field["type"])[1])
+
+
+def _scalar_getter(field, i):
+    order = _parse_type(field["type"])[0]
+    divisor = field.get("divisor")
+    if order == ">":
+        return lambda self: int.from_bytes(self.values[i], "big")
+    if divisor:
+        divisor = float(divisor)
+        return lambda self: self.values[i] / divisor
+    return lambda self: self.values[i]
+
+
+def _bits_getter(i, shift, mask):
+    return lambda self: (self.values[i] >> shift) & mask
+
+
+def _module_getter(field, index):
+    divisor = field.get("divisor")
+    if divisor:
+        divisor = float(divisor)
+        return lambda self: tuple(v / divisor for v in self.values[index])
+    return lambda self: self.values[index]
+
+
+def _raw_getter(start, end):
+    return lambda self: bytes(self.raw[start:end])
+
+
+# The layout every decoder in the project uses
+LAYOUT = FrameLayout()
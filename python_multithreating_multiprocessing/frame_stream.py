@@ -0,0 +1,187 @@
+import logging
+import socket
+
+from crc16 import crc16_modbus
+from sm_frame import FRAME_SIZE
+
+# Every frame header carries the controller signature at a fixed offset
+HEADER_SIGNATURE = b"SunMob Tech..."
+HEADER_SIGNATURE_OFFSET = 4
+
+log = logging.getLogger("rectifier.client")
+
+
+class FrameReassembler:
+    """
+    Rebuild 256 byte frames from a TCP byte stream.
+
+    Bytes are received straight into a preallocated buffer with recv_into.
+    Complete frames are handed out as memoryviews into that buffer, so a
+    frame is only valid until the next call to writable()/recv_from();
+    copy it with bytes(frame) if it has to live longer. When a frame fails
+    its CRC the reassembler drops bytes up to the next header signature.
+    """
+
+    def __init__(
+        self,
+        frame_size=FRAME_SIZE,
+        capacity_frames=64,
+        signature=HEADER_SIGNATURE,
+        signature_offset=HEADER_SIGNATURE_OFFSET,
+    ):
+        self.frame_size = frame_size
+        self.signature = signature
+        self.signature_offset = signature_offset
+        self.buffer = bytearray(frame_size * capacity_frames)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # First byte not yet consumed
+        self.end = 0  # One past the last received byte
+
+        # Counters
+        self.bytes_received = 0
+        self.frames_decoded = 0
+        self.partial_reads = 0  # Reads that were not a whole number of frames
+        self.resyncs = 0
+
+    def stats(self):
+        return {
+            "bytes_received": self.bytes_received,
+            "frames_decoded": self.frames_decoded,
+            "partial_reads": self.partial_reads,
+            "resyncs": self.resyncs,
+        }
+
+    def writable(self):
+        """
+        Free space to receive into, moving any partial frame to the front first.
+
+        :return: Memoryview of the free tail of the buffer.
+        """
+        if len(self.buffer) - self.end < self.frame_size:
+            pending = self.end - self.start
+            self.view[:pending] = self.buffer[self.start : self.end]
+            self.start = 0
+            self.end = pending
+        return self.view[self.end :]
+
+    def commit(self, nbytes):
+        """
+        Account for nbytes written into the view returned by writable().
+
+        :param nbytes: Number of bytes received.
+        """
+        self.end += nbytes
+        self.bytes_received += nbytes
+        if nbytes % self.frame_size:
+            self.partial_reads += 1
+
+    def recv_from(self, sock):
+        """
+        Receive once from sock into the buffer.
+
+        :param sock: Connected stream socket.
+        :return: Number of bytes received, 0 when the peer closed.
+        """
+        nbytes = sock.recv_into(self.writable())
+        self.commit(nbytes)
+        return nbytes
+
+    def frames(self):
+        """
+        Yield every complete, CRC-valid frame currently buffered.
+
+        :return: Generator of memoryviews, one per frame.
+        """
+        frame_size = self.frame_size
+        while self.end - self.start >= frame_size:
+            start = self.start
+            frame = self.view[start : start + frame_size]
+            received_crc = frame[frame_size - 2] << 8 | frame[frame_size - 1]
+            if crc16_modbus(frame[: frame_size - 2]) == received_crc:
+                self.start = start + frame_size
+                self.frames_decoded += 1
+                yield frame
+            else:
+                self._resync()
+
+    def _resync(self):
+        # Skip to the next header signature after the current start
+        self.resyncs += 1
+        found = self.buffer.find(
+            self.signature,
+            self.start + self.signature_offset + 1,
+            self.end,
+        )
+        if found >= 0:
+            self.start = found - self.signature_offset
+        else:
+            # Keep just enough bytes to match a signature split across reads
+            keep = self.signature_offset + len(self.signature) - 1
+            self.start = max(self.start + 1, self.end - keep)
+
+
+def socket_frames(server_ip, server_port, reassembler=None):
+    """
+    Connect to a rectifier controller and yield its frames.
+
+    :param server_ip: Controller IP address.
+    :param server_port: Controller port number.
+    :param reassembler: Optional FrameReassembler, e.g. to read its counters.
+    :return: Generator of memoryview frames, ends when the peer closes.
+    """
+    if reassembler is None:
+        reassembler = FrameReassembler()
+
+    with socket.create_connection((server_ip, server_port)) as client_socket:
+        log.info("Connected to server %s:%s", server_ip, server_port)
+        while reassembler.recv_from(client_socket):
+            yield from reassembler.frames()
+
+
+# Loopback check: a local server sends frames in odd-sized pieces with
+# corrupted frames and garbage in between
+if __name__ == "__main__":
+    import random
+    import threading
+
+    from benchmark_crc import FRAME
+
+    FRAME_COUNT = 2000
+
+    def serve(server_socket, expected):
+        conn, _ = server_socket.accept()
+        rng = random.Random(1)
+        stream = bytearray()
+        for i in range(FRAME_COUNT):
+            if i % 97 == 0:
+                stream += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 300)))
+            if i % 101 == 0:
+                bad = bytearray(FRAME)
+                bad[100] ^= 0xFF
+                stream += bad
+            stream += FRAME
+            expected.append(i)
+        with conn:
+            pos = 0
+            while pos < len(stream):
+                size = rng.randrange(1, 700)
+                conn.sendall(stream[pos : pos + size])
+                pos += size
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen(1)
+    expected = []
+    server = threading.Thread(target=serve, args=(server_socket, expected))
+    server.start()
+
+    reassembler = FrameReassembler()
+    received = 0
+    for frame in socket_frames(*server_socket.getsockname(), reassembler=reassembler):
+        assert frame == FRAME
+        received += 1
+    server.join()
+    server_socket.close()
+
+    print(reassembler.stats())
+    print(f"Received {received} of {len(expected)} frames")
@@ -1,22 +1,58 @@
 import tkinter as tk
 from tkinter import ttk
-from multiprocessing import Process, Queue
+from multiprocessing import Process
 import time
-from user_interface_for_Rectifier import start_client
+from bounded_queue import POLICIES, BoundedQueue
+from delta_protocol import DeltaReceiver
+from frame_scheduler import FrameScheduler
+from frame_schema import LAYOUT, MODULE_COUNT
+from render_model import MODULE_DISPLAY, RenderModel
+from rolling_stats import DEFAULT_WINDOWS, RollingStats, display_values, format_stats
+from trend_history import TrendHistory
+
+TREND_WIDTH = 120  # Sparkline width in pixels, one history column per pixel
+TREND_ROW = 18  # Sparkline height per field
+TREND_COLORS = ("firebrick", "darkorange", "royalblue")  # temp, current, voltage
 
 class PowerModuleDisplay:
-    def __init__(self, queue):
-        self.queue = queue  # Queue to receive live data
+    def __init__(
+        self,
+        queue,
+        render_mode="conflate",
+        charger=None,
+        stats_window=None,
+        trend_samples=None,
+        metrics=None,
+        max_fps=30,
+    ):
+        self.queue = DeltaReceiver(queue)  # Live data, full snapshots or keyframes and deltas
+        self.render_mode = render_mode  # "conflate" or "every" message
+        self.charger = charger  # Charger to show, None shows the latest of any
+        self.charger_shown = None  # Charger whose values are on screen
+        self.render_model = RenderModel(module_count=MODULE_COUNT)
+        self.stats_window = stats_window  # "1s", "1m" or "1h" rolling stats, None hides them
+        self.rolling_stats = {}  # charger -> RollingStats fed with every message
+        self.stats_labels = []
+        self.stats_text = []
+        self.stats_shown_ns = 0
+        self.trend_samples = trend_samples  # Messages per sparkline column, None hides the sparklines
+        self.trends = {}  # charger -> TrendHistory fed with every message
+        self.trend_lines = []  # Per module: (canvas, line item per field)
+        self.trends_shown = (None, 0)  # (charger, samples) last drawn
+        self.metrics = metrics  # PipelineMetrics shared with the data process, None disables them
+        self.metrics_label = None
+        self.metrics_shown_ns = 0
+        self.on_first_frame = None  # Called once, after the first message is on screen
         self.soc_value = None
         self.soh_value = None
-        self.temp_values = [None] * 6
-        self.current_values = [None] * 6
-        self.voltage_values = [None] * 6
+        self.temp_values = [None] * MODULE_COUNT
+        self.current_values = [None] * MODULE_COUNT
+        self.voltage_values = [None] * MODULE_COUNT
 
         # Create main application window
         self.root = tk.Tk()
         self.root.title("Power Module Display")
-        self.root.geometry("800x400")
+        self.root.geometry("800x700" if trend_samples else "800x540")
 
         # Configure grid layout for the main window
         self.root.columnconfigure(0, weight=1)
@@ -35,14 +71,30 @@ class PowerModuleDisplay:
         self.power_modules = []  # To store label references
         self.create_modules_frame()
 
-        # Schedule periodic updates to fetch data from the queue
-        self.root.after(500, self.update_data_from_queue)  # 500ms interval
+        # Pipeline metrics overlay, F2 shows and hides it
+        if self.metrics is not None:
+            self.metrics_label = ttk.Label(self.main_frame, font=("Courier", 9), justify="left", anchor="w")
+            self.metrics_label.grid(row=2, column=0, sticky="ew")
+            self.root.bind("<F2>", self.toggle_metrics)
+
+        # Labels in RenderModel order: SOC, SOH, then temp/current/voltage per module
+        self.labels = [self.soc_label, self.soh_label]
+        for module_labels in self.power_modules:
+            self.labels.extend(module_labels)
+
+        # Update when data arrives (or every 100 ms without a wakeup pipe), at most max_fps times a second
+        self.scheduler = FrameScheduler(self.root, queue, self.update_data_from_queue, max_fps)
 
     def create_info_frame(self):
         self.info_frame = ttk.Frame(self.main_frame, padding=10)
         self.info_frame.grid(row=0, column=0, sticky="ew")
         self.info_frame.columnconfigure(0, weight=1)
 
+        # Which charger the panels show; with several they would otherwise be indistinguishable
+        self.charger_label = ttk.Label(self.info_frame, text=f"Charger: {self.charger or 'NA'}",
+                                       font=("Arial", 12, "bold"), anchor="w")
+        self.charger_label.pack(side="left", padx=10)
+
         self.soc_label = ttk.Label(self.info_frame, text="SOC: NA%", 
                                    font=("Arial", 12, "bold"), anchor="w")
         self.soc_label.pack(side="left", padx=10)
@@ -55,9 +107,9 @@ class PowerModuleDisplay:
         self.modules_frame = ttk.Frame(self.main_frame, padding=10)
         self.modules_frame.grid(row=1, column=0, sticky="nsew")
         self.modules_frame.columnconfigure((0, 1, 2), weight=1)
-        self.modules_frame.rowconfigure((0, 1), weight=1)
+        self.modules_frame.rowconfigure(tuple(range((MODULE_COUNT + 2) // 3)), weight=1)
 
-        for i in range(1, 7):
+        for i in range(1, MODULE_COUNT + 1):
             self.power_modules.append(self.create_power_module(self.modules_frame, i))
 
     def create_power_module(self, parent, module_number):
@@ -66,11 +118,19 @@ class PowerModuleDisplay:
 
         ttk.Label(frame, text=f"Power Module {module_number}", font=("Arial", 10, "bold"), anchor="center").pack(pady=5)
 
-        temp_label = self.create_label(frame, "Temp: NA °C")
-        current_label = self.create_label(frame, "Current: NA A")
-        voltage_label = self.create_label(frame, "Voltage: NA V")
+        # One label per schema display field, in RenderModel order
+        labels = tuple(self.create_label(frame, f"{label}: NA {unit}") for _, _, label, unit in LAYOUT.display_fields())
+        if self.stats_window is not None:
+            self.stats_labels.append(self.create_label(frame, ""))
+            self.stats_text.append("")
+        if self.trend_samples is not None:
+            fields = LAYOUT.display_fields()
+            canvas = tk.Canvas(frame, width=TREND_WIDTH, height=TREND_ROW * len(fields), highlightthickness=0)
+            canvas.pack(padx=5, pady=2)
+            lines = [canvas.create_line(0, 0, 0, 0, fill=color) for color, _ in zip(TREND_COLORS, fields)]
+            self.trend_lines.append((canvas, lines))
 
-        return temp_label, current_label, voltage_label
+        return labels
 
     @staticmethod
     def create_label(frame, text):
@@ -79,10 +139,19 @@ class PowerModuleDisplay:
         return label
 
     def update_data_from_queue(self):
+        if self.render_mode == "conflate":
+            self.render_latest_from_queue()
+            return
+
         try:
             # Check if there's data in the queue
             while not self.queue.empty():
                 data = self.queue.get_nowait()
+                started_ns = time.monotonic_ns()
+                if self.charger is not None and data.get("charger") != self.charger:
+                    self.add_sample(data)  # Statistics of every charger, panels of the pinned one
+                    continue
+                self.show_charger(data.get("charger"))
 
                 # Update SOC and SOH
                 self.soc_value, self.soh_value = data["soc"], data["soh"]
@@ -95,65 +164,419 @@ class PowerModuleDisplay:
                 self.current_values = data["current"]
                 self.voltage_values = data["voltage"]
 
-                for i, (temp, current, voltage) in enumerate(zip(self.temp_values, self.current_values, self.voltage_values)):
-                    formatted_temp = f"Temp: {temp:.2f} °C" if temp is not None else "Temp: NA"
-                    self.power_modules[i][0].config(text=formatted_temp)
-                    formatted_current = f"Current: {current:.2f} A" if current is not None else "Current: NA"
-                    self.power_modules[i][1].config(text=formatted_current)
-                    formatted_voltage = f"Voltage: {voltage:.2f} V" if voltage is not None else "Voltage: NA"
-                    self.power_modules[i][2].config(text=formatted_voltage)
+                for i, module_labels in enumerate(self.power_modules):
+                    for label, (key, formatter) in zip(module_labels, MODULE_DISPLAY):
+                        if i < len(data[key]):
+                            label.config(text=formatter(data[key][i]))
+
+                self.add_sample(data)
+                if self.stats_window is not None:
+                    self.show_stats(data.get("charger"))
+                if self.trend_samples is not None:
+                    self.show_trends(data.get("charger"))
+                if self.metrics is not None:
+                    self.note_render(data, started_ns)
+                if self.on_first_frame is not None:
+                    self.first_frame_shown()
         except Exception as e:
             print(f"Error updating data: {e}")
+            if self.metrics is not None:
+                self.metrics.count("gui_exceptions")
 
-        # Schedule the next update
-        self.root.after(100, self.update_data_from_queue)
+    def render_latest_from_queue(self):
+        # Render only the newest snapshot and only the labels whose text changed
+        try:
+            started_ns = time.monotonic_ns()
+            conflated = self.render_model.frames_conflated
+            on_message = None
+            if self.stats_window is not None or self.trend_samples is not None or self.metrics is not None:
+                on_message = self.add_sample
+            data = self.render_model.drain(self.queue, self.charger, on_message)
+            if data is not None:
+                self.show_charger(data.get("charger"))
+                for index, text in self.render_model.changed_labels(data):
+                    self.labels[index].config(text=text)
+                if self.stats_window is not None:
+                    self.show_stats(data.get("charger"))
+                if self.trend_samples is not None:
+                    self.show_trends(data.get("charger"))
+                if self.on_first_frame is not None:
+                    self.first_frame_shown()
+            if self.metrics is not None:
+                # Frames drained but never drawn
+                self.metrics.count("conflated", self.render_model.frames_conflated - conflated)
+                if data is not None:
+                    self.note_render(data, started_ns)
+                else:
+                    self.show_metrics()
+        except Exception as e:
+            print(f"Error updating data: {e}")
+            if self.metrics is not None:
+                self.metrics.count("gui_exceptions")
+
+    def show_charger(self, charger):
+        if charger != self.charger_shown:
+            self.charger_shown = charger
+            self.charger_label.config(text=f"Charger: {charger if charger is not None else 'NA'}")
+
+    def add_sample(self, data):
+        # Every message feeds the statistics, trends and queue age, rendered or not
+        charger = data.get("charger")
+        if self.metrics is not None and "timestamp_ns" in data:
+            self.metrics.record("queue_age", time.monotonic_ns() - data["timestamp_ns"])
+        if self.stats_window is not None:
+            rolling = self.rolling_stats.get(charger)
+            if rolling is None:
+                # Only the shown window: an hour of 10 Hz samples is tens of MB per charger
+                window = {self.stats_window: DEFAULT_WINDOWS[self.stats_window]}
+                rolling = self.rolling_stats[charger] = RollingStats(window)
+            rolling.update(display_values(data))
+        if self.trend_samples is not None:
+            history = self.trends.get(charger)
+            if history is None:
+                history = self.trends[charger] = TrendHistory(TREND_WIDTH, self.trend_samples)
+            history.update(data)
+
+    def note_render(self, data, started_ns):
+        # Render time, and the end-to-end age of the frame now on screen
+        now_ns = time.monotonic_ns()
+        self.metrics.count("renders")
+        self.metrics.record("render", now_ns - started_ns)
+        if "timestamp_ns" in data:
+            self.metrics.record("frame_age", now_ns - data["timestamp_ns"])
+        self.show_metrics()
+
+    def show_metrics(self):
+        # Refresh the overlay at most once a second
+        now_ns = time.monotonic_ns()
+        if now_ns - self.metrics_shown_ns < 1_000_000_000 or not self.metrics_label.winfo_ismapped():
+            return
+        self.metrics_shown_ns = now_ns
+        self.metrics_label.config(text=self.metrics.overlay_text())
+
+    def toggle_metrics(self, event=None):
+        if self.metrics_label.winfo_ismapped():
+            self.metrics_label.grid_remove()
+        else:
+            self.metrics_label.grid()
+            self.metrics_shown_ns = 0
+
+    def show_trends(self, charger):
+        # Redraw only when a new column closed, so the cost is per column, not per message
+        history = self.trends[charger]
+        if (charger, history.samples // self.trend_samples) == self.trends_shown:
+            return
+        self.trends_shown = (charger, history.samples // self.trend_samples)
+        for module, (canvas, lines) in enumerate(self.trend_lines):
+            for row, (line, (_, ring)) in enumerate(zip(lines, history.rings(module))):
+                points = ring.points(TREND_ROW - 2, 0, row * TREND_ROW + 1)
+                if points:
+                    canvas.coords(line, *points)
+
+    def show_stats(self, charger):
+        # Statistics move with every sample, refresh them at most once a second
+        now_ns = time.monotonic_ns()
+        if now_ns - self.stats_shown_ns < 1_000_000_000:
+            return
+        self.stats_shown_ns = now_ns
+        rolling = self.rolling_stats[charger]
+        for i, label in enumerate(self.stats_labels):
+            text = "\n".join(
+                format_stats(f"{self.stats_window} {prefix}", rolling.get(f"{name}_{i}", self.stats_window, now_ns))
+                for prefix, name in (("T", "temp"), ("I", "current"), ("V", "voltage"))
+            )
+            if text != self.stats_text[i]:
+                self.stats_text[i] = text
+                label.config(text=text)
+
+    def first_frame_shown(self):
+        callback, self.on_first_frame = self.on_first_frame, None
+        callback()
 
     def run(self):
         # Start the Tkinter event loop
         self.root.mainloop()
 
 
-# Simulate live data updates from another process
-def data_provider(queue):
-    temp_values = [30, 32, None, 28, 31, 29]
-    current_values = [5.1, 4.8, None, 5.5, 4.9, 5.0]
-    voltage_values = [3.7, 3.8, None, 3.9, 3.6, 3.7]
-    soc = 99
-
-    while True:
-        # Simulate new data being sent to the queue
-        new_data = {
-            "soc": soc,
-            "soh": "Good",
-            "temp": temp_values,
-            "current": current_values,
-            "voltage": voltage_values
-        }
-        queue.put(new_data)
-
-        # Update data randomly for simulation
-        time.sleep(0.5)
-        temp_values = [t + 0.1 if t else None for t in temp_values]
-        current_values = [c + 0.1 if c else None for c in current_values]
-        voltage_values = [v + 0.1 if v else None for v in voltage_values]
-        if soc < 100:
-            soc += 0.1
-        else:
-            soc = 0
+def when_mapped(root, callback):
+    # Call callback once, when the window is first shown
+    def on_map(event):
+        if event.widget is root:
+            root.unbind("<Map>", binding)
+            callback()
+
+    binding = root.bind("<Map>", on_map, add="+")
 
 
 # Main execution
 if __name__ == "__main__":
-    queue = Queue()
+    import argparse
+
+    from data_sources import parse_endpoint, run_data_source
+
+    parser = argparse.ArgumentParser(description="Power Module Display")
+    parser.add_argument(
+        "endpoints",
+        nargs="*",
+        help="Rectifier controllers to poll as [name=]host[:port]; "
+        "without any the simulated data provider is used",
+    )
+    parser.add_argument(
+        "--record", metavar="PATH", help="append raw frames from the endpoints to a capture file"
+    )
+    parser.add_argument(
+        "--store",
+        metavar="DIR",
+        help="append decoded frames from the endpoints to a telemetry store",
+    )
+    parser.add_argument(
+        "--alarms",
+        nargs="?",
+        const="default",
+        metavar="RULES.json",
+        help="check frames from the endpoints against alarm rules (the built-in set without a file)",
+    )
+    parser.add_argument(
+        "--replay", metavar="PATH", help="feed a capture file instead of live endpoints"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="replay speed: 1 real time, N times faster, 0 as fast as possible",
+    )
+    parser.add_argument(
+        "--hub",
+        metavar="SOCKET",
+        help="also publish every decoded message on this Unix socket for loggers, alarm checkers "
+        "and other displays",
+    )
+    parser.add_argument(
+        "--subscribe",
+        metavar="SOCKET",
+        help="show the messages another instance publishes with --hub instead of a data source",
+    )
+    parser.add_argument(
+        "--render",
+        choices=("conflate", "every"),
+        default="conflate",
+        help="render only the newest snapshot, or every queued message",
+    )
+    parser.add_argument(
+        "--view",
+        choices=("modules", "dashboard"),
+        default="modules",
+        help="module panels for one charger, or a canvas grid of every charger",
+    )
+    parser.add_argument(
+        "--charger",
+        help="charger the module panels show, e.g. the name of an endpoint; "
+        "default: whichever sent the latest message",
+    )
+    parser.add_argument(
+        "--stats",
+        choices=("1s", "1m", "1h"),
+        help="show rolling min/mean/max and standard deviation per module over this window",
+    )
+    parser.add_argument(
+        "--trend",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="SAMPLES",
+        help="show per-module sparklines, min/max of SAMPLES messages per pixel column (default 10)",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=int,
+        nargs="?",
+        const=9108,
+        metavar="PORT",
+        help="count and time every pipeline stage, show an overlay (F2) and serve "
+        "Prometheus text at http://127.0.0.1:PORT/metrics (default 9108, 0 disables the endpoint); "
+        "frame ages need --transport shm or no --delta",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="send only changed fields plus periodic keyframes (queue transport only)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+        help="write the data process log to rotating files in --log-dir",
+    )
+    parser.add_argument("--log-dir", default="logs", help="directory for log files")
+    parser.add_argument(
+        "--transport",
+        choices=("queue", "shm"),
+        default="queue",
+        help="multiprocessing.Queue (pickled dicts) or shared memory ring",
+    )
+    parser.add_argument(
+        "--startup-probe",
+        action="store_true",
+        help="print monotonic_ns when the window is shown and when the first message is on screen, "
+        "then exit (used by benchmark_startup.py)",
+    )
+    parser.add_argument(
+        "--max-fps",
+        type=float,
+        default=30.0,
+        help="most redraws per second; the display wakes up when data arrives instead of polling",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1024,
+        help="messages the transport holds before --queue-policy applies (queue transport; the ring holds 1024)",
+    )
+    parser.add_argument(
+        "--queue-policy",
+        choices=POLICIES,
+        help="when the display falls behind: block the data process, drop the oldest or newest "
+        "message, or keep only the latest per charger (default: block, latest_per_charger for "
+        "live endpoints, whose client would stall every charger's socket on a blocked put; "
+        "drop_newest with --delta)",
+    )
+    args = parser.parse_args()
+    if args.queue_policy is None:
+        if not args.endpoints or args.subscribe or args.replay:
+            args.queue_policy = "block"
+        else:
+            # Deltas cannot be conflated; a dropped one is skipped until the next keyframe
+            args.queue_policy = "drop_newest" if args.delta else "latest_per_charger"
+    if args.delta and args.transport == "shm":
+        parser.error("--delta needs --transport queue, the ring only carries full snapshots")
+    if args.queue_policy == "drop_oldest" and args.transport == "shm":
+        parser.error("--queue-policy drop_oldest needs --transport queue, only the display may read the ring")
+    if args.queue_policy == "latest_per_charger" and args.delta:
+        parser.error("--queue-policy latest_per_charger needs full snapshots, not --delta")
+    if args.charger and args.view == "dashboard":
+        parser.error("--charger selects the module panels' charger, the dashboard shows every charger")
+    if args.charger and args.endpoints and not (args.subscribe or args.replay):
+        names = [parse_endpoint(text)[0] for text in args.endpoints]
+        if args.charger not in names:
+            parser.error(f"--charger {args.charger!r} is not one of the endpoints: {', '.join(names)}")
+    if args.endpoints and (args.transport == "shm" or args.hub):
+        from shm_transport import CHARGER_SIZE
+
+        for text in args.endpoints:
+            charger = parse_endpoint(text)[0]
+            if len(charger.encode()) > CHARGER_SIZE:
+                parser.error(f"charger name {charger!r} is longer than {CHARGER_SIZE} bytes, use name=host:port")
+
+    metrics = None
+    if args.metrics is not None:
+        from pipeline_metrics import PipelineMetrics, serve_metrics
+
+        metrics = PipelineMetrics()
+        if args.metrics:
+            serve_metrics(metrics, args.metrics)
+    if args.transport == "shm":
+        from shm_transport import SharedMemoryRing
+
+        queue = BoundedQueue(policy=args.queue_policy, queue=SharedMemoryRing(), metrics=metrics, wakeup=True)
+    else:
+        queue = BoundedQueue(args.queue_size, args.queue_policy, metrics=metrics, wakeup=True)
+    producer_queue = queue
+    if args.delta:
+        from delta_protocol import DeltaSender
+
+        producer_queue = DeltaSender(queue)
 
     # Start the data provider process
-    data_process = Process(target=data_provider, args=(queue,))
+    # The source module is imported in the data process, the display only names it
+    if args.subscribe:
+        source, source_args = "telemetry_hub:subscribe_to_queue", (args.subscribe,)
+    elif args.replay:
+        source, source_args = "frame_capture:start_replay", (args.replay, args.speed)
+    elif args.endpoints:
+        endpoints = [parse_endpoint(text) for text in args.endpoints]
+        alarm_rules = None
+        if args.alarms == "default":
+            from alarm_rules import DEFAULT_RULES
+
+            alarm_rules = DEFAULT_RULES
+        elif args.alarms:
+            import json
+
+            with open(args.alarms) as f:
+                alarm_rules = json.load(f)
+        source, source_args = "async_client:start_async_client", (
+            endpoints,
+            args.record,
+            args.store,
+            alarm_rules,
+            metrics,
+        )
+    else:
+        source, source_args = "data_sources:data_provider", (metrics,)
+    target, target_args = run_data_source, (producer_queue, source, *source_args)
+    if args.hub:
+        from telemetry_hub import run_with_hub
+
+        target_args = (args.hub, target, *target_args)
+        target = run_with_hub
+    if args.log_level:
+        import logging
+
+        from rectifier_logging import run_with_logging
+
+        level = getattr(logging, args.log_level)
+        target_args = (args.log_dir, level, target, *target_args)
+        target = run_with_logging
+    data_process = Process(target=target, args=target_args)
     # data_process = Process(target=start_client, args=(queue,))
-    data_process.start()
 
-    # Start the GUI application
-    app = PowerModuleDisplay(queue)
+    # Create the GUI with placeholder values; the data process starts once
+    # the window is shown, so its startup does not delay the first paint
+    if args.view == "dashboard":
+        from canvas_dashboard import CanvasDashboard
+
+        app = CanvasDashboard(queue, max_fps=args.max_fps, metrics=metrics)
+    else:
+        app = PowerModuleDisplay(
+            queue,
+            render_mode=args.render,
+            charger=args.charger,
+            stats_window=args.stats,
+            trend_samples=args.trend,
+            metrics=metrics,
+            max_fps=args.max_fps,
+        )
+
+    def startup_mark(name):
+        # Monotonic clock, comparable with the launching process on the same host
+        print(f"startup {name} {time.monotonic_ns()}", flush=True)
+
+    def window_shown():
+        if args.startup_probe:
+            startup_mark("window")
+        data_process.start()
+
+    when_mapped(app.root, window_shown)
+    if args.startup_probe:
+        app.on_first_frame = lambda: (startup_mark("first_frame"), app.root.quit())
     app.run()
+    if args.view == "dashboard":
+        print(f"Dashboard stats: {app.grid.stats()}")
+    elif args.render == "conflate":
+        print(f"Render stats: {app.render_model.stats()}")
+    if args.delta:
+        print(f"Delta stats: {app.queue.decoder.stats()}")
+    print(f"Queue stats: {queue.stats()}")
+    print(f"Scheduler stats: {app.scheduler.stats()}")
 
     # Terminate the data provider process when the GUI exits
-    data_process.terminate()
+    if data_process.pid is not None:
+        data_process.terminate()
+        data_process.join(5)
+        if data_process.is_alive():
+            data_process.kill()  # Stuck in cleanup, e.g. a store on a hung disk
+            data_process.join()
+    if args.transport == "shm":
+        queue.close()
+    if metrics is not None:
+        print(f"Pipeline metrics: {metrics.snapshot()}")
+        metrics.close()
@@ -0,0 +1,211 @@
+import logging
+import os
+import queue as queue_module
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from frame_schema import CRC_OFFSET
+from rectifier_logging import LazyHex
+from sm_frame import FRAME_SIZE, decode_sm_frame
+from user_interface_for_Rectifier import record_to_display_data
+
+log = logging.getLogger("rectifier.decoder")
+
+
+def decode_chunk(charger, chunk, crc_failures=None):
+    """
+    Worker: decode a chunk of back-to-back frames from one charger.
+
+    :param charger: Charger tag copied into every message.
+    :param chunk: Bytes holding N * 256 bytes of raw frames.
+    :param crc_failures: List the received CRC bytes of failed frames are
+        appended to, or None.
+    :return: List of display messages in frame order; like the inline
+        decoder, frames failing the CRC are decoded too.
+    """
+    view = memoryview(chunk)
+    messages = []
+    for start in range(0, len(view), FRAME_SIZE):
+        frame = decode_sm_frame(view[start : start + FRAME_SIZE])
+        if not frame.crc_ok and crc_failures is not None:
+            crc_failures.append(bytes(view[start + CRC_OFFSET : start + CRC_OFFSET + 2]))
+        data = record_to_display_data(frame)
+        data["charger"] = charger
+        messages.append(data)
+    return messages
+
+
+def _decode_chunk_reporting(charger, chunk):
+    # Worker: workers have no log handler, the parent logs the CRC failures
+    crc_failures = []
+    return decode_chunk(charger, chunk, crc_failures), crc_failures
+
+
+class ParallelDecoder:
+    """
+    Decode stage that fans chunks of raw frames out to a process pool.
+
+    Frames are collected per charger into one bytes buffer, so a whole chunk
+    crosses to the worker as a single pickled bytes object rather than one
+    object per frame. Results come back in submission order, which keeps
+    every charger's frames in order. A partial chunk waits until batch_size
+    frames arrive, flush() is called or, with max_age_ms, its oldest frame
+    has waited that long (see expire()), which bounds the display lag of
+    a slow live stream.
+    """
+
+    def __init__(self, workers=None, batch_size=256, max_pending=None, max_age_ms=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_pending = max_pending or self.workers * 2
+        self.max_age_ns = None if max_age_ms is None else int(max_age_ms * 1e6)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.buffers = {}  # charger -> bytearray of pending frames
+        self.first_ns = {}  # charger -> arrival time of its oldest pending frame
+        self.pending = deque()  # Futures in submission order
+
+        # Counters
+        self.crc_failures = 0
+
+    def _submit(self, charger):
+        buffer = self.buffers.pop(charger)
+        del self.first_ns[charger]
+        self.pending.append(self.pool.submit(_decode_chunk_reporting, charger, bytes(buffer)))
+
+    def _result(self):
+        # Messages of the oldest chunk, waiting for it if needed
+        messages, crc_failures = self.pending.popleft().result()
+        for crc in crc_failures:
+            log.warning("CRC mismatch: received %s", LazyHex(crc))
+        self.crc_failures += len(crc_failures)
+        return messages
+
+    def feed(self, charger, frame):
+        """
+        Add one raw frame, returning any messages that are already decoded.
+
+        :param charger: Charger tag of the frame.
+        :param frame: Bytes-like 256 byte frame.
+        :return: List of display messages, possibly empty.
+        """
+        buffer = self.buffers.get(charger)
+        if buffer is None:
+            buffer = self.buffers[charger] = bytearray()
+            self.first_ns[charger] = time.monotonic_ns()
+        buffer += frame
+        if len(buffer) >= self.batch_size * FRAME_SIZE:
+            self._submit(charger)
+        if self.max_age_ns is not None:
+            deadline_ns = self.next_deadline_ns()
+            if deadline_ns is not None and deadline_ns <= time.monotonic_ns():
+                return self.expire()
+        return self.collect(block=len(self.pending) >= self.max_pending)
+
+    def next_deadline_ns(self):
+        # When the oldest partial chunk is due, None without max_age_ms or partial chunks
+        if self.max_age_ns is None or not self.first_ns:
+            return None
+        return min(self.first_ns.values()) + self.max_age_ns
+
+    def expire(self):
+        """
+        Submit the partial chunks that waited max_age_ms and wait for them.
+
+        :return: List of display messages in order, up to and including the
+            expired chunks.
+        """
+        now_ns = time.monotonic_ns()
+        due = [charger for charger, first_ns in self.first_ns.items() if now_ns - first_ns >= self.max_age_ns]
+        if not due:
+            return self.collect()
+        for charger in due:
+            self._submit(charger)
+        messages = []
+        while self.pending:
+            messages.extend(self._result())
+        return messages
+
+    def collect(self, block=False):
+        """
+        Messages of the finished chunks at the head of the queue.
+
+        :param block: Wait for the oldest chunk if it is still running.
+        :return: List of display messages in order.
+        """
+        messages = []
+        while self.pending and (block or self.pending[0].done()):
+            messages.extend(self._result())
+            block = False
+        return messages
+
+    def flush(self):
+        """
+        Submit partial chunks and wait for everything outstanding.
+
+        :return: List of the remaining display messages in order.
+        """
+        for charger in list(self.buffers):
+            self._submit(charger)
+        messages = []
+        while self.pending:
+            messages.extend(self._result())
+        return messages
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_END = object()
+
+
+def _read_frames(frames, items):
+    # Reader thread: copy every frame (the reassembler reuses its buffer)
+    try:
+        for charger, frame in frames:
+            items.put((charger, bytes(frame)))
+    except Exception as e:
+        items.put(e)
+    items.put(_END)
+
+
+def decode_stream(frames, workers=None, batch_size=256, max_age_ms=None):
+    """
+    Decode (charger, frame) pairs in parallel, yielding messages in order.
+
+    :param frames: Iterable of (charger, bytes-like frame).
+    :param workers: Pool size, defaults to the number of cores.
+    :param batch_size: Frames per chunk sent to a worker.
+    :param max_age_ms: Decode a partial chunk once its oldest frame waited
+        this long; frames are then read in a thread, so this also holds
+        while no frame arrives. None waits for full chunks.
+    :return: Generator of display messages.
+    """
+    with ParallelDecoder(workers, batch_size, max_age_ms=max_age_ms) as decoder:
+        if max_age_ms is None:
+            for charger, frame in frames:
+                yield from decoder.feed(charger, frame)
+        else:
+            items = queue_module.Queue(batch_size * decoder.max_pending)  # Backpressure on the reader
+            threading.Thread(target=_read_frames, args=(frames, items), name="frame-reader", daemon=True).start()
+            while True:
+                deadline_ns = decoder.next_deadline_ns()
+                timeout = None if deadline_ns is None else max(0, deadline_ns - time.monotonic_ns()) / 1e9
+                try:
+                    item = items.get(timeout=timeout)
+                except queue_module.Empty:
+                    yield from decoder.expire()
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield from decoder.feed(*item)
+        yield from decoder.flush()
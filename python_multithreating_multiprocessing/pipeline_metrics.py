@@ -0,0 +1,377 @@
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+
+# Counters, one 64-bit slot each, and the process that writes each:
+# frames, crc_failures, short_frames, queue_drops, source_exceptions: data process
+# conflated (frames drained but never drawn), gui_exceptions, renders: GUI
+COUNTERS = (
+    "frames",
+    "crc_failures",
+    "short_frames",
+    "queue_drops",
+    "source_exceptions",
+    "conflated",
+    "gui_exceptions",
+    "renders",
+)
+
+# Latency stages in nanoseconds, in pipeline order:
+# crc, decode: CRC check and unpack of one frame (data process)
+# queue_age: frame receive -> taken off the queue by the GUI
+# render: one GUI update of the labels
+# frame_age: frame receive -> its values on screen (end to end)
+STAGES = ("crc", "decode", "queue_age", "render", "frame_age")
+
+# Log-linear histogram buckets like HdrHistogram: values below 2 ** SUB_BITS
+# get a bucket each, above that every power of two is split into
+# 2 ** SUB_BITS buckets, so any value is within 1/16 (6 %) of its bucket.
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+MAX_BITS = 40  # Values up to 2 ** 40 ns (18 minutes); larger ones go in the last bucket
+BUCKETS = (MAX_BITS - SUB_BITS + 1) * SUB_COUNT
+
+# Slots per stage: count, sum, max, then the buckets
+_STAGE_SLOTS = 3 + BUCKETS
+_COUNTER_INDEX = {name: i for i, name in enumerate(COUNTERS)}
+_STAGE_INDEX = {name: len(COUNTERS) + i * _STAGE_SLOTS for i, name in enumerate(STAGES)}
+_SLOTS = len(COUNTERS) + len(STAGES) * _STAGE_SLOTS
+
+# Slots written by record_frame()
+_FRAMES = _COUNTER_INDEX["frames"]
+_CRC_FAILURES = _COUNTER_INDEX["crc_failures"]
+_CRC_BASE = _STAGE_INDEX["crc"]
+_DECODE_BASE = _STAGE_INDEX["decode"]
+_FRAME_RANGES = {
+    _FRAMES: _FRAMES + 1,
+    _CRC_FAILURES: _CRC_FAILURES + 1,
+    _CRC_BASE: _CRC_BASE + _STAGE_SLOTS,
+    _DECODE_BASE: _DECODE_BASE + _STAGE_SLOTS,
+}
+
+# Bucket upper bounds exported to Prometheus, in seconds
+PROMETHEUS_BOUNDS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def bucket_index(value):
+    """
+    Histogram bucket of a non-negative integer value.
+
+    :return: Index in 0 .. BUCKETS - 1.
+    """
+    if value < SUB_COUNT:
+        return value if value > 0 else 0
+    shift = value.bit_length() - SUB_BITS - 1
+    index = (shift + 1) * SUB_COUNT + (value >> shift) - SUB_COUNT
+    return index if index < BUCKETS else BUCKETS - 1
+
+
+def _add_sample(local, base, value_ns):
+    # Count, sum, max and bucket of one sample; bucket_index() inlined
+    if value_ns < SUB_COUNT:
+        if value_ns < 0:
+            value_ns = 0
+        index = value_ns
+    else:
+        shift = value_ns.bit_length() - SUB_BITS - 1
+        index = (shift + 1) * SUB_COUNT + (value_ns >> shift) - SUB_COUNT
+        if index >= BUCKETS:
+            index = BUCKETS - 1
+    local[base] += 1
+    local[base + 1] += value_ns
+    if value_ns > local[base + 2]:
+        local[base + 2] = value_ns
+    local[base + 3 + index] += 1
+
+
+def bucket_bounds(index):
+    """
+    Value range of a histogram bucket.
+
+    :return: Tuple of (lowest value, one past the highest value).
+    """
+    if index < SUB_COUNT:
+        return index, index + 1
+    shift = index // SUB_COUNT - 1
+    low = (SUB_COUNT + index % SUB_COUNT) << shift
+    return low, low + (1 << shift)
+
+
+class PipelineMetrics:
+    """
+    Counters and latency histograms in one shared memory block.
+
+    The owner creates the block; passing the object to a Process attaches
+    the child to the same block by name, like SharedMemoryRing. Each
+    process updates its own copy of the slots in a plain list, which is
+    several times cheaper than writing shared memory on every sample, and
+    publishes the counters and stages it wrote to the block at most every
+    PUBLISH_INTERVAL_NS (checked every few samples) and on publish(). So
+    each counter and stage must only be written by one process (see
+    COUNTERS and STAGES; the data process counts frames and times decode,
+    the GUI times rendering); any
+    process can read, seeing values at most about a second old.
+    """
+
+    PUBLISH_INTERVAL_NS = 500_000_000
+    PUBLISH_CHECK = 16  # Samples between looks at the clock
+
+    def __init__(self, name=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=8 * _SLOTS)
+            self.shm.buf[:] = bytes(8 * _SLOTS)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.slots = self.shm.buf.cast("q")  # Published values, shared
+        self.local = self.slots.tolist()  # This process' values
+        self.written = {}  # start -> end of the slot ranges this process wrote
+        self.unpublished = 0
+        self.published_ns = time.monotonic_ns()
+
+    def __getstate__(self):
+        return self.shm.name
+
+    def __setstate__(self, name):
+        self.__init__(name=name)
+
+    def close(self):
+        self.publish()
+        self.slots.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def publish(self):
+        # Copy the ranges this process wrote into shared memory
+        local = self.local
+        for start, end in self.written.items():
+            self.slots[start:end] = array("q", local[start:end])
+        self.unpublished = 0
+        self.published_ns = time.monotonic_ns()
+
+    def _sampled(self):
+        self.unpublished = 0
+        if time.monotonic_ns() - self.published_ns >= self.PUBLISH_INTERVAL_NS:
+            self.publish()
+
+    def count(self, name, n=1):
+        i = _COUNTER_INDEX[name]
+        self.local[i] += n
+        if i not in self.written:
+            self.written[i] = i + 1
+        self.unpublished += 1
+        if self.unpublished >= self.PUBLISH_CHECK:
+            self._sampled()
+
+    def record(self, stage, value_ns):
+        """
+        Add one latency sample.
+
+        :param stage: Name from STAGES.
+        :param value_ns: Latency in nanoseconds; negative values count as 0.
+        """
+        base = _STAGE_INDEX[stage]
+        _add_sample(self.local, base, value_ns)
+        if base not in self.written:
+            self.written[base] = base + _STAGE_SLOTS
+        self.unpublished += 1
+        if self.unpublished >= self.PUBLISH_CHECK:
+            self._sampled()
+
+    def record_frame(self, crc_ns, decode_ns, crc_ok=True):
+        """
+        Count one received frame and time its CRC and decode, in one call.
+
+        :param crc_ns: CRC check time in nanoseconds.
+        :param decode_ns: Unpack time in nanoseconds.
+        :param crc_ok: False also counts a CRC failure.
+        """
+        local = self.local
+        local[_FRAMES] += 1
+        if not crc_ok:
+            local[_CRC_FAILURES] += 1
+        _add_sample(local, _CRC_BASE, crc_ns)
+        _add_sample(local, _DECODE_BASE, decode_ns)
+        if _DECODE_BASE not in self.written:
+            self.written.update(_FRAME_RANGES)
+        self.unpublished += 1
+        if self.unpublished >= self.PUBLISH_CHECK:
+            self._sampled()
+
+    def counters(self):
+        return {name: self.slots[i] for name, i in _COUNTER_INDEX.items()}
+
+    def histogram(self, stage):
+        """
+        Copy of one stage's histogram.
+
+        :return: Tuple of (count, sum_ns, max_ns, list of bucket counts).
+        """
+        base = _STAGE_INDEX[stage]
+        slots = self.slots
+        return slots[base], slots[base + 1], slots[base + 2], slots[base + 3 : base + 3 + BUCKETS].tolist()
+
+    def percentiles(self, stage, percentiles=(50, 90, 99, 99.9)):
+        """
+        Latency percentiles of one stage, each the upper bound of its bucket.
+
+        :return: Dict like {"count": n, "mean_us": ..., "p50_us": ..., "max_us": ...}.
+        """
+        count, total, largest, buckets = self.histogram(stage)
+        result = {"count": count, "mean_us": total / count / 1000 if count else None}
+        targets = [(p, count * p / 100) for p in percentiles]
+        seen = 0
+        index = 0
+        for p, target in targets:
+            while index < BUCKETS and (seen + buckets[index] < target or not buckets[index]):
+                seen += buckets[index]
+                index += 1
+            if not count or index >= BUCKETS:
+                result[f"p{p:g}_us"] = None
+            else:
+                result[f"p{p:g}_us"] = min(bucket_bounds(index)[1] - 1, largest) / 1000
+        result["max_us"] = largest / 1000 if count else None
+        return result
+
+    def snapshot(self):
+        # Everything as one dict, ready for JSON
+        self.publish()
+        return {
+            "counters": self.counters(),
+            "stages": {stage: self.percentiles(stage) for stage in STAGES},
+        }
+
+    def overlay_text(self):
+        """
+        Compact multi-line summary for the GUI overlay.
+
+        :return: One line of counters, then one line per stage with samples.
+        """
+        self.publish()
+        counters = self.counters()
+        lines = ["  ".join(f"{name} {value}" for name, value in counters.items())]
+        for stage in STAGES:
+            p = self.percentiles(stage, (50, 99))
+            if p["count"]:
+                lines.append(f"{stage:10} p50 {p['p50_us']:9.1f} us  p99 {p['p99_us']:9.1f} us  max {p['max_us']:9.1f} us")
+        return "\n".join(lines)
+
+    def prometheus(self, prefix="rectifier"):
+        """
+        Prometheus text exposition format of every counter and stage.
+
+        :return: str, served by serve_metrics().
+        """
+        self.publish()
+        lines = []
+        for name, value in self.counters().items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        metric = f"{prefix}_stage_latency_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for stage in STAGES:
+            count, total, _, buckets = self.histogram(stage)
+            cumulative = 0
+            index = 0
+            for bound in PROMETHEUS_BOUNDS:
+                bound_ns = bound * 1e9
+                # Whole buckets only, so the count is exact for values below the bucket
+                while index < BUCKETS and bucket_bounds(index)[1] <= bound_ns:
+                    cumulative += buckets[index]
+                    index += 1
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {total / 1e9:.9f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(metrics, port=9108, host="127.0.0.1"):
+    """
+    Serve metrics.prometheus() at http://host:port/metrics from a daemon thread.
+
+    :return: The ThreadingHTTPServer; call shutdown() to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood stderr
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# Overhead of instrumenting the decode path, and a sample of the text format
+if __name__ == "__main__":
+    import urllib.request
+
+    from sm_frame import decode_sm_frame, frame_crc_ok
+    from synthetic_frames import FrameGenerator
+    from user_interface_for_Rectifier import record_to_display_data
+
+    FRAMES = 20000
+    frames = FrameGenerator().frames(1000)
+    metrics = PipelineMetrics()
+    clock = time.monotonic_ns
+
+    def plain(frame):
+        frame = decode_sm_frame(frame)
+        return record_to_display_data(frame)
+
+    def instrumented(frame):
+        # What start_client does per frame with metrics on
+        t0 = clock()
+        crc_ok = frame_crc_ok(frame)
+        t1 = clock()
+        record = decode_sm_frame(frame, check_crc=False)
+        record.crc_ok = crc_ok
+        data = record_to_display_data(record)
+        t2 = clock()
+        metrics.record_frame(t1 - t0, t2 - t1, crc_ok)
+        data["timestamp_ns"] = t0
+        return data
+
+    try:
+        best = {}
+        for _ in range(5):  # Interleaved, best of 5, to keep noise out of the difference
+            for func in (plain, instrumented):
+                start = time.perf_counter()
+                for i in range(FRAMES):
+                    func(frames[i % len(frames)])
+                elapsed = (time.perf_counter() - start) / FRAMES
+                best[func.__name__] = min(best.get(func.__name__, elapsed), elapsed)
+        overhead = best["instrumented"] - best["plain"]
+        print(
+            f"decode {best['plain'] * 1e6:.2f} us/frame, instrumented {best['instrumented'] * 1e6:.2f} us/frame: "
+            f"{overhead * 1e6:.2f} us/frame, {overhead * 500:.2%} of a core at 50 chargers x 10 Hz"
+        )
+        start = time.perf_counter()
+        for i in range(FRAMES):
+            metrics.record("render", i)
+        print(f"record() {(time.perf_counter() - start) / FRAMES * 1e9:.0f} ns/sample")
+        print(metrics.overlay_text())
+
+        server = serve_metrics(metrics, port=0)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        text = urllib.request.urlopen(url).read().decode()
+        server.shutdown()
+        print(f"{url} returned {len(text.splitlines())} lines, e.g.")
+        print("\n".join(line for line in text.splitlines() if 'stage="decode"' in line or "frames" in line))
+    finally:
+        metrics.close()
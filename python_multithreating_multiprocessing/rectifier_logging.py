@@ -0,0 +1,102 @@
+import logging
+import logging.handlers
+import os
+import queue
+
+from data_sources import exit_on_sigterm
+
+LOGGER_NAME = "rectifier"  # Parent of every logger in this project
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+
+class LazyHex:
+    """
+    Log argument that is only converted to hex when the message is formatted.
+
+    Pass it as a %s argument, e.g. log.debug("Frame: %s", LazyHex(data)),
+    so disabled debug dumps never run bytes.hex().
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return self.data.hex()
+
+
+class LazyAscii(LazyHex):
+    """Like LazyHex, but shows the bytes as ASCII, dropping anything else."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        return bytes(self.data).decode("ascii", "ignore")
+
+
+def setup_logging(log_dir="logs", level=logging.INFO, max_bytes=5 * 1024 * 1024, backup_count=5):
+    """
+    Send every "rectifier.*" logger to rotating text files via a background thread.
+
+    Callers only format the message and put the record on a queue; the
+    listener thread does the file I/O and the rotation. Call it in the
+    process that logs (e.g. inside the data process, not before forking).
+
+    :param log_dir: Directory for rectifier.log and its backups.
+    :param level: Minimum level, messages below it cost a single level check.
+    :param max_bytes: Size at which the log file is rotated.
+    :param backup_count: Number of rotated files to keep.
+    :return: Started QueueListener, pass it to shutdown_logging.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, "rectifier.log"),
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    listener.start()
+    return listener
+
+
+def shutdown_logging(listener):
+    """
+    Flush queued records and stop the background writer.
+
+    :param listener: QueueListener returned by setup_logging.
+    """
+    listener.stop()
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.close()
+
+
+def run_with_logging(log_dir, level, target, *args):
+    """
+    Process target that sets up logging, runs target(*args) and flushes the log.
+
+    :param log_dir: Directory for the log files.
+    :param level: Minimum log level, e.g. logging.DEBUG.
+    :param target: Function to run, e.g. start_client.
+    :param args: Arguments for target.
+    """
+    listener = setup_logging(log_dir, level)
+    # Process.terminate() sends SIGTERM, exit through finally to flush the log
+    exit_on_sigterm(*args)
+    try:
+        target(*args)
+    finally:
+        shutdown_logging(listener)
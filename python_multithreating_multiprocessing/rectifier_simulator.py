@@ -0,0 +1,429 @@
+import asyncio
+import logging
+import math
+import random
+import struct
+import threading
+import time
+
+from crc16 import crc16_modbus
+from frame_schema import CRC_OFFSET, FRAME_SIZE, LAYOUT, MODULE_COUNT
+from synthetic_frames import build_frame
+
+log = logging.getLogger("rectifier.simulator")
+
+# Send time (time.monotonic_ns) stamped into the first padding bytes of every
+# frame, so a client on the same host can measure receive latency
+SEND_TIME = struct.Struct("<Q")
+SEND_TIME_OFFSET = LAYOUT.span("padding").start
+
+# Fault name -> what goes on the wire instead of one good frame:
+# bad_crc: the frame with a corrupted CRC
+# short_write: the frame in two writes with a pause in between
+# truncate: only the first part of the frame, the rest is never sent
+# garbage: random bytes before the frame
+# disconnect: the connection is closed instead of sending
+FAULTS = ("bad_crc", "short_write", "truncate", "garbage", "disconnect")
+
+
+def steady(t, module_count, rng):
+    # Constant values, as from a charger idling in one state
+    return {
+        "soc": 80,
+        "temps": [35.0] * module_count,
+        "currents": [50.0] * module_count,
+        "voltages": [650.0] * module_count,
+        "charging_state": 2,
+        "contactor_status": 3,
+        "charging_current": 350.0,
+        "charging_voltage": 650.0,
+    }
+
+
+def session(t, module_count, rng):
+    # One charging session: SOC climbs, current tapers off above 80 % and
+    # modules warm up, with a little measurement noise
+    soc = min(100.0, 20.0 + t / 12)
+    taper = 1.0 if soc < 80 else max(0.05, (100 - soc) / 20)
+    current = 60.0 * taper
+    return {
+        "soc": int(soc),
+        "temps": [round(30 + 15 * (1 - math.exp(-t / 600)) * taper + rng.uniform(-0.2, 0.2) + m, 1) for m in range(module_count)],
+        "currents": [round(current + rng.uniform(-0.5, 0.5), 1) for _ in range(module_count)],
+        "voltages": [round(620 + soc * 0.5 + rng.uniform(-0.3, 0.3), 1) for _ in range(module_count)],
+        "charging_state": 2 if soc < 100 else 3,
+        "contactor_status": 3,
+        "charging_current": round(current * module_count, 1),
+        "charging_voltage": round(620 + soc * 0.5, 1),
+        "charging_time": (int(t // 3600) % 24, int(t // 60) % 60),
+    }
+
+
+def noisy(t, module_count, rng):
+    # Every value random every frame: the worst case for delta and change detection
+    return {
+        "soc": rng.randrange(101),
+        "temps": [round(rng.uniform(20.0, 70.0), 1) for _ in range(module_count)],
+        "currents": [round(rng.uniform(0.0, 100.0), 1) for _ in range(module_count)],
+        "voltages": [round(rng.uniform(300.0, 1000.0), 1) for _ in range(module_count)],
+        "charging_state": rng.randrange(16),
+        "contactor_status": rng.randrange(16),
+        "charging_current": round(rng.uniform(0.0, 250.0), 1),
+        "charging_voltage": round(rng.uniform(300.0, 1000.0), 1),
+    }
+
+
+# Trajectory name -> function(seconds since start, module count, rng) -> build_frame keyword arguments
+TRAJECTORIES = {"steady": steady, "session": session, "noisy": noisy}
+
+
+def stamp_frame(frame, timestamp_ns):
+    """
+    Write the send time into the padding and recompute the CRC.
+
+    :param frame: bytearray holding one valid frame, changed in place.
+    :param timestamp_ns: time.monotonic_ns() of the send.
+    """
+    SEND_TIME.pack_into(frame, SEND_TIME_OFFSET, timestamp_ns)
+    crc = crc16_modbus(memoryview(frame)[:CRC_OFFSET])
+    frame[CRC_OFFSET] = crc >> 8
+    frame[CRC_OFFSET + 1] = crc & 0xFF
+
+
+def frame_send_time(frame):
+    # Send time stamped by the simulator, 0 for frames from real controllers
+    return SEND_TIME.unpack_from(frame, SEND_TIME_OFFSET)[0]
+
+
+class SimulatedCharger:
+    """
+    One simulated rectifier controller: a TCP server sending frames at a rate.
+
+    Values follow a trajectory over the time since the simulator started;
+    faults are drawn per frame with the given probabilities. All randomness
+    comes from a generator per connection, seeded with seed and the
+    connection's number (0 for the first), so a run with the same settings
+    sends the same values and faults on every connection, however their
+    frames interleave. Settings can be
+    changed while running (from the simulator's event loop, see
+    RectifierSimulator.call).
+    """
+
+    def __init__(self, name, rate=10.0, module_count=MODULE_COUNT, trajectory="session", faults=None, seed=0):
+        self.name = name
+        self.rate = rate  # Frames per second per connection
+        self.module_count = module_count
+        self.trajectory = trajectory
+        self.faults = dict(faults or {})  # Fault name -> probability per frame
+        self.seed = seed
+        self.started = None  # Event loop time values are measured from, set by start()
+        self.paused = False
+        self.server = None
+        self.port = None
+        self.tasks = set()  # Connections being served
+
+        # Counters
+        self.connections = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.faults_sent = dict.fromkeys(FAULTS, 0)
+
+    def stats(self):
+        return {
+            "connections": self.connections,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            **self.faults_sent,
+        }
+
+    def next_frame(self, t, rng):
+        """
+        Frame for time t with the send time stamped in.
+
+        :param t: Seconds since the simulator started.
+        :param rng: random.Random of the connection.
+        :return: bytearray of FRAME_SIZE bytes.
+        """
+        values = TRAJECTORIES[self.trajectory](t, self.module_count, rng)
+        frame = bytearray(build_frame(**values))
+        stamp_frame(frame, time.monotonic_ns())
+        return frame
+
+    def pick_fault(self, rng):
+        # At most one fault per frame, drawn in FAULTS order whatever order
+        # the faults were given in, so a seed always gives the same faults
+        for fault in FAULTS:
+            probability = self.faults.get(fault)
+            if probability and rng.random() < probability:
+                return fault
+        return None
+
+    async def serve(self, reader, writer):
+        # One client connection: send frames until it goes away or a disconnect fault
+        loop = asyncio.get_running_loop()
+        if self.started is None:
+            self.started = loop.time()
+        rng = random.Random(f"{self.seed}-{self.connections}")
+        self.connections += 1
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        next_send = loop.time()
+        try:
+            while True:
+                if self.paused:
+                    await asyncio.sleep(0.1)
+                    next_send = loop.time()
+                    continue
+                fault = self.pick_fault(rng)
+                if fault == "disconnect":
+                    self.faults_sent[fault] += 1
+                    break
+                frame = self.next_frame(loop.time() - self.started, rng)
+                if fault == "bad_crc":
+                    frame[CRC_OFFSET] ^= 0xFF
+                elif fault == "truncate":
+                    frame = frame[: rng.randrange(1, FRAME_SIZE)]
+                elif fault == "garbage":
+                    frame[:0] = bytes(rng.randrange(256) for _ in range(rng.randrange(1, FRAME_SIZE)))
+                if fault == "short_write":
+                    split = rng.randrange(1, FRAME_SIZE)
+                    writer.write(frame[:split])
+                    await writer.drain()
+                    await asyncio.sleep(0.002)
+                    writer.write(frame[split:])
+                else:
+                    writer.write(frame)
+                await writer.drain()
+                if fault is not None:
+                    self.faults_sent[fault] += 1
+                self.frames_sent += 1
+                self.bytes_sent += len(frame)
+
+                # Fixed schedule; after a stall, carry on from now instead of bursting
+                next_send += 1 / self.rate
+                delay = next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    next_send = loop.time()
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # Client went away or the simulator is stopping
+        finally:
+            self.tasks.discard(task)
+            writer.close()
+
+
+class RectifierSimulator:
+    """
+    Many SimulatedChargers served from one asyncio event loop on loopback.
+
+    Use it from async code (await start(), await stop()) or, from
+    synchronous benchmarks, as a context manager that runs the loop in a
+    background thread:
+
+        with RectifierSimulator.many(200, rate=10, faults={"bad_crc": 0.01}) as sim:
+            start_async_client(queue, sim.endpoints())
+            sim.call(sim.set, "charger-7", paused=True)
+    """
+
+    def __init__(self, chargers, host="127.0.0.1", base_port=0):
+        self.chargers = {charger.name: charger for charger in chargers}
+        self.host = host
+        self.base_port = base_port  # Consecutive ports from here, 0 picks free ones
+        self.loop = None
+        self.thread = None
+
+    @classmethod
+    def many(cls, count, seed=0, host="127.0.0.1", base_port=0, **settings):
+        """
+        count chargers named charger-0, charger-1, ... with the same settings.
+
+        :param seed: Base seed; charger i uses seed + i.
+        :param settings: SimulatedCharger keyword arguments.
+        """
+        chargers = [SimulatedCharger(f"charger-{i}", seed=seed + i, **settings) for i in range(count)]
+        return cls(chargers, host, base_port)
+
+    async def start(self):
+        started = asyncio.get_running_loop().time()
+        for index, charger in enumerate(self.chargers.values()):
+            charger.started = started
+            port = self.base_port + index if self.base_port else 0
+            charger.server = await asyncio.start_server(charger.serve, self.host, port)
+            charger.port = charger.server.sockets[0].getsockname()[1]
+        log.info("Simulating %d chargers on %s", len(self.chargers), self.host)
+
+    async def stop(self):
+        for charger in self.chargers.values():
+            charger.server.close()
+            for task in list(charger.tasks):
+                task.cancel()
+        for charger in self.chargers.values():
+            await charger.server.wait_closed()
+        await asyncio.sleep(0)  # Let cancelled connections close their transports
+
+    def endpoints(self):
+        """
+        Where to connect, in the format of async_client.parse_endpoint.
+
+        :return: List of (charger, host, port).
+        """
+        return [(charger.name, self.host, charger.port) for charger in self.chargers.values()]
+
+    def set(self, name, **settings):
+        # Change rate, faults, trajectory or paused of one charger (None: all of them)
+        for charger in self.chargers.values() if name is None else (self.chargers[name],):
+            for key, value in settings.items():
+                if not hasattr(charger, key):
+                    raise AttributeError(f"SimulatedCharger has no setting {key!r}")
+                setattr(charger, key, value)
+
+    def stats(self):
+        # Counters summed over all chargers
+        total = {}
+        for charger in self.chargers.values():
+            for key, value in charger.stats().items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run func in the simulator's event loop thread and wait for it.
+
+        :return: What func returned.
+        """
+        async def run():
+            return func(*args, **kwargs)
+
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result()
+
+    def __enter__(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start())
+            ready.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.stop())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="rectifier-simulator", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def _parse_faults(text):
+    # "bad_crc=0.01,disconnect=0.001" -> {"bad_crc": 0.01, "disconnect": 0.001}
+    faults = {}
+    for item in filter(None, text.split(",")):
+        name, _, probability = item.partition("=")
+        if name not in FAULTS:
+            raise ValueError(f"Unknown fault {name!r}, expected one of {', '.join(FAULTS)}")
+        faults[name] = float(probability)
+    return faults
+
+
+def _measure_client(endpoints, duration, results):
+    # Client process: poll every simulated charger and measure frame latency
+    from async_client import ChargerLink, poll_chargers
+
+    latencies = []
+    links = [ChargerLink(*endpoint) for endpoint in endpoints]
+
+    def on_frame(charger, frame):
+        latencies.append(time.monotonic_ns() - frame_send_time(frame))
+
+    async def main():
+        try:
+            await asyncio.wait_for(poll_chargers(links, on_frame, min_backoff=0.05), duration)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(main())
+    latencies.sort()
+    results.put(
+        {
+            "frames": len(latencies),
+            "connects": sum(link.connects for link in links),
+            "resyncs": sum(link.resyncs for link in links),
+            "slowest_charger": min(link.frames for link in links),
+            "latency_us": {
+                f"p{p:g}": latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] / 1000
+                for p in (50, 90, 99, 99.9)
+            }
+            if latencies
+            else None,
+        }
+    )
+
+
+# Serve simulated chargers, or measure the async client against them
+if __name__ == "__main__":
+    import argparse
+    import json
+    from multiprocessing import Process, Queue
+
+    parser = argparse.ArgumentParser(description="Simulate rectifier controllers on loopback")
+    parser.add_argument("--chargers", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=10.0, help="frames/s per charger")
+    parser.add_argument(
+        "--modules", type=int, default=MODULE_COUNT, help=f"modules with values per frame, 1 to {MODULE_COUNT}"
+    )
+    parser.add_argument("--trajectory", choices=sorted(TRAJECTORIES), default="session")
+    parser.add_argument(
+        "--faults",
+        type=_parse_faults,
+        default={},
+        metavar="NAME=P,...",
+        help=f"fault probabilities per frame, names: {', '.join(FAULTS)}",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=0, help="first of consecutive ports, 0 picks free ones")
+    parser.add_argument(
+        "--measure",
+        type=float,
+        metavar="SECONDS",
+        help="run the async client in another process for SECONDS and report throughput and latency",
+    )
+    args = parser.parse_args()
+    if not 1 <= args.modules <= MODULE_COUNT:
+        parser.error(f"--modules must be 1 to {MODULE_COUNT}, a frame holds {MODULE_COUNT} modules")
+
+    simulator = RectifierSimulator.many(
+        args.chargers,
+        seed=args.seed,
+        host=args.host,
+        base_port=args.base_port,
+        rate=args.rate,
+        module_count=args.modules,
+        trajectory=args.trajectory,
+        faults=args.faults,
+    )
+    with simulator:
+        endpoints = simulator.endpoints()
+        if args.measure is None:
+            print(" ".join(f"{name}={host}:{port}" for name, host, port in endpoints))
+            print("Serving, Ctrl-C to stop")
+            try:
+                while True:
+                    time.sleep(10)
+                    print(simulator.call(simulator.stats))
+            except KeyboardInterrupt:
+                pass
+        else:
+            results = Queue()
+            client = Process(target=_measure_client, args=(endpoints, args.measure, results))
+            client.start()
+            report = results.get()
+            client.join()
+            report["offered_frames_per_s"] = args.chargers * args.rate
+            report["received_frames_per_s"] = report["frames"] / args.measure
+            report["simulator"] = simulator.call(simulator.stats)
+            print(json.dumps(report, indent=2))
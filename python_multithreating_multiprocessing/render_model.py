@@ -0,0 +1,148 @@
+import queue as queue_module
+
+from frame_schema import LAYOUT
+
+_MISSING = object()  # Never equal to a received value
+
+
+def format_soc(soc):
+    return f"SOC: {soc:.2f} %" if soc is not None else "SOC: NA"
+
+
+def format_soh(soh):
+    return f"SOH: {soh if soh is not None else 'NA'}"
+
+
+def module_formatter(label, unit):
+    """
+    Formatter for one per-module display field, e.g. "Temp: 24.40 °C".
+
+    :return: Function formatting a value or None.
+    """
+
+    def format_value(value):
+        return f"{label}: {value:.2f} {unit}" if value is not None else f"{label}: NA"
+
+    return format_value
+
+
+# (display message key, formatter) for every module field the GUI shows
+MODULE_DISPLAY = [
+    (key, module_formatter(label, unit)) for key, _, label, unit in LAYOUT.display_fields()
+]
+
+
+def drain_latest(queue, on_message=None):
+    """
+    Empty the queue, keeping only the newest message per charger.
+
+    :param queue: Queue of display messages, optionally tagged with "charger".
+    :param on_message: Called with every drained message, e.g. to feed statistics.
+    :return: Tuple of (dict charger -> newest message, messages drained).
+    """
+    latest = {}
+    drained = 0
+    while True:
+        try:
+            data = queue.get_nowait()
+        except queue_module.Empty:
+            break
+        drained += 1
+        if on_message is not None:
+            on_message(data)
+        charger = data.get("charger")
+        latest.pop(charger, None)  # Keep arrival order of the newest messages
+        latest[charger] = data
+    return latest, drained
+
+
+class RenderModel:
+    """
+    Headless part of the display update: what text each label should show.
+
+    Labels are numbered SOC, SOH, then the MODULE_DISPLAY fields (temp,
+    current, voltage) for every module.
+    The model remembers the last value and text of each label, formats only
+    values that changed and reports only texts that changed, so the widget
+    layer touches as few labels as possible. Counters report how much work
+    was avoided.
+    """
+
+    def __init__(self, module_count):
+        self.module_count = module_count
+        self.label_count = 2 + len(MODULE_DISPLAY) * module_count
+        self.values = [_MISSING] * self.label_count
+        self.texts = [None] * self.label_count
+
+        # Counters
+        self.frames_received = 0
+        self.frames_conflated = 0  # Drained but superseded or for another charger
+        self.frames_rendered = 0
+        self.widget_updates = 0
+        self.widget_updates_skipped = 0
+
+    def stats(self):
+        return {
+            "frames_received": self.frames_received,
+            "frames_conflated": self.frames_conflated,
+            "frames_rendered": self.frames_rendered,
+            "widget_updates": self.widget_updates,
+            "widget_updates_skipped": self.widget_updates_skipped,
+        }
+
+    def drain(self, queue, charger=None, on_message=None):
+        """
+        Pull everything queued and pick the snapshot to render.
+
+        :param queue: Queue of display messages.
+        :param charger: Charger to show, None shows whichever arrived last.
+        :param on_message: Called with every drained message, conflated or not.
+        :return: Newest message for the charger, or None if nothing new.
+        """
+        latest, drained = drain_latest(queue, on_message)
+        self.frames_received += drained
+        if charger is not None:
+            data = latest.get(charger)
+        elif latest:
+            data = latest[next(reversed(latest))]
+        else:
+            data = None
+        self.frames_conflated += drained - (data is not None)
+        return data
+
+    def changed_labels(self, data):
+        """
+        Labels whose text differs from what is on screen.
+
+        :param data: Display message with soc, soh and the MODULE_DISPLAY keys.
+        :return: List of (label index, new text).
+        """
+        self.frames_rendered += 1
+        values = self.values
+        texts = self.texts
+        changed = []
+
+        def update(index, value, formatter):
+            if value == values[index]:
+                self.widget_updates_skipped += 1
+                return
+            values[index] = value
+            text = formatter(value)
+            if text == texts[index]:
+                self.widget_updates_skipped += 1
+                return
+            texts[index] = text
+            changed.append((index, text))
+
+        update(0, data["soc"], format_soc)
+        update(1, data["soh"], format_soh)
+
+        index = 2
+        columns = [(data[key][: self.module_count], formatter) for key, formatter in MODULE_DISPLAY]
+        for module in range(min(len(column) for column, _ in columns)):
+            for column, formatter in columns:
+                update(index, column[module], formatter)
+                index += 1
+
+        self.widget_updates += len(changed)
+        return changed
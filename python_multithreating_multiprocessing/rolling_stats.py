@@ -0,0 +1,231 @@
+import math
+import time
+from collections import deque
+
+from frame_schema import MODULE_COUNT
+
+# Window name -> span in nanoseconds
+DEFAULT_WINDOWS = {"1s": 1_000_000_000, "1m": 60_000_000_000, "1h": 3_600_000_000_000}
+
+
+class RollingWindow:
+    """
+    Min, max, mean and standard deviation over a sliding time window.
+
+    Every sample is added and expired exactly once, so updates are O(1)
+    amortized and queries are O(1). Min and max come from monotonic deques
+    (the front is always the extreme of the window); mean and variance come
+    from running sums of the samples shifted by the first value seen, which
+    keeps the sum of squares small for readings like 700 V that barely move.
+    """
+
+    __slots__ = ("span_ns", "samples", "mins", "maxs", "shift", "total", "total_sq")
+
+    def __init__(self, span_ns):
+        self.span_ns = span_ns
+        self.samples = deque()  # (timestamp_ns, value) in arrival order
+        self.mins = deque()  # (timestamp_ns, value), values increasing
+        self.maxs = deque()  # (timestamp_ns, value), values decreasing
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, timestamp_ns, value):
+        if self.shift is None:
+            self.shift = value
+        self.samples.append((timestamp_ns, value))
+        shifted = value - self.shift
+        self.total += shifted
+        self.total_sq += shifted * shifted
+
+        mins = self.mins
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+        mins.append((timestamp_ns, value))
+        maxs = self.maxs
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+        maxs.append((timestamp_ns, value))
+
+        self.expire(timestamp_ns)
+
+    def expire(self, now_ns):
+        """Drop samples older than the window span before now_ns."""
+        cutoff = now_ns - self.span_ns
+        samples = self.samples
+        if not samples or samples[0][0] > cutoff:
+            return
+        shift = self.shift
+        while samples and samples[0][0] <= cutoff:
+            shifted = samples.popleft()[1] - shift
+            self.total -= shifted
+            self.total_sq -= shifted * shifted
+        if not samples:
+            # Start over, which also drops accumulated rounding error
+            self.shift = None
+            self.total = self.total_sq = 0.0
+        while self.mins and self.mins[0][0] <= cutoff:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= cutoff:
+            self.maxs.popleft()
+
+    def stats(self):
+        """
+        Current window statistics.
+
+        :return: Dict with count, min, max, mean and stddev, or None if empty.
+        """
+        count = len(self.samples)
+        if not count:
+            return None
+        mean = self.total / count
+        variance = max(self.total_sq / count - mean * mean, 0.0)
+        return {
+            "count": count,
+            "min": self.mins[0][1],
+            "max": self.maxs[0][1],
+            "mean": mean + self.shift,
+            "stddev": math.sqrt(variance),
+        }
+
+
+class RollingStats:
+    """
+    Rolling windows for many named series, e.g. "temp_0" or "charging_current".
+
+    Series are created on first use and every sample goes into each window.
+    Timestamps may come from any clock as long as it is the same one for
+    update() and for the now_ns passed to get().
+    """
+
+    def __init__(self, windows=None):
+        self.windows = dict(DEFAULT_WINDOWS if windows is None else windows)
+        self.series = {}  # name -> {window name: RollingWindow}
+        self.samples = 0
+
+    def update(self, values, timestamp_ns=None):
+        """
+        Add one sample per series.
+
+        :param values: Dict of series name -> value; None values are skipped.
+        :param timestamp_ns: Sample time, defaults to time.monotonic_ns().
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        series = self.series
+        for name, value in values.items():
+            if value is None:
+                continue
+            windows = series.get(name)
+            if windows is None:
+                windows = series[name] = [RollingWindow(span) for span in self.windows.values()]
+            for window in windows:
+                window.add(timestamp_ns, value)
+        self.samples += 1
+
+    def get(self, name, window, now_ns=None):
+        """
+        Statistics of one series over one window.
+
+        :param name: Series name.
+        :param window: Window name, e.g. "1m".
+        :param now_ns: Expire samples older than the window before this time
+            first; without it the window ends at the series' last sample.
+        :return: Dict as returned by RollingWindow.stats(), or None.
+        """
+        windows = self.series.get(name)
+        if windows is None:
+            return None
+        rolling = windows[list(self.windows).index(window)]
+        if now_ns is not None:
+            rolling.expire(now_ns)
+        return rolling.stats()
+
+    def snapshot(self, window, now_ns=None):
+        """
+        Statistics of every series over one window.
+
+        :return: Dict of series name -> stats dict (or None when empty).
+        """
+        return {name: self.get(name, window, now_ns) for name in self.series}
+
+
+def record_values(frame):
+    """
+    Series values of an SMFrame record, temperatures in °C.
+
+    :return: Dict of series name -> value for RollingStats.update().
+    """
+    values = {"charging_current": frame.charging_current}
+    temps = frame.module_temperatures
+    currents = frame.module_currents
+    voltages = frame.module_voltages
+    for i in range(MODULE_COUNT):
+        values[f"temp_{i}"] = temps[i]
+        values[f"current_{i}"] = currents[i]
+        values[f"voltage_{i}"] = voltages[i]
+    return values
+
+
+def payload_values(payload):
+    """
+    Series values of a dict returned by unpack_sm_payload, temperatures in °C.
+
+    :return: Dict of series name -> value for RollingStats.update().
+    """
+    values = {"charging_current": payload["charging_related_info"]["charging_current"]}
+    for i, module in enumerate(payload["power_modules"]):
+        values[f"temp_{i}"] = module["ambient_temperature"] / 10.0
+        values[f"current_{i}"] = module["current"]
+        values[f"voltage_{i}"] = module["voltage"]
+    return values
+
+
+def display_values(data):
+    """
+    Series values of a display message (no charging current).
+
+    :return: Dict of series name -> value for RollingStats.update().
+    """
+    values = {}
+    for i, (temp, current, voltage) in enumerate(zip(data["temp"], data["current"], data["voltage"])):
+        values[f"temp_{i}"] = temp
+        values[f"current_{i}"] = current
+        values[f"voltage_{i}"] = voltage
+    return values
+
+
+def format_stats(prefix, stats):
+    # One compact line: min/mean/max and standard deviation
+    if stats is None:
+        return f"{prefix} NA"
+    return f"{prefix} {stats['min']:.1f}/{stats['mean']:.1f}/{stats['max']:.1f} σ{stats['stddev']:.2f}"
+
+
+# Feed a few hours of synthetic frames at 10 Hz and time updates and queries
+if __name__ == "__main__":
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import FrameGenerator
+
+    SAMPLES = 100000
+    INTERVAL_NS = 100_000_000
+
+    values = [record_values(decode_sm_frame(frame)) for frame in FrameGenerator().frames(1000)]
+    rolling = RollingStats()
+
+    start = time.perf_counter()
+    for i in range(SAMPLES):
+        rolling.update(values[i % len(values)], i * INTERVAL_NS)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{SAMPLES} frames x {len(rolling.series)} series x {len(rolling.windows)} windows: "
+        f"{elapsed / SAMPLES * 1e6:.1f} us/frame"
+    )
+
+    start = time.perf_counter()
+    for window in rolling.windows:
+        snapshot = rolling.snapshot(window)
+    elapsed = time.perf_counter() - start
+    print(f"Queried every series and window in {elapsed * 1e6:.0f} us")
+    for window in rolling.windows:
+        print(window, format_stats("temp_0", rolling.get("temp_0", window)))
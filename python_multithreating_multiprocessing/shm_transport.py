@@ -0,0 +1,203 @@
+import math
+import queue
+import struct
+import time
+from multiprocessing import shared_memory
+
+from sm_frame import MODULE_COUNT
+
+# Ring header: producer and consumer counters on separate cache lines
+_HEAD = struct.Struct("<Q")  # Messages written, offset 0
+_TAIL = struct.Struct("<Q")  # Messages read, offset 64
+_HEAD_OFFSET = 0
+_TAIL_OFFSET = 64
+_SLOTS_OFFSET = 128
+
+# One telemetry record: seq, timestamp_ns, charger, soc, soh, temp, current, voltage
+CHARGER_SIZE = 32  # Bytes of UTF-8 charger name, NUL padded
+RECORD_STRUCT = struct.Struct(f"<QQ{CHARGER_SIZE}sdd{3 * MODULE_COUNT}d")
+
+
+def _number(value):
+    # Fixed numeric layout: None and non-numeric values travel as NaN
+    return value if isinstance(value, (int, float)) else math.nan
+
+
+def _value(number):
+    return None if number != number else number  # NaN -> None
+
+
+def _modules(values):
+    values = [_number(v) for v in values[:MODULE_COUNT]]
+    return values + [math.nan] * (MODULE_COUNT - len(values))
+
+
+def pack_record(buf, offset, seq, data):
+    """
+    Pack one display message as a RECORD_STRUCT.
+
+    :param buf: Writable buffer, e.g. shared memory or a bytearray.
+    :param offset: Byte offset of the record in buf.
+    :param seq: Sequence number stored with the record.
+    :param data: Dict with soc, soh, temp, current, voltage and optionally
+        charger and timestamp_ns.
+    :raises ValueError: The charger name is longer than CHARGER_SIZE bytes
+        as UTF-8; struct would cut it, merging chargers with a common prefix.
+    """
+    charger = data.get("charger")
+    charger = b"" if charger is None else str(charger).encode()
+    if len(charger) > CHARGER_SIZE:
+        raise ValueError(f"Charger name {data['charger']!r} is longer than {CHARGER_SIZE} bytes as UTF-8")
+    timestamp_ns = data.get("timestamp_ns", 0)
+    try:
+        RECORD_STRUCT.pack_into(
+            buf,
+            offset,
+            seq,
+            timestamp_ns,
+            charger,
+            data["soc"],
+            data["soh"],
+            *data["temp"],
+            *data["current"],
+            *data["voltage"],
+        )
+    except struct.error:
+        # Missing modules or None/non-numeric values, pad them with NaN
+        RECORD_STRUCT.pack_into(
+            buf,
+            offset,
+            seq,
+            timestamp_ns,
+            charger,
+            _number(data["soc"]),
+            _number(data["soh"]),
+            *_modules(data["temp"]),
+            *_modules(data["current"]),
+            *_modules(data["voltage"]),
+        )
+
+
+def unpack_record(buf, offset=0):
+    """
+    Unpack one RECORD_STRUCT.
+
+    :return: Dict like the one given to pack_record, plus its seq number.
+    """
+    record = RECORD_STRUCT.unpack_from(buf, offset)
+    modules = record[5:]
+    charger = record[2].rstrip(b"\0").decode(errors="replace")  # Never raise in the display
+    return {
+        "seq": record[0],
+        "timestamp_ns": record[1],
+        "charger": charger or None,
+        "soc": _value(record[3]),
+        "soh": _value(record[4]),
+        "temp": [None if v != v else v for v in modules[:MODULE_COUNT]],
+        "current": [
+            None if v != v else v for v in modules[MODULE_COUNT : 2 * MODULE_COUNT]
+        ],
+        "voltage": [None if v != v else v for v in modules[2 * MODULE_COUNT :]],
+    }
+
+
+class SharedMemoryRing:
+    """
+    Single-producer/single-consumer ring of telemetry records in shared memory.
+
+    Implements the part of the multiprocessing.Queue interface used by
+    start_client, data_provider and PowerModuleDisplay (put, get, get_nowait,
+    empty, qsize), so it can be passed wherever that queue is. Messages are
+    packed into fixed-size slots instead of being pickled, and there is no
+    feeder thread: put() writes the slot and then publishes the new head.
+    Only one process may put and only one process may get.
+    """
+
+    def __init__(self, capacity=1024, name=None):
+        self.capacity = capacity
+        size = _SLOTS_OFFSET + capacity * RECORD_STRUCT.size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.buf = self.shm.buf
+            _HEAD.pack_into(self.buf, _HEAD_OFFSET, 0)
+            _TAIL.pack_into(self.buf, _TAIL_OFFSET, 0)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.buf = self.shm.buf
+            self.owner = False
+
+    # Child processes attach to the same block by name
+    def __getstate__(self):
+        return self.shm.name, self.capacity
+
+    def __setstate__(self, state):
+        name, capacity = state
+        self.__init__(capacity, name=name)
+
+    def _head(self):
+        return _HEAD.unpack_from(self.buf, _HEAD_OFFSET)[0]
+
+    def _tail(self):
+        return _TAIL.unpack_from(self.buf, _TAIL_OFFSET)[0]
+
+    def qsize(self):
+        return self._head() - self._tail()
+
+    def empty(self):
+        return self._head() == self._tail()
+
+    def full(self):
+        return self.qsize() >= self.capacity
+
+    def put(self, data, block=True, timeout=None):
+        """
+        Write one display message into the next free slot.
+
+        :param data: Dict with soc, soh, temp, current, voltage and optionally
+            charger and timestamp_ns.
+        :param block: Wait for a free slot when the ring is full.
+        :param timeout: Maximum wait in seconds, None waits forever.
+        """
+        head = self._head()
+        if head - self._tail() >= self.capacity:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while head - self._tail() >= self.capacity:
+                if not block or (deadline is not None and time.monotonic() > deadline):
+                    raise queue.Full
+                time.sleep(0.0005)
+
+        offset = _SLOTS_OFFSET + (head % self.capacity) * RECORD_STRUCT.size
+        pack_record(self.buf, offset, head + 1, data)
+        _HEAD.pack_into(self.buf, _HEAD_OFFSET, head + 1)  # Publish
+
+    def get_nowait(self):
+        """
+        Read the oldest message.
+
+        :return: Dict like the one given to put, plus its seq number.
+        """
+        tail = self._tail()
+        if tail == self._head():
+            raise queue.Empty
+
+        data = unpack_record(self.buf, _SLOTS_OFFSET + (tail % self.capacity) * RECORD_STRUCT.size)
+        _TAIL.pack_into(self.buf, _TAIL_OFFSET, tail + 1)  # Free the slot
+        return data
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                if not block or (deadline is not None and time.monotonic() > deadline):
+                    raise
+                time.sleep(0.0005)
+
+    def close(self):
+        # Drop the exported buffer before closing the mapping
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
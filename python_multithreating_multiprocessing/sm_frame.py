@@ -0,0 +1,151 @@
+from crc16 import crc16_modbus
+from frame_schema import CRC_OFFSET, FRAME_SIZE, LAYOUT, MODULE_COUNT
+
+# Precompiled layout of every numeric field, read straight from the buffer.
+# Raw byte fields (header, reserved, padding, ...) are skipped with pad bytes
+# and only sliced out of the buffer when somebody asks for them. The format
+# is compiled from the tables in frame_schema.
+SM_FRAME_STRUCT = LAYOUT.struct
+
+
+class SMFrame:
+    """
+    Compact record for one decoded rectifier frame.
+
+    Numeric fields are unpacked in a single struct call; raw byte fields and
+    hex strings are produced from the underlying buffer only on request.
+    One property per schema field (soc, charging_current, module_currents,
+    header, ...) is generated from frame_schema when this module is imported.
+    The record keeps a memoryview of the frame, so copy the frame first
+    (bytes(frame)) if the record has to outlive a reused receive buffer.
+    """
+
+    __slots__ = ("raw", "values", "crc_ok")
+
+    def __init__(self, raw, values, crc_ok):
+        self.raw = raw  # memoryview of the 256 byte frame
+        self.values = values  # tuple unpacked with SM_FRAME_STRUCT
+        self.crc_ok = crc_ok
+
+    def __repr__(self):
+        return (
+            f"SMFrame(soc={self.soc}, soh={self.soh}, "
+            f"charging_state={self.charging_state}, crc_ok={self.crc_ok})"
+        )
+
+    def field_hex(self, start, end):
+        """
+        Hex string of a little-endian field, MSB to LSB.
+
+        :param start: First byte offset of the field in the frame.
+        :param end: Offset one past the last byte of the field.
+        :return: Hex string, e.g. "00f4" for bytes f4 00.
+        """
+        return bytes(self.raw[start:end])[::-1].hex()
+
+    def to_dict(self):
+        """
+        Build the nested dict returned by unpack_sm_payload.
+
+        :return: Dict with the same keys and values as unpack_sm_payload.
+        """
+        raw = bytes(self.raw)
+        span = LAYOUT.span
+
+        def field_hex(name, module=None):
+            field = span(name, module)
+            return raw[field][::-1].hex()
+
+        temperatures = self.values[LAYOUT.module_slice("temperature")]  # 0.1 °C
+        currents = self.module_currents
+        voltages = self.module_voltages
+        power_modules = []
+        for i in range(MODULE_COUNT):
+            power_modules.append(
+                {
+                    "module_status_flag_1": raw[span("status_flag_1", i)],
+                    "module_status_flag_2": raw[span("status_flag_2", i)],
+                    "ambient_temperature_hex": field_hex("temperature", i),
+                    "ambient_temperature": temperatures[i],
+                    "current_hex": field_hex("current", i),
+                    "current": currents[i],
+                    "voltage_hex": field_hex("voltage", i),
+                    "voltage": voltages[i],
+                    "reserved": raw[span("reserved", i)],
+                }
+            )
+
+        charging_related_info = {
+            "battery_SOC": raw[span("soc")],
+            "battery_SOH": raw[span("soh")],
+            "reserved_1": raw[span("reserved_1")],
+            "charging_state_count": raw[span("charging_state_count")],
+            "charging_state": self.charging_state,
+            "contactor_status": format(self.contactor_status, "04b"),
+            "demand_voltage_hex": field_hex("demand_voltage"),
+            "demand_voltage": self.demand_voltage,
+            "demand_current_hex": field_hex("demand_current"),
+            "demand_current": self.demand_current,
+            "positive_gun_temperature": raw[span("positive_gun_temperature")],
+            "negative_gun_temperature": raw[span("negative_gun_temperature")],
+            "reserved_2": raw[span("reserved_2")],
+            "charging_current_hex": field_hex("charging_current"),
+            "charging_current": self.charging_current,
+            "charging_voltage_hex": field_hex("charging_voltage"),
+            "charging_voltage": self.charging_voltage,
+            "charging_time_minute": raw[span("charging_time_minute")],
+            "charging_time_hour": raw[span("charging_time_hour")],
+            "reserved_3": raw[span("reserved_3")],
+            "BST_reason": raw[span("BST_reason")],
+            "CST_reason": raw[span("CST_reason")],
+            "energy_data": raw[span("energy_data")],
+            "reserved_high_nibble": self.reserved_high_nibble,
+            "charge_enable_bit": self.charge_enable_bit,
+            "reserved_low_bits": self.reserved_low_bits,
+        }
+
+        return {
+            "header": raw[span("header")],
+            "PMActiveBit": raw[span("pm_active_bit")],
+            "reserved_PMActiveBit": raw[span("reserved_pm_active_bit")],
+            "power_modules": power_modules,
+            "charging_related_info": charging_related_info,
+            "padding": raw[span("padding")],
+            "CRC1": raw[CRC_OFFSET : CRC_OFFSET + 1],
+            "CRC2": raw[CRC_OFFSET + 1 : CRC_OFFSET + 2],
+        }
+
+
+# Field accessors generated from the schema, as fast as hand-written properties
+for _name, _property in LAYOUT.properties().items():
+    setattr(SMFrame, _name, _property)
+del _name, _property
+
+
+def frame_crc_ok(raw):
+    """
+    Check the CRC-16/MODBUS of one frame, stored high byte first.
+
+    :param raw: Bytes-like object holding exactly one frame.
+    :return: True if the CRC matches.
+    """
+    return crc16_modbus(raw[:CRC_OFFSET]) == (raw[CRC_OFFSET] << 8 | raw[CRC_OFFSET + 1])
+
+
+def decode_sm_frame(data, check_crc=True):
+    """
+    Decode one 256 byte frame without copying it.
+
+    :param data: Bytes-like object holding exactly one frame.
+    :param check_crc: Verify the CRC and store the result in crc_ok.
+    :return: SMFrame record, or None if the length is wrong.
+    """
+    raw = memoryview(data)
+    if len(raw) != FRAME_SIZE:
+        return None
+
+    crc_ok = None
+    if check_crc:
+        crc_ok = frame_crc_ok(raw)
+
+    return SMFrame(raw, SM_FRAME_STRUCT.unpack_from(raw), crc_ok)
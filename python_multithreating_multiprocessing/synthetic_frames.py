@@ -0,0 +1,132 @@
+import math
+import random
+
+from crc16 import crc16_modbus
+from frame_schema import CRC_OFFSET, LAYOUT, MODULE_COUNT
+
+# Header of the captured sample frame: 01 01 00 00 "SunMob Tech..." 00 00
+SAMPLE_HEADER = b"\x01\x01\x00\x00SunMob Tech...\x00\x00"
+
+
+def build_frame(
+    soc=50,
+    soh=100,
+    temps=(),
+    currents=(),
+    voltages=(),
+    charging_state=0,
+    contactor_status=0,
+    charge_enable=0,
+    demand_voltage=0.0,
+    demand_current=0.0,
+    charging_current=0.0,
+    charging_voltage=0.0,
+    charging_time=(0, 0),
+    header=SAMPLE_HEADER,
+    active_modules=None,
+):
+    """
+    Build a valid 256 byte frame with a correct CRC.
+
+    Module values are given in display units (°C, A, V) and scaled by 10 as
+    the controller does; missing modules are sent as zero.
+
+    :param charging_time: (hours, minutes).
+    :param active_modules: PMActiveBit value, defaults to one bit per module given.
+    :return: Frame as bytes.
+    """
+    modules = []
+    for i in range(MODULE_COUNT):
+        modules.append(
+            {
+                "temperature": temps[i] if i < len(temps) else 0,
+                "current": currents[i] if i < len(currents) else 0,
+                "voltage": voltages[i] if i < len(voltages) else 0,
+            }
+        )
+
+    if active_modules is None:
+        active_modules = (1 << len(temps)) - 1
+    hours, minutes = charging_time
+    values = {
+        "pm_active_bit": active_modules & 0xFF,
+        "soc": soc,
+        "soh": soh,
+        "charge_enable_bit": charge_enable,
+        "charging_state": charging_state,
+        "contactor_status": contactor_status,
+        "demand_voltage": demand_voltage,
+        "demand_current": demand_current,
+        "charging_current": charging_current,
+        "charging_voltage": charging_voltage,
+        "charging_time_minute": minutes,
+        "charging_time_hour": hours,
+    }
+    frame = LAYOUT.pack(values, modules)  # Scaled by the schema divisors
+    frame[: len(header)] = header
+
+    crc = crc16_modbus(memoryview(frame)[:CRC_OFFSET])
+    frame[CRC_OFFSET : CRC_OFFSET + 2] = crc.to_bytes(2, byteorder="big")
+    return bytes(frame)
+
+
+class FrameGenerator:
+    """Reproducible stream of valid frames with randomized module values."""
+
+    def __init__(self, seed=0, module_count=MODULE_COUNT):
+        self.rng = random.Random(seed)
+        self.module_count = module_count
+
+    def random_frame(self):
+        rng = self.rng
+        count = self.module_count
+        return build_frame(
+            soc=rng.randrange(101),
+            soh=rng.randrange(80, 101),
+            temps=[round(rng.uniform(20.0, 70.0), 1) for _ in range(count)],
+            currents=[round(rng.uniform(0.0, 100.0), 1) for _ in range(count)],
+            voltages=[round(rng.uniform(300.0, 1000.0), 1) for _ in range(count)],
+            charging_state=rng.randrange(16),
+            contactor_status=rng.randrange(16),
+            charge_enable=rng.randrange(2),
+            demand_voltage=round(rng.uniform(300.0, 1000.0), 1),
+            demand_current=round(rng.uniform(0.0, 250.0), 1),
+            charging_current=round(rng.uniform(0.0, 250.0), 1),
+            charging_voltage=round(rng.uniform(300.0, 1000.0), 1),
+            charging_time=(rng.randrange(24), rng.randrange(60)),
+        )
+
+    def frames(self, count):
+        """
+        Generate count frames.
+
+        :return: List of frames as bytes.
+        """
+        return [self.random_frame() for _ in range(count)]
+
+
+def drifting_frames(count, rate=10.0):
+    """
+    Frames of a steady charging session: values drift slowly in 0.1 steps,
+    so most fields repeat from one frame to the next.
+
+    :param count: Number of frames.
+    :param rate: Frames per second the drift is spread over.
+    :return: List of frames as bytes.
+    """
+    frames = []
+    for i in range(count):
+        t = i / rate
+        frames.append(
+            build_frame(
+                soc=min(100, int(t / 10)),
+                temps=[round(40 + 5 * math.sin(t / 60 + m), 1) for m in range(MODULE_COUNT)],
+                currents=[round(60 + 2 * math.sin(t / 30 + m), 1) for m in range(MODULE_COUNT)],
+                voltages=[650.0] * MODULE_COUNT,
+                charging_state=2,
+                contactor_status=3,
+                charging_current=round(400 + 10 * math.sin(t / 30), 1),
+                charging_voltage=650.0,
+            )
+        )
+    return frames
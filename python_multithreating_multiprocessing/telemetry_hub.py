@@ -0,0 +1,390 @@
+import asyncio
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from frame_schema import MODULE_COUNT
+from shm_transport import RECORD_STRUCT, pack_record, unpack_record
+
+log = logging.getLogger("rectifier.hub")
+
+# Sent once to every subscriber: magic, record size and modules per record,
+# so a subscriber built for another layout fails at connect, not mid-stream
+HELLO = struct.Struct("<4sHH")
+MAGIC = b"RTLM"
+RECORD_SIZE = RECORD_STRUCT.size
+# Last record of a clean close: seq 0 (records start at 1), then the last seq published
+END = struct.Struct("<QQ")
+
+
+def _end_record(last_seq):
+    record = bytearray(RECORD_SIZE)
+    END.pack_into(record, 0, 0, last_seq)
+    return record
+
+
+class _Subscriber(asyncio.Protocol):
+    # One connected subscriber; the transport's write buffer is its queue
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.transport = None
+        self.closed = asyncio.get_running_loop().create_future()
+        self.sent = 0
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(HELLO.pack(MAGIC, RECORD_SIZE, MODULE_COUNT))
+        self.hub.subscribers.add(self)
+        self.hub.connections += 1
+        log.info("Subscriber connected, %d now", len(self.hub.subscribers))
+
+    def connection_lost(self, exc):
+        self.hub.subscribers.discard(self)
+        self.closed.set_result(None)
+        log.info("Subscriber left after %d records, %d dropped", self.sent, self.dropped)
+
+    def data_received(self, data):
+        pass  # Subscribers only read
+
+
+class TelemetryHub:
+    """
+    Publishes display messages to any number of local subscribers.
+
+    Producers call put(data) as on a queue, so the hub can be passed to
+    start_client or start_async_client. Every message is encoded once as a
+    fixed-size RECORD_STRUCT (the SharedMemoryRing record, 232 bytes with
+    7 modules) and the same bytes are written to every subscriber
+    connected to the Unix domain socket at path. The hub's event loop runs
+    in a background thread; put() only appends to a deque and wakes the
+    loop if it is idle, so a burst of messages is fanned out as one write
+    per subscriber.
+
+    Each subscriber's buffer is the asyncio transport's write buffer,
+    capped at max_buffer bytes: records for a subscriber that is that far
+    behind are dropped for it alone (it sees a gap in seq), and the others
+    carry on. The optional queue gets every message as well, e.g. the
+    display's queue, so the hub can sit in front of it. close() ends every
+    stream with an END record carrying the last seq, so subscribers can
+    count the records dropped at the end of the stream too.
+    """
+
+    def __init__(self, path, queue=None, max_buffer=1024 * RECORD_SIZE):
+        """
+        :param path: Unix domain socket path; a stale socket file is replaced.
+        :param queue: Queue that also gets every message, or None.
+        :param max_buffer: Bytes buffered per subscriber before dropping.
+        """
+        self.path = path
+        self.queue = queue
+        self.max_buffer = max_buffer
+        self.subscribers = set()
+        self.pending = deque()  # Encoded records not fanned out yet
+        self.scheduled = False
+        self.seq = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+        # Counters
+        self.published = 0
+        self.connections = 0
+        self.writes = 0
+        self.dropped = 0
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "subscribers": len(self.subscribers),
+            "connections": self.connections,
+            "writes": self.writes,
+            "dropped": self.dropped,
+        }
+
+    def start(self):
+        """
+        Listen on path and start the fan-out thread.
+
+        :return: self.
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.server = self.loop.run_until_complete(
+                self.loop.create_unix_server(lambda: _Subscriber(self), self.path)
+            )
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="telemetry-hub", daemon=True)
+        self.thread.start()
+        ready.wait()
+        log.info("Publishing on %s", self.path)
+        return self
+
+    def put(self, data, block=True, timeout=None):
+        if self.queue is not None:
+            self.queue.put(data, block, timeout)
+        self.seq += 1
+        record = bytearray(RECORD_SIZE)
+        pack_record(record, 0, self.seq, data)
+        self.pending.append(record)
+        self.published += 1
+        if not self.scheduled:
+            self.scheduled = True
+            self.loop.call_soon_threadsafe(self._fan_out)
+
+    def _fan_out(self):
+        # Event loop thread: one write of everything pending per subscriber
+        self.scheduled = False  # Before draining, so a put from now on schedules again
+        pending = self.pending
+        count = len(pending)
+        if not count:
+            return
+        chunk = b"".join([pending.popleft() for _ in range(count)])
+        for subscriber in self.subscribers:
+            transport = subscriber.transport
+            if transport.get_write_buffer_size() + len(chunk) > self.max_buffer:
+                subscriber.dropped += count  # Too far behind, skip it and not the others
+                self.dropped += count
+                continue
+            transport.write(chunk)
+            subscriber.sent += count
+            self.writes += 1
+
+    def close(self, timeout=5.0):
+        """
+        Send what is pending and disconnect every subscriber.
+
+        :param timeout: Seconds subscribers get to read their buffers
+            before they are cut off.
+        """
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            self._fan_out()
+            self.server.close()
+            subscribers = list(self.subscribers)
+            end = _end_record(self.seq)
+            for subscriber in subscribers:
+                subscriber.transport.write(end)  # Past max_buffer, it is the last write
+                subscriber.transport.close()  # Closes once the buffer is written
+            if subscribers:
+                await asyncio.wait([subscriber.closed for subscriber in subscribers], timeout=timeout)
+            for subscriber in list(self.subscribers):
+                subscriber.transport.abort()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class TelemetrySubscriber:
+    """
+    Blocking client of a TelemetryHub; iterate over it for display messages.
+
+    Records are read in large chunks and decoded one by one. missed counts
+    records the hub dropped for this subscriber, from the gaps in seq and,
+    after a clean close, from the last seq in the END record (end_seq).
+    end_seq stays None when the hub went away without one, e.g. when it
+    cut off this subscriber for not reading; records dropped after the
+    last one received are then not in missed.
+    """
+
+    def __init__(self, path, timeout=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        hello = self._read_exactly(HELLO.size)
+        magic, record_size, module_count = HELLO.unpack(hello)
+        if magic != MAGIC or record_size != RECORD_SIZE or module_count != MODULE_COUNT:
+            self.sock.close()
+            raise ValueError(
+                f"Hub sends {record_size} byte records with {module_count} modules, "
+                f"expected {RECORD_SIZE} with {MODULE_COUNT}"
+            )
+        self.received = 0
+        self.missed = 0
+        self.last_seq = None
+        self.end_seq = None
+
+    def _read_exactly(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Hub closed the connection")
+            data += chunk
+        return data
+
+    def __iter__(self):
+        buffer = bytearray(256 * RECORD_SIZE)
+        view = memoryview(buffer)
+        filled = 0
+        while True:
+            n = self.sock.recv_into(view[filled:])
+            if not n:
+                return  # Hub closed
+            filled += n
+            end = filled - filled % RECORD_SIZE
+            for offset in range(0, end, RECORD_SIZE):
+                data = unpack_record(buffer, offset)
+                seq = data["seq"]
+                if seq == 0:
+                    self.end_seq = END.unpack_from(buffer, offset)[1]
+                    self.missed += self.end_seq - (self.last_seq or 0)
+                    return
+                if self.last_seq is not None and seq != self.last_seq + 1:
+                    self.missed += seq - self.last_seq - 1
+                self.last_seq = seq
+                self.received += 1
+                yield data
+            # Keep a partial record for the next read
+            buffer[: filled - end] = buffer[end:filled]
+            filled -= end
+
+    def close(self):
+        self.sock.close()
+
+
+def run_with_hub(path, target, queue, *args):
+    """
+    Process target that publishes what target puts on queue through a hub.
+
+    :param path: Unix domain socket path for subscribers.
+    :param target: Producer function taking the queue first, e.g. start_client.
+    :param queue: Queue that still gets every message, e.g. the display's.
+    :param args: Further arguments for target.
+    """
+    hub = TelemetryHub(path, queue).start()
+    try:
+        target(hub, *args)
+    finally:
+        hub.close()
+
+
+def subscribe_to_queue(queue, path):
+    """
+    Process target that puts every message from a hub on a queue.
+
+    Lets a second PowerModuleDisplay follow the stream of the first one's
+    data process without its own connection to the rectifier.
+
+    :param queue: Queue read by the display.
+    :param path: Hub socket path.
+    """
+    subscriber = TelemetrySubscriber(path)
+    try:
+        for data in subscriber:
+            queue.put(data)
+    finally:
+        subscriber.close()
+
+
+def _benchmark_subscriber(path, delay, results):
+    # Count and decode every record; delay per record simulates a slow consumer
+    subscriber = TelemetrySubscriber(path)
+    start = None
+    for _ in subscriber:
+        if start is None:
+            start = time.perf_counter()
+        if delay:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    results.put(
+        {
+            "received": subscriber.received,
+            "missed": subscriber.missed,
+            "end_seq": subscriber.end_seq,
+            "elapsed_s": elapsed,
+            "delay": delay,
+        }
+    )
+
+
+# Fan-out throughput as subscribers are added, optionally with one slow subscriber
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from multiprocessing import Process, Queue
+
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import drifting_frames
+    from user_interface_for_Rectifier import record_to_display_data
+
+    parser = argparse.ArgumentParser(description="Telemetry hub: subscribe, or benchmark the fan-out")
+    parser.add_argument("--subscribe", metavar="PATH", help="print messages from the hub at PATH instead")
+    parser.add_argument("--subscribers", default="1,2,4,8", help="comma separated subscriber counts")
+    parser.add_argument("--messages", type=int, default=20000, help="messages per run")
+    parser.add_argument("--rate", type=float, default=10000.0, help="messages/s published, 0 as fast as possible")
+    parser.add_argument("--slow", action="store_true", help="add one subscriber that takes 1 ms per message")
+    args = parser.parse_args()
+
+    if args.subscribe:
+        subscriber = TelemetrySubscriber(args.subscribe)
+        for data in subscriber:
+            print(data)
+        raise SystemExit
+
+    messages = [record_to_display_data(decode_sm_frame(f)) for f in drifting_frames(500)]
+    for i, data in enumerate(messages):
+        data["charger"] = f"charger{i % 40:03d}"
+    path = os.path.join(tempfile.mkdtemp(), "hub.sock")
+    print(f"{args.messages} messages at {args.rate or 'max'} msg/s, {RECORD_SIZE} bytes each")
+    for count in [int(n) for n in args.subscribers.split(",")]:
+        hub = TelemetryHub(path).start()
+        results = Queue()
+        delays = [0.0] * count + ([0.001] if args.slow else [])
+        processes = [Process(target=_benchmark_subscriber, args=(path, delay, results)) for delay in delays]
+        for process in processes:
+            process.start()
+        while len(hub.subscribers) < len(processes):
+            time.sleep(0.01)
+
+        start = time.perf_counter()
+        next_put = start
+        for i in range(args.messages):
+            data = messages[i % len(messages)]
+            data["timestamp_ns"] = time.monotonic_ns()
+            hub.put(data)
+            if args.rate:
+                next_put += 1 / args.rate
+                delay = next_put - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        publish_s = time.perf_counter() - start
+        hub.close()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        # Each subscriber's rate from its first to its last record
+        fast = [r for r in reports if not r["delay"]]
+        delivered = sum(r["received"] / r["elapsed_s"] for r in fast if r["elapsed_s"])
+        print(
+            f"{count:3} subscribers: published {args.messages / publish_s:8.0f} msg/s, "
+            f"delivered {delivered:8.0f} msg/s total "
+            f"({delivered / count:7.0f} each), missed {sum(r['missed'] for r in fast)}"
+            + "".join(
+                # Cut off by close() it gets no END record: count against what was published
+                f", slow one got {r['received']} missed {args.messages - r['received']}"
+                f"{'' if r['end_seq'] is not None else ' (cut off)'}"
+                for r in reports
+                if r["delay"]
+            )
+        )
@@ -0,0 +1,320 @@
+import bisect
+import csv
+import json
+import os
+import struct
+import time
+import zlib
+from array import array
+from urllib.parse import quote, unquote
+
+from sm_frame import MODULE_COUNT
+
+# Column name -> array typecode; every chunk stores all of them
+COLUMNS = {"timestamp_ns": "q"}
+COLUMNS.update({"soc": "B", "soh": "B", "charging_state": "B", "contactor_status": "B"})
+COLUMNS.update({"charging_current": "d", "charging_voltage": "d"})
+for _i in range(MODULE_COUNT):
+    COLUMNS.update({f"temp_{_i}": "d", f"current_{_i}": "d", f"voltage_{_i}": "d"})
+del _i
+
+CHUNK_MAGIC = b"TLMC"
+_HEADER_LENGTH = struct.Struct("<4sI")  # magic, length of the JSON header
+_NO_CHARGER_DIR = "@none"  # Directory of the None charger; "@" is escaped in names
+
+
+def _charger_dir(charger):
+    # Reversible: every character but letters, digits and "_-~" is %-escaped,
+    # and so is a leading "." (no "." or ".." directories)
+    if charger is None:
+        return _NO_CHARGER_DIR
+    name = quote(str(charger), safe="")
+    return "%2E" + name[1:] if name.startswith(".") else name
+
+
+def _dir_charger(name):
+    return None if name == _NO_CHARGER_DIR else unquote(name)
+
+
+def _chunk_range(name):
+    # (first, last) timestamp of a chunk file named first-last-seq.tlm
+    first, last = name[:-4].split("-")[:2]
+    return int(first), int(last)
+
+
+class TelemetryStore:
+    """
+    Append-only columnar store for decoded frames, one directory per charger.
+
+    Rows are buffered per charger in typed arrays and written as a chunk file
+    every chunk_rows rows (or on flush). A chunk holds every column as a
+    separately zlib-compressed block behind a small JSON header, and its file
+    name carries its time range and a sequence number, so a query only opens
+    chunks it overlaps and chunks with the same range do not replace each
+    other. Timestamps must not go backwards per charger; default timestamps
+    are the wall clock, held back from stepping backwards.
+    """
+
+    def __init__(self, root, chunk_rows=4096, compress_level=1):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self.compress_level = compress_level
+        self.buffers = {}  # charger -> {column: array}
+        self.last_ns = {}  # charger -> last timestamp appended
+        self.sequences = {}  # charger -> sequence number of the next chunk file
+        os.makedirs(root, exist_ok=True)
+
+    def _open_charger(self, charger):
+        # Continue the sequence numbers and time order of earlier chunks
+        directory = os.path.join(self.root, _charger_dir(charger))
+        sequence = 0
+        last_ns = None
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(".tlm"):
+                    parts = name[:-4].split("-")
+                    if len(parts) > 2:
+                        sequence = max(sequence, int(parts[2]) + 1)
+                    last = int(parts[1])
+                    last_ns = last if last_ns is None else max(last_ns, last)
+        self.sequences[charger] = sequence
+        self.last_ns[charger] = last_ns
+
+    def _new_buffer(self):
+        return {name: array(typecode) for name, typecode in COLUMNS.items()}
+
+    def append(self, charger, frame, timestamp_ns=None):
+        """
+        Buffer one decoded frame.
+
+        :param charger: Charger tag, None for a single-charger setup.
+        :param frame: SMFrame record from decode_sm_frame.
+        :param timestamp_ns: Receive time, defaults to time.time_ns() but
+            never before the charger's previous row.
+        :raises ValueError: timestamp_ns is before the charger's previous row.
+        """
+        if charger not in self.sequences:
+            self._open_charger(charger)
+        last_ns = self.last_ns[charger]
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+            if last_ns is not None and timestamp_ns < last_ns:
+                timestamp_ns = last_ns  # Wall clock stepped back, keep the order for bisect
+        elif last_ns is not None and timestamp_ns < last_ns:
+            raise ValueError(f"Timestamp {timestamp_ns} of {charger!r} is before the previous row, {last_ns}")
+        self.last_ns[charger] = timestamp_ns
+
+        columns = self.buffers.get(charger)
+        if columns is None:
+            columns = self.buffers[charger] = self._new_buffer()
+
+        columns["timestamp_ns"].append(timestamp_ns)
+        columns["soc"].append(frame.soc)
+        columns["soh"].append(frame.soh)
+        columns["charging_state"].append(frame.charging_state)
+        columns["contactor_status"].append(frame.contactor_status)
+        columns["charging_current"].append(frame.charging_current)
+        columns["charging_voltage"].append(frame.charging_voltage)
+        temps = frame.module_temperatures
+        currents = frame.module_currents
+        voltages = frame.module_voltages
+        for i in range(MODULE_COUNT):
+            columns[f"temp_{i}"].append(temps[i])  # Celsius
+            columns[f"current_{i}"].append(currents[i])
+            columns[f"voltage_{i}"].append(voltages[i])
+
+        if len(columns["timestamp_ns"]) >= self.chunk_rows:
+            self._write_chunk(charger)
+
+    def _write_chunk(self, charger):
+        columns = self.buffers.pop(charger)
+        timestamps = columns["timestamp_ns"]
+        if not timestamps:
+            return
+
+        blocks = []
+        header = {"rows": len(timestamps), "columns": []}
+        for name, values in columns.items():
+            block = zlib.compress(values.tobytes(), self.compress_level)
+            header["columns"].append([name, values.typecode, len(block)])
+            blocks.append(block)
+        header_bytes = json.dumps(header).encode()
+
+        directory = os.path.join(self.root, _charger_dir(charger))
+        os.makedirs(directory, exist_ok=True)
+        sequence = self.sequences[charger]
+        self.sequences[charger] = sequence + 1
+        name = f"{timestamps[0]:020d}-{timestamps[-1]:020d}-{sequence:08d}.tlm"
+        tmp_path = os.path.join(directory, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER_LENGTH.pack(CHUNK_MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            for block in blocks:
+                f.write(block)
+        os.replace(tmp_path, os.path.join(directory, name))  # Readers never see partial chunks
+
+    def flush(self):
+        """Write every partially filled buffer as a chunk."""
+        for charger in list(self.buffers):
+            self._write_chunk(charger)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def chargers(self):
+        # Charger tags as strings, None first if stored
+        names = [_dir_charger(name) for name in os.listdir(self.root)]
+        return sorted(names, key=lambda charger: (charger is not None, charger or ""))
+
+    def _chunks(self, charger, start_ns, end_ns):
+        # Chunk files overlapping [start_ns, end_ns], oldest first
+        directory = os.path.join(self.root, _charger_dir(charger))
+        if not os.path.isdir(directory):
+            return []
+        chunks = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".tlm"):
+                continue
+            first, last = _chunk_range(name)
+            if last >= start_ns and first <= end_ns:
+                chunks.append(os.path.join(directory, name))
+        return chunks
+
+    @staticmethod
+    def _read_chunk(path, wanted):
+        with open(path, "rb") as f:
+            magic, header_length = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+            if magic != CHUNK_MAGIC:
+                raise ValueError(f"{path} is not a telemetry chunk")
+            header = json.loads(f.read(header_length))
+            data = {}
+            for name, typecode, length in header["columns"]:
+                if name not in wanted:
+                    f.seek(length, os.SEEK_CUR)
+                    continue
+                values = array(typecode)
+                values.frombytes(zlib.decompress(f.read(length)))
+                data[name] = values
+        return data
+
+    def query(self, charger, start_ns=0, end_ns=2**63 - 1, columns=None):
+        """
+        Rows of one charger within a time range, unflushed rows included.
+
+        :param charger: Charger tag.
+        :param start_ns: First timestamp to include.
+        :param end_ns: Last timestamp to include.
+        :param columns: Column names to return, default all; timestamp_ns
+            is always included.
+        :return: Dict of column name -> array.
+        """
+        wanted = set(COLUMNS if columns is None else columns) | {"timestamp_ns"}
+        result = {name: array(COLUMNS[name]) for name in wanted}
+
+        parts = [self._read_chunk(path, wanted) for path in self._chunks(charger, start_ns, end_ns)]
+        if charger in self.buffers:
+            parts.append(self.buffers[charger])
+
+        for part in parts:
+            timestamps = part["timestamp_ns"]
+            lo = bisect.bisect_left(timestamps, start_ns)
+            hi = bisect.bisect_right(timestamps, end_ns)
+            if lo < hi:
+                for name in wanted:
+                    result[name].extend(part[name][lo:hi])
+        return result
+
+    def downsample(self, charger, column, bucket_ns, start_ns=0, end_ns=2**63 - 1):
+        """
+        Min, max and mean of one column per time bucket.
+
+        :param charger: Charger tag.
+        :param column: Column name, e.g. "temp_0".
+        :param bucket_ns: Bucket width in nanoseconds.
+        :return: Dict with "bucket_ns" start times and "min", "max", "mean" arrays.
+        """
+        rows = self.query(charger, start_ns, end_ns, [column])
+        result = {
+            "bucket_ns": array("q"),
+            "min": array("d"),
+            "max": array("d"),
+            "mean": array("d"),
+        }
+        timestamps = rows["timestamp_ns"]
+        values = rows[column]
+        i = 0
+        while i < len(timestamps):
+            bucket = timestamps[i] - timestamps[i] % bucket_ns
+            j = bisect.bisect_left(timestamps, bucket + bucket_ns, i)
+            chunk = values[i:j]
+            result["bucket_ns"].append(bucket)
+            result["min"].append(min(chunk))
+            result["max"].append(max(chunk))
+            result["mean"].append(sum(chunk) / len(chunk))
+            i = j
+        return result
+
+    def export_csv(self, charger, path, start_ns=0, end_ns=2**63 - 1):
+        """Offline export of a time range to CSV, one column per field."""
+        rows = self.query(charger, start_ns, end_ns)
+        names = list(COLUMNS)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(zip(*(rows[name] for name in names)))
+
+    def export_excel(self, charger, path, start_ns=0, end_ns=2**63 - 1):
+        """Offline export of a time range to an Excel workbook (needs openpyxl)."""
+        from openpyxl import Workbook  # Only needed for this export
+
+        rows = self.query(charger, start_ns, end_ns)
+        names = list(COLUMNS)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=_charger_dir(charger)[:31])
+        sheet.append(names)
+        for row in zip(*(rows[name] for name in names)):
+            sheet.append(row)
+        workbook.save(path)
+
+
+# Store synthetic frames for a few chargers, then query and downsample them
+if __name__ == "__main__":
+    import tempfile
+
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import FrameGenerator
+
+    FRAMES = 100000
+    CHARGERS = 10
+
+    records = [decode_sm_frame(frame) for frame in FrameGenerator().frames(1000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TelemetryStore(tmp)
+        start = time.perf_counter()
+        for i in range(FRAMES):
+            # One frame per charger every 100 ms
+            store.append(f"charger{i % CHARGERS}", records[i % len(records)], i // CHARGERS * 100_000_000)
+        store.flush()
+        elapsed = time.perf_counter() - start
+        size = sum(
+            os.path.getsize(os.path.join(path, name))
+            for path, _, names in os.walk(tmp)
+            for name in names
+        )
+        print(f"Stored {FRAMES} frames in {elapsed:.2f} s, {size / FRAMES:.1f} bytes/frame on disk")
+
+        start = time.perf_counter()
+        rows = store.query("charger3", 100 * 10**9, 400 * 10**9, ["temp_0", "voltage_0"])
+        elapsed = time.perf_counter() - start
+        print(f"Queried {len(rows['timestamp_ns'])} rows in {elapsed * 1000:.1f} ms")
+
+        start = time.perf_counter()
+        minutes = store.downsample("charger3", "temp_0", 60 * 10**9)
+        elapsed = time.perf_counter() - start
+        print(f"Downsampled to {len(minutes['mean'])} one-minute buckets in {elapsed * 1000:.1f} ms")
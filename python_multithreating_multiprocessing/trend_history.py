@@ -0,0 +1,147 @@
+import math
+import time
+from array import array
+
+from frame_schema import LAYOUT, MODULE_COUNT
+
+
+class MinMaxRing:
+    """
+    History of one series decimated to a fixed number of columns.
+
+    Samples are folded into the current column's min and max; after
+    samples_per_column samples the column is closed and written into two
+    ring buffers (array.array of doubles) of width columns, overwriting the
+    oldest. Memory is 2 * width doubles however long the history, adding a
+    sample is O(1) and drawing is O(width). Keeping min and max per column
+    (instead of every Nth sample) means a single-sample spike still shows.
+    """
+
+    __slots__ = ("width", "samples_per_column", "mins", "maxs", "head", "count", "low", "high", "pending")
+
+    def __init__(self, width, samples_per_column=1):
+        self.width = width
+        self.samples_per_column = samples_per_column
+        self.mins = array("d", bytes(8 * width))
+        self.maxs = array("d", bytes(8 * width))
+        self.head = 0  # Next column to write
+        self.count = 0  # Closed columns, up to width
+        self.low = math.inf  # Open column
+        self.high = -math.inf
+        self.pending = 0
+
+    def add(self, value):
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+        self.pending += 1
+        if self.pending >= self.samples_per_column:
+            self.close_column()
+
+    def close_column(self):
+        if not self.pending:
+            return
+        head = self.head
+        self.mins[head] = self.low
+        self.maxs[head] = self.high
+        self.head = (head + 1) % self.width
+        if self.count < self.width:
+            self.count += 1
+        self.low = math.inf
+        self.high = -math.inf
+        self.pending = 0
+
+    def columns(self):
+        """
+        Closed columns, oldest first.
+
+        :return: Tuple of (list of mins, list of maxs).
+        """
+        start = (self.head - self.count) % self.width
+        if start + self.count <= self.width:
+            end = start + self.count
+            return self.mins[start:end].tolist(), self.maxs[start:end].tolist()
+        return (
+            (self.mins[start:] + self.mins[: self.head]).tolist(),
+            (self.maxs[start:] + self.maxs[: self.head]).tolist(),
+        )
+
+    def points(self, height, x_offset=0, y_offset=0):
+        """
+        Canvas line coordinates: a vertical stroke from max to min per column.
+
+        :param height: Pixels for the value range of the visible history.
+        :return: Flat list x0, y0, x1, y1, ... (empty with fewer than 2 columns).
+        """
+        mins, maxs = self.columns()
+        if len(mins) < 2:
+            return []
+        low = min(mins)
+        span = (max(maxs) - low) or 1.0
+        scale = (height - 1) / span
+        bottom = y_offset + height - 1
+        points = []
+        for x, (lo, hi) in enumerate(zip(mins, maxs), x_offset):
+            points += (x, bottom - (hi - low) * scale, x, bottom - (lo - low) * scale)
+        return points
+
+
+class TrendHistory:
+    """
+    MinMaxRing per module display field, e.g. "temp_0", for one charger.
+
+    A column covers samples_per_column messages, so at 10 messages/s a
+    120 pixel wide chart with 50 samples per column shows the last 10
+    minutes.
+    """
+
+    def __init__(self, width=120, samples_per_column=1, module_count=MODULE_COUNT):
+        self.keys = [key for key, _, _, _ in LAYOUT.display_fields()]
+        self.series = {
+            key: [MinMaxRing(width, samples_per_column) for _ in range(module_count)] for key in self.keys
+        }
+        self.samples = 0
+
+    def update(self, data):
+        # One sample per module field; None values leave the column open
+        for key in self.keys:
+            rings = self.series[key]
+            for ring, value in zip(rings, data[key]):
+                if value is not None:
+                    ring.add(value)
+        self.samples += 1
+
+    def rings(self, module):
+        # (display key, ring) of every field of one module
+        return [(key, self.series[key][module]) for key in self.keys]
+
+
+# Ingest and draw cost for short and long histories
+if __name__ == "__main__":
+    from sm_frame import decode_sm_frame
+    from synthetic_frames import drifting_frames
+    from user_interface_for_Rectifier import record_to_display_data
+
+    WIDTH = 120
+    messages = [record_to_display_data(decode_sm_frame(f)) for f in drifting_frames(2000)]
+
+    for samples_per_column in (1, 50, 3000):
+        history = TrendHistory(WIDTH, samples_per_column)
+        samples = WIDTH * samples_per_column + 1
+        start = time.perf_counter()
+        for i in range(min(samples, 200000)):
+            history.update(messages[i % len(messages)])
+        ingest = (time.perf_counter() - start) / min(samples, 200000)
+
+        start = time.perf_counter()
+        for module in range(MODULE_COUNT):
+            for _, ring in history.rings(module):
+                points = ring.points(30)
+        draw = time.perf_counter() - start
+        minutes = WIDTH * samples_per_column / 10 / 60
+        print(
+            f"{samples_per_column:5} samples/column ({minutes:6.1f} min at 10 Hz): "
+            f"{ingest * 1e6:5.1f} us/message  {draw * 1000:5.2f} ms to build every sparkline"
+        )
+    print(f"Memory per series: {2 * WIDTH * 8} bytes of column data")
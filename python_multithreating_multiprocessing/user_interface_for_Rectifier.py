@@ -1,14 +1,22 @@
 # import socket
 # import binascii
-import datetime  # Import datetime for timestamps
+import logging
+import time
 
-# from openpyxl import Workbook, load_workbook  # Import openpyxl for Excel file handling
-import tkinter as tk
-from tkinter import ttk
-import multiprocessing
+# Per-row Excel logging is replaced by telemetry_store; export to Excel offline from there
+# No tkinter or multiprocessing here: the data process imports this module and
+# should not pay for the GUI toolkit
+
+from crc16 import crc16_modbus
+from frame_stream import socket_frames
+from rectifier_logging import LazyAscii, LazyHex
+from frame_schema import CRC_OFFSET, FRAME_SIZE, LAYOUT
+from sm_frame import decode_sm_frame, frame_crc_ok
 
 # Constants
-TOTAL_SIZE = 256  # Total expected size
+TOTAL_SIZE = FRAME_SIZE  # Total expected size
+
+log = logging.getLogger("rectifier.decoder")
 
 
 # Function to calculate CRC-16
@@ -16,214 +24,206 @@ def calculate_crc(data):
     """
     Calculate CRC-16 using the specified algorithm.
 
-    :param data: List of data bytes to calculate CRC for.
+    Uses the table-driven CRC-16/MODBUS engine from crc16.py; the original
+    bit loop lives on there as calculate_crc_bitwise.
+
+    :param data: Bytes-like object, or list or other iterable of byte values.
     :return: Calculated CRC value.
     """
-    u16crc = 0xFFFF  # Initial CRC value
-
-    for byte in data:
-        u16crc ^= byte  # XOR byte into least significant byte of crc
-        for _ in range(8):  # Loop over each bit
-            if (u16crc & 0x0001) != 0:  # If the LSB is set
-                u16crc >>= 1  # Shift right
-                u16crc ^= 0xA001  # XOR with polynomial
-            else:
-                u16crc >>= 1  # Just shift right
-
-    return u16crc
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+    return crc16_modbus(data)
 
 
 # Function to unpack the data into the structured format
 def unpack_sm_payload(data):
-    print(f"256 Byte Full data (hex): {data.hex()}")
+    # Hex dumps are only built when debug logging is enabled
+    debug = log.isEnabledFor(logging.DEBUG)
+    if debug:
+        log.debug("256 Byte Full data (hex): %s", LazyHex(data))
     # logger.log_message_txt(f"256 Byte Full data (hex): {data.hex()}")
     # logger.log_message(f"256 Byte Full data (hex): {data.hex()}")
 
     if len(data) != TOTAL_SIZE:
-        print("Received data of unexpected length.")
+        log.warning("Received data of unexpected length: %d bytes", len(data))
         # logger.log_message_txt(f"256 Byte Full data (hex): {data.hex()}")
         # logger.log_message(f"256 Byte Full data (hex): {data.hex()}")
         return None
 
     try:
-        # Calculate CRC for the first 254 bytes of data
-        received_crc = int.from_bytes(data[254:256], byteorder="big")
-        calculated_crc = calculate_crc(data[:254])
+        # Calculate CRC for the bytes before the CRC field
+        received_crc = int.from_bytes(data[CRC_OFFSET:TOTAL_SIZE], byteorder="big")
+        calculated_crc = crc16_modbus(memoryview(data)[:CRC_OFFSET])
         # Reverse the bytes of calculated CRC
         calculated_crc = int.from_bytes(
             calculated_crc.to_bytes(2, byteorder="little")[::-1], byteorder="big"
         )
         if received_crc != calculated_crc:
-            print(
-                f"CRC mismatch: received {received_crc:04X}, calculated {calculated_crc:04X}"
+            log.warning(
+                "CRC mismatch: received %04X, calculated %04X",
+                received_crc,
+                calculated_crc,
             )
             # logger.log_message_txt(f"CRC mismatch: received {received_crc:04X}, calculated {calculated_crc:04X}")
             # logger.log_message(f"CRC mismatch: received {received_crc:04X}, calculated {calculated_crc:04X}")
-        else:
-            print(
-                f"Received CRC: {received_crc:04X} match with Calculated CRC: {calculated_crc:04x}"
+        elif debug:
+            log.debug(
+                "Received CRC: %04X match with Calculated CRC: %04x",
+                received_crc,
+                calculated_crc,
             )
             # logger.log_message_txt(f"Received CRC: {received_crc:04X} match with Calculated CRC: {calculated_crc:04x}")
             # logger.log_message(f"Received CRC: {received_crc:04X} match with Calculated CRC: {calculated_crc:04x}")
 
         # Store the first 20 bytes separately
-        header = data[:20]
-        print(f"First 20 bytes (header): {header.hex()}")
+        header = data[LAYOUT.span("header")]
+        if debug:
+            log.debug("First 20 bytes (header): %s", LazyHex(header))
         # logger.log_message_txt(f"First 20 bytes (header): {header.hex()}")
         # logger.log_message(f"First 20 bytes (header): {header.hex()}")
 
-        print(f"First 20 bytes (ASCII): {header.decode('ascii', 'ignore')}")
+        if debug:
+            log.debug("First 20 bytes (ASCII): %s", LazyAscii(header))
         # logger.log_message_txt(f"First 20 bytes (ASCII): {header.decode('ascii', 'ignore')}")
         # logger.log_message(f"First 20 bytes (ASCII): {header.decode('ascii', 'ignore')}")
 
         # Process the rest of the data from byte 21 to 256
-        payload = data[20:]
-        print(f"Payload data (hex): {payload.hex()}")
+        if debug:
+            log.debug("Payload data (hex): %s", LazyHex(memoryview(data)[LAYOUT.span("header").stop :]))
         # logger.log_message_txt(f"Payload data (hex): {payload.hex()}")
         # logger.log_message(f"Payload data (hex): {payload.hex()}")
 
         # Parse string, PMActiveBit, and reserved_PMActiveBit
-        reserved_PMActiveBit = data[20:23]
-        PMActiveBit = data[23:24]
+        payload = decode_sm_frame(data, check_crc=False).to_dict()  # Layout from frame_schema
+        PMActiveBit = payload["PMActiveBit"]
 
-        print(f"PMActiveBit (Byte): {PMActiveBit.hex()}")
+        if debug:
+            log.debug("PMActiveBit (Byte): %s", LazyHex(PMActiveBit))
         # logger.log_message_txt(f"PMActiveBit (Byte): {PMActiveBit.hex()}")
         # logger.log_message(f"PMActiveBit (Byte): {PMActiveBit.hex()}")
 
         low_nibble = PMActiveBit[0] & 0x0F  # Extract low nibble bits
-        low_nibble_binary = bin(low_nibble)[2:].zfill(
-            4
-        )  # Convert to binary and ensure 4 bits
-        print(f"PMActiveBit (Low Nibble - Binary): {low_nibble_binary}")
+        if debug:
+            log.debug("PMActiveBit (Low Nibble - Binary): %s", format(low_nibble, "04b"))
         # logger.log_message_txt(f"PMActiveBit (Low Nibble - Binary): {low_nibble_binary}")
         # logger.log_message(f"PMActiveBit (Low Nibble - Binary): {low_nibble_binary}")
 
-        def parse_power_module(start_byte):
-            ambient_temp = int.from_bytes(
-                data[start_byte + 2 : start_byte + 4], byteorder="little"
-            )
-            current = (
-                int.from_bytes(
-                    data[start_byte + 4 : start_byte + 6], byteorder="little"
-                )
-                / 10.0
-            )
-            voltage = (
-                int.from_bytes(
-                    data[start_byte + 6 : start_byte + 8], byteorder="little"
-                )
-                / 10.0
-            )
-            return {
-                "module_status_flag_1": data[start_byte : start_byte + 1],
-                "module_status_flag_2": data[start_byte + 1 : start_byte + 2],
-                "ambient_temperature_hex": data[start_byte + 2 : start_byte + 4][
-                    ::-1
-                ].hex(),
-                "ambient_temperature": ambient_temp,
-                "current_hex": data[start_byte + 4 : start_byte + 6][
-                    ::-1
-                ].hex(),  # MSB to LSB
-                "current": current,
-                "voltage_hex": data[start_byte + 6 : start_byte + 8][
-                    ::-1
-                ].hex(),  # MSB to LSB
-                "voltage": voltage,
-                "reserved": data[start_byte + 8 : start_byte + 16],
-            }
-
-        power_modules = []
-        for i in range(7):
-            start_byte = 24 + i * 16
-            power_modules.append(parse_power_module(start_byte))
-
-        # Process charging related info
-        demand_voltage = int.from_bytes(data[140:144], byteorder="little") / 10.0
-        demand_current = int.from_bytes(data[144:148], byteorder="little") / 10.0
-        charging_current = (
-            int.from_bytes(data[152:154], byteorder="little") / 10.0
-        )  # Combine low and high charging voltage
-        charging_voltage = (
-            int.from_bytes(data[154:156], byteorder="little") / 10.0
-        )  # Combine low and high charging current
-
-        charging_state_count = data[139:140][0]
-        contactor_status = (charging_state_count >> 4) & 0x0F  # Extract high nibble bit
-        charging_state = charging_state_count & 0x0F  # Extract low nibble decimal
-
-        reserved_1 = data[138:139][0]
-        reserved_high_nibble = (reserved_1 >> 4) & 0x0F  # High nibble
-        charge_enable_bit = reserved_1 & 0x01  # 0th bit
-        reserved_low_bits = (reserved_1 >> 1) & 0x07  # Bits 1-3
-
-        charging_related_info = {
-            "battery_SOC": data[136:137],
-            "battery_SOH": data[137:138],
-            "reserved_1": data[138:139],
-            "charging_state_count": data[139:140],
-            "charging_state": charging_state,
-            "contactor_status": format(contactor_status, "04b"),
-            "demand_voltage_hex": data[140:144][::-1].hex(),  # MSB to LSB
-            "demand_voltage": demand_voltage,
-            "demand_current_hex": data[144:148][::-1].hex(),  # MSB to LSB
-            "demand_current": demand_current,
-            "positive_gun_temperature": data[148:149],
-            "negative_gun_temperature": data[149:150],
-            "reserved_2": data[150:152],
-            "charging_current_hex": data[152:154][::-1].hex(),  # MSB to LSB
-            "charging_current": charging_voltage,
-            "charging_voltage_hex": data[154:156][::-1].hex(),  # MSB to LSB
-            "charging_voltage": charging_current,
-            "charging_time_minute": data[156:157],
-            "charging_time_hour": data[157:158],
-            "reserved_3": data[158:160],
-            "BST_reason": data[160:162],
-            "CST_reason": data[162:164],
-            "energy_data": data[164:168],
-            "reserved_high_nibble": reserved_high_nibble,
-            "charge_enable_bit": charge_enable_bit,
-            "reserved_low_bits": reserved_low_bits,
-        }
-
-        padding = data[168:254]
-        CRC1 = data[254:255]
-        CRC2 = data[255:256]
-
-        return {
-            "header": header,
-            "PMActiveBit": PMActiveBit,
-            "reserved_PMActiveBit": reserved_PMActiveBit,
-            "power_modules": power_modules,
-            "charging_related_info": charging_related_info,
-            "padding": padding,
-            "CRC1": CRC1,
-            "CRC2": CRC2,
-        }
+        return payload
     except ValueError as e:
-        print(f"Error converting hexadecimal data: {e}")
+        log.error("Error converting hexadecimal data: %s", e)
         return None
 
 
-def start_client(queue):
-    # server_ip = "192.168.11.51"  # Server IP address
-    # server_port = 3333  # Server port number
-    # try:
-    #     # Create a socket object
-    #     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    #     client_socket.connect((server_ip, server_port))
-    #     print(f"Connected to server {server_ip}:{server_port}")
-    # logger.log_message_txt(f"Connected to server {server_ip}:{server_port}")
-    # logger.log_message(f"Connected to server {server_ip}:{server_port}")
+def record_to_display_data(frame):
+    """
+    Build the display message straight from an SMFrame record.
 
+    :param frame: SMFrame returned by decode_sm_frame.
+    :return: Dict with soc, soh and per-module temp, current and voltage.
+    """
+    return {
+        "soc": frame.soc,
+        "soh": frame.soh,
+        "temp": list(frame.module_temperatures),  # Celsius
+        "current": list(frame.module_currents),  # Amps
+        "voltage": list(frame.module_voltages),  # Volts
+    }
+
+
+def sample_frames():
+    """
+    Yield the captured sample frame forever, for running without hardware.
+
+    :return: Generator of 256 byte frames.
+    """
+    string_data = "0101000053756e4d6f6220546563682e2e2e0000000000030000f400f201220f00000000000000000000f400f401230f000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000001d00015558110000f401000000000000e603220f00000000000001000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000009dd2"  # Expecting 256 bytes of data
+    data = bytes.fromhex(string_data)
     while True:
-        string_data = "0101000053756e4d6f6220546563682e2e2e0000000000030000f400f201220f00000000000000000000f400f401230f000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000001d00015558110000f401000000000000e603220f00000000000001000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000009dd2"  # Expecting 256 bytes of data
-        data = bytes.fromhex(string_data)
-        # data = client_socket.recv(TOTAL_SIZE)  # Expecting 256 bytes of data
+        yield data
+
+
+def start_client(
+    queue,
+    record_decoder=True,
+    server=None,
+    decode_workers=None,
+    batch_size=64,
+    max_batch_age_ms=100,
+    alarm_rules=None,
+    metrics=None,
+):
+    """
+    Receive rectifier frames, decode them and put display data on the queue.
+
+    :param queue: Queue read by PowerModuleDisplay.
+    :param record_decoder: Use decode_sm_frame instead of unpack_sm_payload.
+    :param server: (ip, port) of the controller, e.g. ("192.168.11.51", 3333);
+        None replays the captured sample frame.
+    :param decode_workers: Decode in a process pool of this many workers
+        instead of inline in the receive loop; not with alarm_rules or
+        metrics, the pool returns display data, not records to check or time.
+    :param batch_size: Frames per chunk handed to a pool worker.
+    :param max_batch_age_ms: A partial chunk is decoded once its oldest
+        frame waited this long, so a slow controller is not shown
+        batch_size frames late.
+    :param alarm_rules: Rule configuration (list of dicts) checked against
+        every frame on the record decoder path; alarms are logged.
+    :param metrics: PipelineMetrics counting frames, CRC failures, short
+        frames and exceptions and timing CRC and decode; display messages
+        then carry the receive time as timestamp_ns.
+    :raises ValueError: decode_workers with alarm_rules or metrics.
+    """
+    if decode_workers and (alarm_rules is not None or metrics is not None):
+        raise ValueError("decode_workers cannot be combined with alarm_rules or metrics")
+    if server is not None:
+        frames = socket_frames(*server)  # Reassembles frames from the TCP stream
+    else:
+        frames = sample_frames()
+
+    if decode_workers:
+        from parallel_decode import decode_stream
+
+        for data in decode_stream(
+            ((None, frame) for frame in frames), decode_workers, batch_size, max_batch_age_ms
+        ):
+            queue.put(data)
+        return
+
+    alarms = None
+    if alarm_rules is not None:
+        from alarm_rules import AlarmEngine, compile_rules
+
+        alarms = AlarmEngine(compile_rules(alarm_rules))
+
+    clock = time.monotonic_ns  # Same clock in every process, for frame ages
+    for data in frames:
         if not data:
             break
-        if len(data) == TOTAL_SIZE:
+        if len(data) == TOTAL_SIZE and record_decoder:
+            # Fast path: one struct unpack, no per-field copies or hex strings
+            if metrics is None:
+                frame = decode_sm_frame(data)
+            else:
+                received_ns = clock()
+                crc_ok = frame_crc_ok(memoryview(data))
+                crc_ns = clock()
+                frame = decode_sm_frame(data, check_crc=False)
+                frame.crc_ok = crc_ok
+            if not frame.crc_ok:
+                log.warning("CRC mismatch: received %s", LazyHex(data[CRC_OFFSET : CRC_OFFSET + 2]))
+            if alarms is not None:
+                alarms.check(None, frame)
+            display_data = record_to_display_data(frame)
+            if metrics is not None:
+                metrics.record_frame(crc_ns - received_ns, clock() - crc_ns, crc_ok)
+                display_data["timestamp_ns"] = received_ns
+            queue.put(display_data)
+        elif len(data) == TOTAL_SIZE:
             try:
-                payload = unpack_sm_payload(data)
+                if metrics is not None:
+                    received_ns = clock()
+                    metrics.count("frames")
+                payload = unpack_sm_payload(bytes(data))
                 if payload is None:
                     continue
 
@@ -289,7 +289,10 @@ def start_client(queue):
                     "current": current_values,
                     "voltage": voltage_values,
                 }
-                print(data)
+                log.debug("Display data: %s", data)
+                if metrics is not None:
+                    metrics.record("decode", clock() - received_ns)  # CRC and unpack together
+                    data["timestamp_ns"] = received_ns
                 queue.put(data)
 
                 # print(f"  Module Status Flag 2: {pm['module_status_flag_2'].hex()} ({int(pm['module_status_flag_2'].hex(), 16)})")
@@ -410,11 +413,15 @@ def start_client(queue):
                 # # logger.log_message(f"CRC2: {payload['CRC2'].hex()}")
                 # # logger.log_message_txt(f"CRC2: {payload['CRC2'].hex()}")
             except Exception as e:
-                print(f"Error: {e}")
+                log.error("Error: %s", e)
+                if metrics is not None:
+                    metrics.count("source_exceptions")
                 # logger.log_message(f"Error: {e}")
                 # logger.log_message_txt(f"Error: {e}")
         else:
-            print(f"Expected {TOTAL_SIZE} bytes but received {len(data)} bytes")
+            log.warning("Expected %d bytes but received %d bytes", TOTAL_SIZE, len(data))
+            if metrics is not None:
+                metrics.count("short_frames")
             # logger.log_message(f"Expected {TOTAL_SIZE} bytes but received {len(data)} bytes")
             # logger.log_message_txt(f"Expected {TOTAL_SIZE} bytes but received {len(data)} bytes")
 